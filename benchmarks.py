@@ -0,0 +1,897 @@
+"""
+Benchmarks for the copy pipeline.
+
+Run from the repository root, for example:
+
+    python benchmarks.py safe_copy --size-mb 512 --repeat 3
+    python benchmarks.py metadata --size-mb 50
+    python benchmarks.py small_files --files 50000
+    python benchmarks.py startup --repeat 10
+
+The suite times the copy pipeline on synthetic source trees and saves the results,
+so that two commits can be compared:
+
+    python benchmarks.py suite --data-dir /scratch/bench --output before.json
+    python benchmarks.py suite --data-dir /scratch/bench --output after.json
+    python benchmarks.py compare before.json after.json
+"""
+import argparse
+import datetime
+import functools
+import hashlib
+import json
+import multiprocessing
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+from file_operations import (allocate_destination_folder, compute_checksum, copy_file, copy_files, safe_copy,
+                             set_destination_folder, SMALL_FILE_THRESHOLD)
+from utils import find_value_in_json_file, get_value_from_dict
+
+try:
+    import resource
+except ImportError:
+    # Windows
+    resource = None
+
+MB = 1024 * 1024
+
+# Version of the layout of the suite results, checked before two results are compared.
+SUITE_FORMAT = 1
+
+# Synthetic datasets of the suite, generated once per data directory.
+DATASETS = ('huge', 'medium', 'tiny', 'deep', 'folders', 'metadata')
+
+# Options of the suite setting the content of each dataset; a dataset is generated again when they change.
+DATASET_OPTIONS = {
+    'huge': ('huge_mb',),
+    'medium': ('medium_files', 'medium_mb'),
+    'tiny': ('tiny_files', 'tiny_kb'),
+    'deep': ('depth', 'deep_files', 'deep_kb'),
+    'folders': ('folders',),
+    'metadata': ('metadata_mb',),
+}
+
+# Test IDs of the destination folders of the folders dataset, without and with a sequence index.
+SCAN_TEST_ID = 'SCAN'
+INDEXED_TEST_ID = 'INDEXED'
+
+
+def legacy_checksum(file_path):
+    """
+    The original checksum: sha256 over 4 KiB reads.
+
+    Args:
+        file_path (str): The path to the file.
+
+    Returns:
+        str: The checksum of the file.
+    """
+    hash_func = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(4096), b''):
+            hash_func.update(chunk)
+    return hash_func.hexdigest()
+
+
+def legacy_safe_copy(file_path, destination_folder):
+    """
+    The original copy path: hash the source, copy it, then hash the destination.
+
+    Args:
+        file_path (str): The path of the file to be copied.
+        destination_folder (str): The destination folder.
+
+    Returns:
+        str: The path of the copied file.
+    """
+    source_checksum = legacy_checksum(file_path)
+    destination_path = shutil.copy(file_path, destination_folder)
+    if source_checksum != legacy_checksum(destination_path):
+        raise ValueError("Checksum mismatch: the file was not copied correctly.")
+    return destination_path
+
+
+def write_random_file(path, size):
+    """
+    Writes a file of the given size filled with random bytes.
+
+    Args:
+        path (str): The path of the file to create.
+        size (int): The size of the file in bytes.
+    """
+    with open(path, 'wb') as f:
+        remaining = size
+        while remaining > 0:
+            chunk = min(remaining, 8 * MB)
+            f.write(os.urandom(chunk))
+            remaining -= chunk
+
+
+def time_call(func, repeat):
+    """
+    Calls a function several times and returns the best wall time.
+
+    Args:
+        func (callable): The function to call, without arguments.
+        repeat (int): The number of calls.
+
+    Returns:
+        float: The fastest call duration in seconds.
+    """
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+
+def bench_safe_copy(size_mb, repeat):
+    """
+    Compares the throughput of the legacy copy path against safe_copy.
+
+    Args:
+        size_mb (int): The size of the test file in MiB.
+        repeat (int): The number of runs per variant; the best run is reported.
+
+    Returns:
+        dict: The throughput in MiB/s of each variant.
+    """
+    work_dir = tempfile.mkdtemp()
+    try:
+        source = os.path.join(work_dir, 'source.bin')
+        destination = os.path.join(work_dir, 'destination')
+        os.makedirs(destination)
+        write_random_file(source, size_mb * MB)
+
+        variants = {
+            'legacy (3 reads)': lambda: legacy_safe_copy(source, destination),
+            'safe_copy (verify)': lambda: safe_copy(source, destination),
+            'safe_copy (single pass)': lambda: safe_copy(source, destination, verify=False),
+            'copy_file (kernel transfer)': lambda: copy_file(source, destination, backend='auto'),
+        }
+        return {name: size_mb / time_call(func, repeat) for name, func in variants.items()}
+    finally:
+        shutil.rmtree(work_dir)
+
+
+def write_metadata_file(path, size, key_position):
+    """
+    Writes a synthetic rig metadata file embedding large sample arrays.
+
+    Args:
+        path (str): The path of the JSON file to create.
+        size (int): The approximate size of the file in bytes.
+        key_position (str): 'start' or 'end', where the test_sequence_id key is placed.
+    """
+    channel_samples = 100000
+    channels = max(1, size // (channel_samples * 8))
+    randomizer = random.Random(0)
+    data = {}
+    if key_position == 'start':
+        data['test'] = {'test_sequence_id': 'T-0001', 'operator': 'bench'}
+    data['channels'] = [
+        {'name': f'channel_{i}', 'unit': 'V', 'samples': [round(randomizer.uniform(-1, 1), 4) for _ in range(channel_samples)]}
+        for i in range(channels)
+    ]
+    if key_position == 'end':
+        data['test'] = {'test_sequence_id': 'T-0001', 'operator': 'bench'}
+    with open(path, 'w') as f:
+        json.dump(data, f)
+
+
+def load_and_walk(path, key):
+    """
+    The original lookup: load the whole document, then walk it.
+    """
+    with open(path) as f:
+        return get_value_from_dict(json.load(f), key)
+
+
+def measure(func):
+    """
+    Calls a function once, measuring its wall time and peak Python memory allocation.
+
+    Args:
+        func (callable): The function to call, without arguments.
+
+    Returns:
+        tuple: (seconds, peak bytes, result).
+    """
+    tracemalloc.start()
+    start = time.perf_counter()
+    try:
+        result = func()
+        elapsed = time.perf_counter() - start
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return elapsed, peak, result
+
+
+def bench_metadata(size_mb):
+    """
+    Compares loading and walking a metadata file against the streaming key lookup.
+
+    Args:
+        size_mb (int): The approximate size of the metadata files in MiB.
+
+    Returns:
+        dict: (seconds, peak MiB) of each variant, keyed by variant name.
+    """
+    work_dir = tempfile.mkdtemp()
+    try:
+        results = {}
+        for key_position in ('start', 'end'):
+            path = os.path.join(work_dir, f'metadata_{key_position}.json')
+            write_metadata_file(path, size_mb * MB, key_position)
+            variants = {
+                f'json.load + get_value_from_dict (key at {key_position})': lambda: load_and_walk(path, 'test_sequence_id'),
+                f'find_value_in_json_file (key at {key_position})': lambda: find_value_in_json_file(path, 'test_sequence_id'),
+            }
+            for name, func in variants.items():
+                elapsed, peak, result = measure(func)
+                if result != 'T-0001':
+                    raise ValueError(f"{name} returned {result!r}")
+                results[name] = (elapsed, peak / MB)
+        return results
+    finally:
+        shutil.rmtree(work_dir)
+
+
+def write_small_file_tree(source_dir, files, size):
+    """
+    Writes a capture of many small sidecar files, spread over subdirectories of 1000 files.
+
+    Args:
+        source_dir (str): The directory to fill.
+        files (int): The number of small files.
+        size (int): The size of every file in bytes.
+    """
+    with open(os.path.join(source_dir, 'metadata.json'), 'w') as json_file:
+        json.dump({'test_sequence_id': 'bench'}, json_file)
+    for i in range(files):
+        directory = os.path.join(source_dir, f'sidecars_{i // 1000:03d}')
+        if i % 1000 == 0:
+            os.makedirs(directory)
+        with open(os.path.join(directory, f'frame_{i:06d}.json'), 'wb') as f:
+            f.write(os.urandom(size))
+
+
+def bench_small_files(files, size_kb, workers):
+    """
+    Compares the files copied per second with and without the small file path.
+
+    Args:
+        files (int): The number of small files.
+        size_kb (int): The size of every file in KiB.
+        workers (int): The number of files copied concurrently.
+
+    Returns:
+        dict: The files per second keyed by variant name.
+    """
+    work_dir = tempfile.mkdtemp()
+    try:
+        source_dir = os.path.join(work_dir, 'source')
+        os.makedirs(source_dir)
+        write_small_file_tree(source_dir, files, size_kb * 1024)
+        json_file_path = os.path.join(source_dir, 'metadata.json')
+        variants = {
+            'one file per task (threshold 0)': 0,
+            f'small file batches (threshold {SMALL_FILE_THRESHOLD // 1024} KiB)': SMALL_FILE_THRESHOLD,
+        }
+        results = {}
+        for name, threshold in variants.items():
+            destination_root = os.path.join(work_dir, f'destination_{threshold}')
+            summary = copy_files(source_dir, destination_root, json_file_path, workers=workers, recursive=True,
+                                 small_file_threshold=threshold)
+            results[name] = summary.files_copied / summary.elapsed
+            shutil.rmtree(destination_root)
+        return results
+    finally:
+        shutil.rmtree(work_dir)
+
+
+def bench_startup(repeat):
+    """
+    Times the start of the GUI, in a new interpreter for every run so that nothing is imported yet.
+
+    Needs a display.
+
+    Args:
+        repeat (int): The number of runs.
+
+    Returns:
+        dict: The fastest time in seconds keyed by measurement: the time to the first window,
+        measured by main.py from its first line, and the wall time of the whole process,
+        interpreter start and exit included.
+    """
+    main_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'main.py')
+    first_window = process = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        output = subprocess.run([sys.executable, main_path, '--startup-time'], capture_output=True, text=True,
+                                check=True).stdout
+        elapsed = time.perf_counter() - start
+        window = float(output.split()[0]) / 1000
+        first_window = window if first_window is None else min(first_window, window)
+        process = elapsed if process is None else min(process, elapsed)
+    return {'time to first window': first_window, 'process': process}
+
+
+def write_seeded_file(path, size, seed):
+    """
+    Writes a file of the given size filled with reproducible pseudo-random bytes.
+
+    Args:
+        path (str): The path of the file to create.
+        size (int): The size of the file in bytes.
+        seed (int): The seed of the bytes; the same seed always writes the same content.
+    """
+    randomizer = random.Random(seed)
+    with open(path, 'wb') as f:
+        remaining = size
+        while remaining > 0:
+            chunk = min(remaining, 8 * MB)
+            f.write(randomizer.randbytes(chunk))
+            remaining -= chunk
+
+
+def write_test_metadata(source_dir):
+    """
+    Writes the metadata file holding the test ID of a synthetic capture.
+
+    Args:
+        source_dir (str): The directory of the capture.
+    """
+    with open(os.path.join(source_dir, 'metadata.json'), 'w') as json_file:
+        json.dump({'test': {'test_sequence_id': 'BENCH', 'operator': 'bench'}}, json_file)
+
+
+def write_deep_tree(source_dir, depth, files, size):
+    """
+    Writes a capture nested in a chain of directories, with files at every level.
+
+    Args:
+        source_dir (str): The directory to fill.
+        depth (int): The number of nested directories.
+        files (int): The number of files in each directory.
+        size (int): The size of every file in bytes.
+    """
+    write_test_metadata(source_dir)
+    directory = source_dir
+    for level in range(depth):
+        # Short names, so deep trees stay within the path length limits
+        directory = os.path.join(directory, f'd{level}')
+        os.makedirs(directory)
+        for i in range(files):
+            write_seeded_file(os.path.join(directory, f'frame_{i:03d}.bin'), size, level * files + i)
+
+
+def write_destination_folders(destination_root, folders):
+    """
+    Fills a destination root with the folders of earlier copies of two test IDs.
+
+    The SCAN_TEST_ID folders are only found by listing the root. The last
+    INDEXED_TEST_ID folder is allocated, so the sequence index of the root records it.
+
+    Args:
+        destination_root (str): The destination root to fill.
+        folders (int): The number of folders of each test ID.
+    """
+    for n in range(1, folders + 1):
+        os.makedirs(os.path.join(destination_root, f'{SCAN_TEST_ID}_{n}'))
+    for n in range(1, folders):
+        os.makedirs(os.path.join(destination_root, f'{INDEXED_TEST_ID}_{n}'))
+    allocate_destination_folder(destination_root, INDEXED_TEST_ID)
+
+
+def generate_dataset(name, path, options):
+    """
+    Generates a synthetic dataset of the suite.
+
+    Args:
+        name (str): One of DATASETS.
+        path (str): The directory to create.
+        options (dict): The options of the suite, see DATASET_OPTIONS.
+    """
+    os.makedirs(path)
+    if name == 'huge':
+        write_test_metadata(path)
+        write_seeded_file(os.path.join(path, 'capture.bin'), options['huge_mb'] * MB, 0)
+    elif name == 'medium':
+        write_test_metadata(path)
+        for i in range(options['medium_files']):
+            write_seeded_file(os.path.join(path, f'capture_{i:05d}.bin'), options['medium_mb'] * MB, i)
+    elif name == 'tiny':
+        write_small_file_tree(path, options['tiny_files'], options['tiny_kb'] * 1024)
+    elif name == 'deep':
+        write_deep_tree(path, options['depth'], options['deep_files'], options['deep_kb'] * 1024)
+    elif name == 'folders':
+        write_destination_folders(path, options['folders'])
+    elif name == 'metadata':
+        write_metadata_file(os.path.join(path, 'metadata.json'), options['metadata_mb'] * MB, 'end')
+
+
+def prepare_dataset(name, data_dir, options):
+    """
+    Returns the path of a dataset of the suite, generating it unless the data directory already holds it.
+
+    The options a dataset was generated with are recorded next to it, so a dataset
+    is reused by later runs with the same sizes and generated again otherwise.
+
+    Args:
+        name (str): One of DATASETS.
+        data_dir (str): The directory holding the datasets.
+        options (dict): The options of the suite.
+
+    Returns:
+        str: The path of the dataset.
+    """
+    path = os.path.join(data_dir, name)
+    spec_path = os.path.join(data_dir, f'{name}.json')
+    spec = {key: options[key] for key in DATASET_OPTIONS[name]}
+    try:
+        with open(spec_path) as spec_file:
+            if json.load(spec_file) == spec and os.path.isdir(path):
+                return path
+    except (OSError, ValueError):
+        pass
+    if os.path.exists(spec_path):
+        os.remove(spec_path)
+    shutil.rmtree(path, ignore_errors=True)
+    generate_dataset(name, path, options)
+    # Written last, so an interrupted generation is started over
+    with open(spec_path, 'w') as spec_file:
+        json.dump(spec, spec_file)
+    return path
+
+
+def peak_rss():
+    """
+    Returns the peak resident set size of this process.
+
+    Returns:
+        int: The peak in bytes, or None where the platform does not report it.
+    """
+    # On Linux, ru_maxrss survives exec, so a new process would report the peak of
+    # its parent; the high water mark of /proc belongs to the new address space.
+    try:
+        with open('/proc/self/status') as status_file:
+            for line in status_file:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Reported in bytes on macOS and in KiB elsewhere
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def timed_copy_files(dataset, datasets, options, scratch):
+    """
+    Copies a dataset with copy_files.
+
+    Returns:
+        tuple: (seconds, amount) with the amount in the unit of the case.
+    """
+    source_dir = datasets[dataset]
+    destination_root = os.path.join(scratch, 'destination')
+    try:
+        start = time.perf_counter()
+        summary = copy_files(source_dir, destination_root, os.path.join(source_dir, 'metadata.json'),
+                             workers=options['workers'], recursive=True)
+        elapsed = time.perf_counter() - start
+    finally:
+        shutil.rmtree(destination_root, ignore_errors=True)
+    if summary.failures:
+        raise RuntimeError(f"copy_files failed on {len(summary.failures)} files of the {dataset} dataset")
+    if SUITE_CASES[f'copy_files/{dataset}'][1] == 'files':
+        return elapsed, summary.files_copied
+    return elapsed, summary.bytes_copied / MB
+
+
+def timed_safe_copy(datasets, options, scratch):
+    """
+    Copies the file of the huge dataset with safe_copy.
+    """
+    file_path = os.path.join(datasets['huge'], 'capture.bin')
+    destination_folder = os.path.join(scratch, 'destination')
+    os.makedirs(destination_folder)
+    try:
+        start = time.perf_counter()
+        safe_copy(file_path, destination_folder)
+        elapsed = time.perf_counter() - start
+    finally:
+        shutil.rmtree(destination_folder, ignore_errors=True)
+    return elapsed, os.path.getsize(file_path) / MB
+
+
+def timed_compute_checksum(datasets, options, scratch):
+    """
+    Hashes the file of the huge dataset with compute_checksum.
+    """
+    file_path = os.path.join(datasets['huge'], 'capture.bin')
+    start = time.perf_counter()
+    compute_checksum(file_path)
+    return time.perf_counter() - start, os.path.getsize(file_path) / MB
+
+
+def timed_set_destination_folder(test_id, datasets, options, scratch):
+    """
+    Looks up the next destination folder of a test ID of the folders dataset, options['calls'] times.
+    """
+    destination_root = datasets['folders']
+    expected = os.path.join(destination_root, f"{test_id}_{options['folders'] + 1}")
+    start = time.perf_counter()
+    for _ in range(options['calls']):
+        destination_folder = set_destination_folder(destination_root, test_id)
+    elapsed = time.perf_counter() - start
+    if destination_folder != expected:
+        raise RuntimeError(f"set_destination_folder returned {destination_folder!r}, expected {expected!r}")
+    return elapsed, options['calls']
+
+
+def timed_get_value_from_dict(datasets, options, scratch):
+    """
+    Looks up the test ID at the end of the loaded metadata dataset, options['lookups'] times.
+    """
+    with open(os.path.join(datasets['metadata'], 'metadata.json')) as f:
+        data = json.load(f)
+    start = time.perf_counter()
+    for _ in range(options['lookups']):
+        result = get_value_from_dict(data, 'test_sequence_id')
+    elapsed = time.perf_counter() - start
+    if result != 'T-0001':
+        raise RuntimeError(f"get_value_from_dict returned {result!r}")
+    return elapsed, options['lookups']
+
+
+# Cases of the suite: the dataset each one needs, the unit of its throughput, and the
+# function timing one run, called with (datasets, options, scratch directory).
+SUITE_CASES = {
+    'copy_files/huge': ('huge', 'MiB', functools.partial(timed_copy_files, 'huge')),
+    'copy_files/medium': ('medium', 'MiB', functools.partial(timed_copy_files, 'medium')),
+    'copy_files/tiny': ('tiny', 'files', functools.partial(timed_copy_files, 'tiny')),
+    'copy_files/deep': ('deep', 'files', functools.partial(timed_copy_files, 'deep')),
+    'safe_copy/huge': ('huge', 'MiB', timed_safe_copy),
+    'compute_checksum/huge': ('huge', 'MiB', timed_compute_checksum),
+    'set_destination_folder/scan': ('folders', 'calls', functools.partial(timed_set_destination_folder, SCAN_TEST_ID)),
+    'set_destination_folder/indexed': ('folders', 'calls',
+                                       functools.partial(timed_set_destination_folder, INDEXED_TEST_ID)),
+    'get_value_from_dict/metadata': ('metadata', 'calls', timed_get_value_from_dict),
+}
+
+
+def run_case(name, datasets, options):
+    """
+    Runs a case of the suite options['repeat'] times in this process.
+
+    Args:
+        name (str): A key of SUITE_CASES.
+        datasets (dict): The paths of the datasets, keyed by name.
+        options (dict): The options of the suite.
+
+    Returns:
+        dict: The seconds and amount of the fastest run, and the peak RSS of the process in bytes.
+    """
+    function = SUITE_CASES[name][2]
+    scratch = tempfile.mkdtemp(prefix='scratch_', dir=options['data_dir'])
+    try:
+        best = None
+        for _ in range(options['repeat']):
+            seconds, amount = function(datasets, options, scratch)
+            if best is None or seconds < best[0]:
+                best = (seconds, amount)
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+    return {'seconds': best[0], 'amount': best[1], 'peak_rss': peak_rss()}
+
+
+def run_case_isolated(name, datasets, options):
+    """
+    Runs a case of the suite in a new process, so its peak RSS is its own.
+
+    Returns:
+        dict: See run_case.
+    """
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn')) as pool:
+        return pool.submit(run_case, name, datasets, options).result()
+
+
+def git_revision():
+    """
+    Returns the commit of the checkout the benchmarks run from.
+
+    Returns:
+        dict: The 'commit' hash and whether the checkout has uncommitted changes ('dirty'),
+            or None outside of a git checkout.
+    """
+    directory = os.path.dirname(os.path.abspath(__file__))
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=directory, capture_output=True, text=True,
+                                check=True).stdout.strip()
+        status = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=directory,
+                                capture_output=True, text=True, check=True).stdout
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return {'commit': commit, 'dirty': bool(status.strip())}
+
+
+def bench_suite(options, datasets=DATASETS):
+    """
+    Runs the cases of the suite on synthetic datasets.
+
+    Every case runs in its own process; its throughput is taken from the fastest of
+    options['repeat'] runs. The datasets are generated in options['data_dir'], or in a
+    temporary directory removed afterwards when it is None.
+
+    Args:
+        options (dict): The sizes of the datasets and the settings of the runs, see main.
+        datasets (iterable, optional): The datasets to run the cases of. Defaults to all of DATASETS.
+
+    Returns:
+        dict: The report of the suite: the revision, platform and options it ran with,
+            and the results of each case keyed by case name.
+    """
+    options = dict(options)
+    temporary = options.get('data_dir') is None
+    if temporary:
+        options['data_dir'] = tempfile.mkdtemp()
+    else:
+        os.makedirs(options['data_dir'], exist_ok=True)
+    try:
+        paths = {name: prepare_dataset(name, options['data_dir'], options) for name in DATASETS if name in datasets}
+        results = {}
+        for name, (dataset, unit, _) in SUITE_CASES.items():
+            if dataset not in paths:
+                continue
+            result = run_case_isolated(name, paths, options)
+            result['unit'] = unit
+            result['throughput'] = result['amount'] / result['seconds'] if result['seconds'] > 0 else 0.0
+            results[name] = result
+    finally:
+        if temporary:
+            shutil.rmtree(options['data_dir'], ignore_errors=True)
+    del options['data_dir']
+    return {
+        'format': SUITE_FORMAT,
+        'revision': git_revision(),
+        'created': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'options': options,
+        'results': results,
+    }
+
+
+def compare_reports(baseline, current, tolerance):
+    """
+    Compares the results of two runs of the suite.
+
+    A case regresses when its throughput drops, or its peak RSS grows, by more than
+    the tolerance.
+
+    Args:
+        baseline (dict): The report of the reference run, see bench_suite.
+        current (dict): The report of the run to check.
+        tolerance (float): The change tolerated, as a fraction (0.1 for 10%).
+
+    Returns:
+        list: (case name, unit, baseline throughput, current throughput, baseline peak RSS,
+            current peak RSS, regressed) tuples for the cases of both runs.
+
+    Raises:
+        ValueError: If the reports have different formats.
+    """
+    if baseline.get('format') != current.get('format'):
+        raise ValueError(f"Cannot compare suite results of formats {baseline.get('format')} and {current.get('format')}")
+    rows = []
+    for name, before in baseline['results'].items():
+        after = current['results'].get(name)
+        if after is None:
+            continue
+        regressed = after['throughput'] < before['throughput'] * (1 - tolerance)
+        if before['peak_rss'] and after['peak_rss']:
+            regressed = regressed or after['peak_rss'] > before['peak_rss'] * (1 + tolerance)
+        rows.append((name, before['unit'], before['throughput'], after['throughput'], before['peak_rss'],
+                     after['peak_rss'], regressed))
+    return rows
+
+
+def _change(before, after):
+    if not before or after is None:
+        return ''
+    return f"{(after - before) / before * 100:+.1f}%"
+
+
+def _rss(peak):
+    return f"{peak / MB:.0f} MiB" if peak else 'n/a'
+
+
+def describe_revision(report):
+    """
+    Returns a short description of the revision a report of the suite was produced from.
+    """
+    revision = report.get('revision')
+    if not revision:
+        return 'unknown revision'
+    return revision['commit'][:12] + (' (dirty)' if revision['dirty'] else '')
+
+
+def print_suite(report):
+    """
+    Prints the results of the suite as an aligned table.
+
+    Args:
+        report (dict): The report of the suite, see bench_suite.
+    """
+    results = report['results']
+    print(f"{describe_revision(report)}, Python {report['python']}, {report['platform']}")
+    width = max((len(name) for name in results), default=0)
+    for name, result in results.items():
+        print(f"{name:<{width}}  {result['seconds']:10.3f} s  {result['throughput']:12.1f} {result['unit'] + '/s':<8}"
+              f"  {_rss(result['peak_rss']):>10} peak")
+
+
+def print_comparison(baseline, current, rows):
+    """
+    Prints the comparison of two runs of the suite as an aligned table.
+
+    Args:
+        baseline (dict): The report of the reference run.
+        current (dict): The report of the run to check.
+        rows (list): The result of compare_reports.
+    """
+    print(f"{describe_revision(baseline)} -> {describe_revision(current)}")
+    if baseline.get('options') != current.get('options'):
+        print("warning: the runs used different options, their results are not comparable")
+    if baseline.get('platform') != current.get('platform') or baseline.get('cpus') != current.get('cpus'):
+        print("warning: the runs were on different machines")
+    width = max((len(row[0]) for row in rows), default=0)
+    for name, unit, before, after, rss_before, rss_after, regressed in rows:
+        print(f"{name:<{width}}  {before:12.1f} -> {after:12.1f} {unit + '/s':<8} {_change(before, after):>8}"
+              f"  {_rss(rss_before):>9} -> {_rss(rss_after):>9} {_change(rss_before, rss_after):>8}"
+              f"{'  REGRESSION' if regressed else ''}")
+
+
+def print_results(results):
+    """
+    Prints benchmark results as an aligned table.
+
+    Args:
+        results (dict): The throughput in MiB/s keyed by variant name.
+    """
+    width = max(len(name) for name in results)
+    for name, throughput in results.items():
+        print(f"{name:<{width}}  {throughput:10.1f} MiB/s")
+
+
+def print_rates(results):
+    """
+    Prints the files copied per second of each variant as an aligned table.
+
+    Args:
+        results (dict): The files per second keyed by variant name.
+    """
+    width = max(len(name) for name in results)
+    for name, rate in results.items():
+        print(f"{name:<{width}}  {rate:10.0f} files/s")
+
+
+def print_timings(results):
+    """
+    Prints the wall time and peak memory of each variant as an aligned table.
+
+    Args:
+        results (dict): (seconds, peak MiB) keyed by variant name.
+    """
+    width = max(len(name) for name in results)
+    for name, (elapsed, peak) in results.items():
+        print(f"{name:<{width}}  {elapsed * 1000:10.1f} ms  {peak:10.1f} MiB peak")
+
+
+def print_durations(results):
+    """
+    Prints the wall time of each measurement as an aligned table.
+
+    Args:
+        results (dict): The time in seconds keyed by measurement.
+    """
+    width = max(len(name) for name in results)
+    for name, elapsed in results.items():
+        print(f"{name:<{width}}  {elapsed * 1000:10.1f} ms")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks for the copy pipeline.")
+    subparsers = parser.add_subparsers(dest='benchmark', required=True)
+
+    safe_copy_parser = subparsers.add_parser('safe_copy', help="Compare safe_copy against the legacy copy path.")
+    safe_copy_parser.add_argument('--size-mb', type=int, default=256, help="Size of the test file in MiB.")
+    safe_copy_parser.add_argument('--repeat', type=int, default=3, help="Number of runs per variant.")
+
+    metadata_parser = subparsers.add_parser('metadata', help="Compare the test ID lookups on large metadata files.")
+    metadata_parser.add_argument('--size-mb', type=int, default=20, help="Approximate size of the metadata files in MiB.")
+
+    small_files_parser = subparsers.add_parser('small_files', help="Compare copying a tree of small files with and "
+                                                                   "without the small file path.")
+    small_files_parser.add_argument('--files', type=int, default=50000, help="Number of small files.")
+    small_files_parser.add_argument('--size-kb', type=int, default=4, help="Size of every file in KiB.")
+    small_files_parser.add_argument('--workers', type=int, default=4, help="Number of files copied concurrently.")
+
+    startup_parser = subparsers.add_parser('startup', help="Time the start of the GUI up to its first window.")
+    startup_parser.add_argument('--repeat', type=int, default=10, help="Number of runs.")
+
+    suite_parser = subparsers.add_parser('suite', help="Time the copy pipeline on synthetic datasets and save the "
+                                                       "results, to compare them across commits.")
+    suite_parser.add_argument('--datasets', nargs='+', choices=DATASETS, default=list(DATASETS),
+                              help="Datasets to run the cases of. Defaults to all of them.")
+    suite_parser.add_argument('--data-dir', help="Directory the datasets are generated in and reused from by later "
+                                                 "runs. Defaults to a temporary directory.")
+    suite_parser.add_argument('--output', help="Path of the JSON file the results are saved to.")
+    suite_parser.add_argument('--huge-mb', type=int, default=1024, help="Size of the file of the huge dataset in MiB.")
+    suite_parser.add_argument('--medium-files', type=int, default=100, help="Number of files of the medium dataset.")
+    suite_parser.add_argument('--medium-mb', type=int, default=8, help="Size of the medium files in MiB.")
+    suite_parser.add_argument('--tiny-files', type=int, default=100000, help="Number of files of the tiny dataset.")
+    suite_parser.add_argument('--tiny-kb', type=int, default=1, help="Size of the tiny files in KiB.")
+    suite_parser.add_argument('--depth', type=int, default=64, help="Number of nested directories of the deep dataset.")
+    suite_parser.add_argument('--deep-files', type=int, default=16, help="Number of files per directory of the deep "
+                                                                         "dataset.")
+    suite_parser.add_argument('--deep-kb', type=int, default=16, help="Size of the files of the deep dataset in KiB.")
+    suite_parser.add_argument('--folders', type=int, default=10000, help="Number of existing destination folders per "
+                                                                         "test ID for set_destination_folder.")
+    suite_parser.add_argument('--metadata-mb', type=int, default=20, help="Approximate size of the metadata file "
+                                                                          "for get_value_from_dict in MiB.")
+    suite_parser.add_argument('--calls', type=int, default=1000, help="Calls of set_destination_folder per run.")
+    suite_parser.add_argument('--lookups', type=int, default=10, help="Calls of get_value_from_dict per run.")
+    suite_parser.add_argument('--workers', type=int, default=4, help="Number of files copied concurrently.")
+    suite_parser.add_argument('--repeat', type=int, default=3, help="Number of runs per case.")
+
+    compare_parser = subparsers.add_parser('compare', help="Compare two saved suite results and fail on regressions.")
+    compare_parser.add_argument('baseline', help="Results of the reference run.")
+    compare_parser.add_argument('current', help="Results of the run to check.")
+    compare_parser.add_argument('--tolerance', type=float, default=10.0,
+                                help="Drop of throughput or growth of peak RSS tolerated, in percent.")
+
+    args = parser.parse_args(argv)
+    if args.benchmark == 'suite':
+        options = {key: value for key, value in vars(args).items() if key not in ('benchmark', 'datasets', 'output')}
+        report = bench_suite(options, args.datasets)
+        print_suite(report)
+        if args.output:
+            with open(args.output, 'w') as output_file:
+                json.dump(report, output_file, indent=2)
+    elif args.benchmark == 'compare':
+        with open(args.baseline) as baseline_file:
+            baseline = json.load(baseline_file)
+        with open(args.current) as current_file:
+            current = json.load(current_file)
+        rows = compare_reports(baseline, current, args.tolerance / 100)
+        print_comparison(baseline, current, rows)
+        return 1 if any(row[-1] for row in rows) else 0
+    elif args.benchmark == 'safe_copy':
+        print_results(bench_safe_copy(args.size_mb, args.repeat))
+    elif args.benchmark == 'metadata':
+        print_timings(bench_metadata(args.size_mb))
+    elif args.benchmark == 'small_files':
+        print_rates(bench_small_files(args.files, args.size_kb, args.workers))
+    elif args.benchmark == 'startup':
+        print_durations(bench_startup(args.repeat))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,146 @@
+import os
+import sqlite3
+import threading
+import time
+
+# Number of checksums kept by default before the least recently used ones are evicted.
+DEFAULT_MAX_ENTRIES = 100000
+
+# Files modified more recently than this (in seconds) are not cached: a write in the
+# same timestamp tick could change them without changing their mtime.
+RACY_WINDOW = 2.0
+
+
+def default_cache_path():
+    """
+    Returns the default location of the checksum cache database.
+
+    Returns:
+        str: The path of the database, in the user cache directory.
+    """
+    if os.name == 'nt':
+        cache_dir = os.environ.get('LOCALAPPDATA', os.path.expanduser('~'))
+    else:
+        cache_dir = os.environ.get('XDG_CACHE_HOME', os.path.join(os.path.expanduser('~'), '.cache'))
+    return os.path.join(cache_dir, 'copy_app', 'checksums.sqlite')
+
+
+class ChecksumCache:
+    """
+    A persistent cache of file checksums, so an unchanged source is only hashed once.
+
+    Entries are keyed by device, inode, size and mtime_ns: any change to the file gives
+    it a new key, so a stale checksum is never returned. The cache keeps at most
+    max_entries checksums and evicts the least recently used ones beyond that.
+
+    Attributes:
+        path (str): The path of the SQLite database.
+        max_entries (int): The maximum number of checksums kept.
+    """
+
+    def __init__(self, path=None, max_entries=DEFAULT_MAX_ENTRIES):
+        """
+        Opens the cache, creating the database if needed.
+
+        Args:
+            path (str, optional): The path of the database. Defaults to default_cache_path().
+            max_entries (int, optional): The maximum number of checksums kept.
+        """
+        self.path = path or default_cache_path()
+        self.max_entries = max_entries
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._puts_since_eviction = 0
+        self._connection = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+        with self._connection:
+            self._connection.execute('PRAGMA journal_mode=WAL')
+            # The cache can always be rebuilt, so it does not need to survive a power loss
+            self._connection.execute('PRAGMA synchronous=NORMAL')
+            self._connection.execute(
+                'CREATE TABLE IF NOT EXISTS checksums ('
+                ' device INTEGER, inode INTEGER, size INTEGER, mtime_ns INTEGER, algorithm TEXT,'
+                ' checksum TEXT NOT NULL, last_used REAL NOT NULL,'
+                ' PRIMARY KEY (device, inode, size, mtime_ns, algorithm))'
+            )
+            self._connection.execute('CREATE INDEX IF NOT EXISTS checksums_last_used ON checksums (last_used)')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    @staticmethod
+    def _key(stat, algorithm):
+        return (stat.st_dev, stat.st_ino, stat.st_size, stat.st_mtime_ns, algorithm)
+
+    def get(self, stat, algorithm):
+        """
+        Returns the cached checksum of a file.
+
+        Args:
+            stat (os.stat_result): The stat of the file.
+            algorithm (str): The hashing algorithm.
+
+        Returns:
+            str: The checksum, or None if it is not cached.
+        """
+        key = self._key(stat, algorithm)
+        with self._lock, self._connection:
+            row = self._connection.execute(
+                'SELECT checksum FROM checksums'
+                ' WHERE device = ? AND inode = ? AND size = ? AND mtime_ns = ? AND algorithm = ?', key
+            ).fetchone()
+            if row is None:
+                return None
+            self._connection.execute(
+                'UPDATE checksums SET last_used = ?'
+                ' WHERE device = ? AND inode = ? AND size = ? AND mtime_ns = ? AND algorithm = ?', (time.time(),) + key
+            )
+        return row[0]
+
+    def put(self, stat, algorithm, checksum):
+        """
+        Caches the checksum of a file, evicting the least recently used entries if the cache is full.
+
+        Files modified within the last RACY_WINDOW seconds are not cached. Eviction runs
+        once every 1% of max_entries insertions, so the cache may briefly hold up to 1%
+        more entries than max_entries.
+
+        Args:
+            stat (os.stat_result): The stat of the file, taken before it was hashed.
+            algorithm (str): The hashing algorithm.
+            checksum (str): The checksum of the file.
+        """
+        now = time.time()
+        if now - stat.st_mtime_ns / 1e9 < RACY_WINDOW:
+            return
+        with self._lock, self._connection:
+            self._connection.execute(
+                'INSERT OR REPLACE INTO checksums VALUES (?, ?, ?, ?, ?, ?, ?)',
+                self._key(stat, algorithm) + (checksum, now)
+            )
+            self._puts_since_eviction += 1
+            if self._puts_since_eviction >= max(1, self.max_entries // 100):
+                self._puts_since_eviction = 0
+                self._evict()
+
+    def _evict(self):
+        """
+        Deletes the least recently used entries beyond max_entries.
+        """
+        self._connection.execute(
+            'DELETE FROM checksums WHERE rowid IN'
+            ' (SELECT rowid FROM checksums ORDER BY last_used DESC LIMIT -1 OFFSET ?)', (self.max_entries,)
+        )
+
+    def __len__(self):
+        with self._lock:
+            return self._connection.execute('SELECT COUNT(*) FROM checksums').fetchone()[0]
+
+    def close(self):
+        """
+        Closes the database.
+        """
+        with self._lock:
+            self._connection.close()
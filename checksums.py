@@ -0,0 +1,134 @@
+import hashlib
+import os
+import zlib
+
+try:
+    import xxhash
+except ImportError:
+    xxhash = None
+
+try:
+    import crc32c
+except ImportError:
+    crc32c = None
+
+KB = 1024
+MB = 1024 * KB
+
+# Files at least this large are hashed through a memory map.
+MMAP_THRESHOLD = 64 * MB
+
+# Bounds of the chunk size used to read a file.
+MIN_CHUNK_SIZE = 64 * KB
+MAX_CHUNK_SIZE = 8 * MB
+
+_algorithms = {}
+
+
+class _Crc:
+    """
+    Wraps a zlib-style crc function in the hashlib interface (update, hexdigest, copy).
+    """
+
+    def __init__(self, name, crc_func, value=0):
+        self.name = name
+        self.digest_size = 4
+        self._crc_func = crc_func
+        self._value = value
+
+    def update(self, data):
+        self._value = self._crc_func(data, self._value)
+
+    def digest(self):
+        return self._value.to_bytes(4, 'big')
+
+    def hexdigest(self):
+        return f"{self._value:08x}"
+
+    def copy(self):
+        return _Crc(self.name, self._crc_func, self._value)
+
+
+def register_algorithm(name, factory):
+    """
+    Registers a hashing algorithm.
+
+    Args:
+        name (str): The name of the algorithm, as passed to new_hasher.
+        factory (callable): Returns a new hash object with the hashlib interface.
+    """
+    _algorithms[name] = factory
+
+
+def available_algorithms():
+    """
+    Returns the names of the registered algorithms and those provided by hashlib.
+
+    Returns:
+        list: The sorted algorithm names.
+    """
+    return sorted(set(_algorithms) | hashlib.algorithms_available)
+
+
+def new_hasher(algorithm):
+    """
+    Creates a hash object for the given algorithm.
+
+    Args:
+        algorithm (str): A registered algorithm or any algorithm supported by hashlib.
+
+    Returns:
+        A hash object with update(), hexdigest() and copy().
+
+    Raises:
+        ValueError: If the algorithm is not supported.
+    """
+    factory = _algorithms.get(algorithm)
+    if factory is not None:
+        return factory()
+    try:
+        return hashlib.new(algorithm)
+    except ValueError:
+        raise ValueError(f"Unsupported hash algorithm: {algorithm}") from None
+
+
+def chunk_size_for(file_size, path=None):
+    """
+    Chooses how many bytes to read at a time from a file.
+
+    Small files are read in one go, large ones in MiB-scale chunks so the per-call
+    overhead stays negligible. The result is a multiple of the block size of the
+    device holding the file, when it is known.
+
+    Args:
+        file_size (int): The size of the file in bytes.
+        path (str, optional): The path of the file, used to look up the device block size.
+
+    Returns:
+        int: The chunk size in bytes.
+    """
+    if file_size <= MIN_CHUNK_SIZE:
+        chunk_size = MIN_CHUNK_SIZE
+    else:
+        chunk_size = min(max(file_size // 16, MB), MAX_CHUNK_SIZE)
+
+    block_size = 0
+    if path is not None:
+        try:
+            block_size = getattr(os.stat(path), 'st_blksize', 0)
+        except OSError:
+            pass
+    if block_size > 0:
+        chunk_size = max(block_size, chunk_size - chunk_size % block_size)
+    return chunk_size
+
+
+register_algorithm('crc32', lambda: _Crc('crc32', zlib.crc32))
+
+if crc32c is not None:
+    register_algorithm('crc32c', lambda: _Crc('crc32c', crc32c.crc32c))
+
+if xxhash is not None:
+    register_algorithm('xxh64', xxhash.xxh64)
+    register_algorithm('xxh3_64', xxhash.xxh3_64)
+    register_algorithm('xxh3_128', xxhash.xxh3_128)
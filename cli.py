@@ -0,0 +1,592 @@
+"""
+Command line interface of the copy app, for headless ingest servers.
+
+Usage examples, from the directory containing the app:
+
+    python -m copy_app copy /captures/run_42 --destination /archive
+    python -m copy_app copy '/captures/2024-05-01/*' --destination /archive --jobs 4 --json
+    python -m copy_app copy /captures/run_42 --destination /nas --limit 50M --schedule '22:00-06:00=unlimited'
+    python -m copy_app copy /captures/run_42 --destination /archive --metrics-log /var/log/copy_app.jsonl \
+        --prometheus-textfile /var/lib/node_exporter/textfile/copy_app.prom
+    python -m copy_app copy /captures/run_42 -d /archive -d /nas --verify full --verify deferred
+    python -m copy_app verify /archive/run_42_1
+    python -m copy_app copy /captures/run_42 -d /archive -d /nas --compress none --compress zstd
+    python -m copy_app restore /nas/run_42_1 /restored/run_42
+    python -m copy_app gc /archive
+    python -m copy_app watch /captures/drop --destination /archive --jobs 2 --staging folder
+
+This module does not import tkinter or PIL.
+"""
+import argparse
+import glob
+import json
+import os
+import signal
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from checksum_cache import ChecksumCache, default_cache_path
+from checksums import available_algorithms
+from compress import CODECS
+from file_operations import (
+    DEFAULT_WORKERS, SMALL_FILE_THRESHOLD, VERIFY_DEFERRED, VERIFY_FULL, VERIFY_MODES, VERIFY_NONE, CopyFilesError,
+    copy_files, find_resumable_folder, get_single_json_file_path, iter_source_files, read_test_id,
+    set_destination_folder, source_identity,
+)
+from metrics import append_jsonl, write_prometheus_textfile
+from object_store import collect_garbage
+from restore import restore_folder
+from staging import STAGING_MODES
+from throttle import Throttle, parse_rate, parse_schedule
+from transfer import BACKENDS
+from verification import Verifier, verify_folder
+from watcher import (DEFAULT_MAX_ATTEMPTS, DEFAULT_MAX_QUEUED, DEFAULT_POLL_INTERVAL, DEFAULT_RETRY_DELAY,
+                     DEFAULT_SETTLE_SECONDS, DropFolderWatcher)
+
+
+def expand_sources(patterns):
+    """
+    Expands the source arguments into a list of directories.
+
+    Each argument may be a directory or a glob pattern; patterns are expanded here so
+    they also work in shells that do not expand them, such as cmd.exe.
+
+    Args:
+        patterns (list): The source arguments.
+
+    Returns:
+        list: The source directories, without duplicates, in argument order.
+
+    Raises:
+        FileNotFoundError: If an argument matches no directory.
+    """
+    sources = []
+    for pattern in patterns:
+        matches = sorted(path for path in glob.glob(pattern) if os.path.isdir(path))
+        if not matches:
+            raise FileNotFoundError(f"No source directory matches {pattern}")
+        for path in matches:
+            if path not in sources:
+                sources.append(path)
+    return sources
+
+
+def plan_copy(source_dir, destination_root_dir, recursive=False, resume=False):
+    """
+    Describes what copying a source directory would do, without copying anything.
+
+    Args:
+        source_dir (str): The path to the source directory.
+        destination_root_dir (str): The path to the root directory where the files would be copied.
+        recursive (bool, optional): Include the subdirectories. Defaults to False.
+        resume (bool, optional): Resume an incomplete copy of the source. Defaults to False.
+
+    Returns:
+        dict: The test ID, the destination folder, and the number and size of the files.
+    """
+    json_file_path = get_single_json_file_path(source_dir)
+    test_id = read_test_id(json_file_path)
+    destination_folder = None
+    if resume:
+        destination_folder = find_resumable_folder(destination_root_dir, test_id,
+                                                   source_identity(source_dir, json_file_path))
+    if destination_folder is None:
+        destination_folder = set_destination_folder(destination_root_dir, test_id)
+    files = 0
+    total_bytes = 0
+    for _, _, size in iter_source_files(source_dir, recursive):
+        files += 1
+        total_bytes += size
+    return {
+        'test_id': test_id,
+        'destination_folder': destination_folder,
+        'files': files,
+        'bytes': total_bytes,
+    }
+
+
+def per_destination(values, destinations, option):
+    """
+    Matches the values of a repeatable option with the destination roots.
+
+    A single value applies to every root; otherwise there must be one per root, in order.
+
+    Args:
+        values (list): The values of the option.
+        destinations (list): The destination roots.
+        option (str): The name of the option, for the error message.
+
+    Returns:
+        list: The value of each destination root.
+
+    Raises:
+        ValueError: If the number of values does not match the number of roots.
+    """
+    if len(values) == 1:
+        return list(values) * len(destinations)
+    if len(values) != len(destinations):
+        raise ValueError(f"{len(values)} {option} values given for {len(destinations)} destinations.")
+    return list(values)
+
+
+def verification_modes(args):
+    """
+    Returns the verification mode of every destination root given on the command line.
+
+    Args:
+        args (argparse.Namespace): The parsed command line arguments.
+
+    Returns:
+        list: The mode of each destination root, one of file_operations.VERIFY_MODES.
+
+    Raises:
+        ValueError: If the number of modes does not match the number of roots.
+    """
+    modes = args.verify_modes or [VERIFY_FULL if args.verify else VERIFY_NONE]
+    return per_destination(modes, args.destination, '--verify')
+
+
+def compression_codecs(args):
+    """
+    Returns the codec of every destination root given on the command line.
+
+    Args:
+        args (argparse.Namespace): The parsed command line arguments.
+
+    Returns:
+        list: The codec of each destination root, one of compress.CODECS, or None not to compress.
+
+    Raises:
+        ValueError: If the number of codecs does not match the number of roots.
+    """
+    codecs = per_destination(args.compress or ['none'], args.destination, '--compress')
+    return [None if codec == 'none' else codec for codec in codecs]
+
+
+def run_copy(source_dir, args, cache, throttle=None, resume=None, verifier=None, progress=None):
+    """
+    Copies one source directory to every destination root and reports the outcomes.
+
+    The source is read once for all the destination roots, see copy_files.
+
+    Args:
+        source_dir (str): The path to the source directory.
+        args (argparse.Namespace): The parsed command line arguments.
+        cache (ChecksumCache): The checksum cache, or None.
+        throttle (Throttle, optional): The throttle shared by all the sources.
+        resume (bool or list, optional): Resume an incomplete copy of the source, or the destination folder
+            to resume in each root, see copy_files. Defaults to args.resume.
+        verifier (Verifier, optional): Verifies the destinations in deferred verification mode.
+        progress (callable, optional): Called with a ProgressEvent as the copy goes, see copy_files.
+
+    Returns:
+        list: The outcome of the copy to each destination root, with a 'status' of 'ok',
+        'planned' or 'failed' (some files failed); a single outcome with the 'error'
+        status if the copy could not start.
+    """
+    resume = args.resume if resume is None else resume
+    include_files = args.metrics_log is not None
+    try:
+        if args.dry_run:
+            return [{'source': source_dir, **plan_copy(source_dir, destination, args.recursive, resume),
+                     'status': 'planned'} for destination in args.destination]
+        json_file_path = get_single_json_file_path(source_dir)
+        summaries = copy_files(source_dir, list(args.destination), json_file_path, workers=args.workers,
+                               algorithm=args.algorithm, verify=verification_modes(args), backend=args.backend,
+                               resume=resume, cache=cache, recursive=args.recursive, staging=args.staging,
+                               dedup=args.dedup, small_file_threshold=args.small_file_threshold,
+                               throttle=throttle, low_priority=args.low_priority, verifier=verifier,
+                               compression=compression_codecs(args), progress=progress)
+    except CopyFilesError as e:
+        summaries = e.summaries
+    except Exception as e:
+        return [{'source': source_dir, 'status': 'error', 'error': str(e)}]
+    return [{'source': source_dir, **summary.to_dict(include_files=include_files),
+             'status': 'failed' if summary.failures else 'ok'} for summary in summaries]
+
+
+def format_outcome(outcome):
+    """
+    Formats the outcome of a copy for a terminal.
+
+    Args:
+        outcome (dict): The outcome returned by run_copy.
+
+    Returns:
+        str: A human readable description.
+    """
+    source = outcome['source']
+    if outcome['status'] == 'error':
+        return f"{source}: ERROR {outcome['error']}"
+    if outcome['status'] == 'planned':
+        return (f"{source}: would copy {outcome['files']} files ({outcome['bytes'] / 1024 ** 2:.1f} MiB) "
+                f"to {outcome['destination_folder']}")
+    lines = [
+        f"{source}: {'OK' if outcome['status'] == 'ok' else 'FAILED'} "
+        f"{outcome['files_copied']} files copied, {outcome['files_skipped']} skipped, "
+        f"{outcome['bytes_copied'] / 1024 ** 2:.1f} MiB in {outcome['elapsed']:.2f} s "
+        f"({outcome['throughput'] / 1024 ** 2:.1f} MiB/s) to {outcome['destination_folder']}"
+    ]
+    if outcome.get('compression'):
+        lines.append(f"  compressed with {outcome['compression']}: {outcome['bytes_stored'] / 1024 ** 2:.1f} MiB stored")
+    phases = [(phase, seconds) for phase, seconds in outcome.get('phases', {}).items() if seconds >= 0.005]
+    if phases:
+        lines.append("  time by phase: " + ", ".join(f"{phase} {seconds:.2f} s" for phase, seconds in phases))
+    lines.extend(f"  {path}: {error}" for path, error in sorted(outcome['failures'].items()))
+    return "\n".join(lines)
+
+
+def format_report(report):
+    """
+    Formats the report of the verification of a folder for a terminal.
+
+    Args:
+        report (dict): A verification.VerificationReport as a dictionary.
+
+    Returns:
+        str: A human readable description.
+    """
+    lines = [
+        f"{report['folder']}: {'VERIFIED' if report['status'] == 'ok' else 'VERIFY FAILED'} "
+        f"{report['files_verified']} files ({report['bytes_verified'] / 1024 ** 2:.1f} MiB) "
+        f"in {report['elapsed']:.2f} s ({report['throughput'] / 1024 ** 2:.1f} MiB/s)"
+    ]
+    lines.extend(f"  {path}: {error}" for path, error in sorted(report['failures'].items()))
+    return "\n".join(lines)
+
+
+def command_copy(args):
+    """
+    Runs the copy command: copies every source directory, several at a time, to every destination root.
+
+    The rate limit applies to all the sources together. The outcomes can also be
+    appended to a JSON-lines log, with the metrics of every file, and exported for the
+    textfile collector of the Prometheus node exporter. The destinations in deferred
+    verification mode are verified while the other sources copy, and their reports
+    printed once every source is copied.
+
+    Args:
+        args (argparse.Namespace): The parsed command line arguments.
+
+    Returns:
+        int: The exit code, 0 if every source was copied without failure.
+    """
+    sources = expand_sources(args.sources)
+    throttle = Throttle(args.limit, args.schedule) if args.limit or args.schedule else None
+    cache = ChecksumCache(args.cache_path or default_cache_path()) if args.cache else None
+    verifier = Verifier(args.workers) if VERIFY_DEFERRED in verification_modes(args) and not args.dry_run else None
+    start = time.perf_counter()
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, args.jobs)) as executor:
+            outcomes = [outcome for source_outcomes in
+                        executor.map(lambda source_dir: run_copy(source_dir, args, cache, throttle, verifier=verifier),
+                                     sources)
+                        for outcome in source_outcomes]
+    finally:
+        if cache is not None:
+            cache.close()
+    elapsed = time.perf_counter() - start
+    reports = []
+    if verifier is not None:
+        if not args.json:
+            for outcome in outcomes:
+                print(format_outcome(outcome), flush=True)
+        with verifier:
+            reports = [report.to_dict() for report in verifier.wait()]
+
+    if args.metrics_log:
+        finished_at = time.time()
+        append_jsonl(args.metrics_log, [dict(outcome, finished_at=finished_at) for outcome in outcomes])
+        for outcome in outcomes:
+            outcome.pop('files', None)
+    if args.prometheus_textfile:
+        write_prometheus_textfile(args.prometheus_textfile, outcomes, elapsed)
+
+    if args.json:
+        results = {'elapsed': elapsed, 'results': outcomes}
+        if verifier is not None:
+            results['verifications'] = reports
+        json.dump(results, sys.stdout, indent=2)
+        sys.stdout.write("\n")
+    else:
+        if verifier is None:
+            for outcome in outcomes:
+                print(format_outcome(outcome))
+        for report in reports:
+            print(format_report(report))
+        if len(sources) > 1:
+            failed = len({outcome['source'] for outcome in outcomes if outcome['status'] in ('failed', 'error')})
+            print(f"{len(sources)} sources processed in {elapsed:.2f} s, {failed} with errors.")
+    if not all(report['status'] == 'ok' for report in reports):
+        return 1
+    return 0 if all(outcome['status'] in ('ok', 'planned') for outcome in outcomes) else 1
+
+
+def command_gc(args):
+    """
+    Runs the gc command: removes the objects of the object store no folder references any more.
+
+    Args:
+        args (argparse.Namespace): The parsed command line arguments.
+
+    Returns:
+        int: The exit code.
+    """
+    stats = collect_garbage(args.destination, dry_run=args.dry_run)
+    if args.json:
+        json.dump(stats, sys.stdout, indent=2)
+        sys.stdout.write("\n")
+    else:
+        action = "would remove" if args.dry_run else "removed"
+        print(f"{args.destination}: {action} {stats['objects_removed']} objects "
+              f"({stats['bytes_freed'] / 1024 ** 2:.1f} MiB), kept {stats['objects_kept']}")
+    return 0
+
+
+def command_verify(args):
+    """
+    Runs the verify command: re-verifies destination folders against their manifest, offline.
+
+    Args:
+        args (argparse.Namespace): The parsed command line arguments.
+
+    Returns:
+        int: The exit code, 0 if every file of every folder matches its checksum.
+    """
+    reports = [verify_folder(folder, workers=args.workers, record=args.record).to_dict() for folder in args.folders]
+    if args.json:
+        json.dump(reports, sys.stdout, indent=2)
+        sys.stdout.write("\n")
+    else:
+        for report in reports:
+            print(format_report(report))
+    return 0 if all(report['status'] == 'ok' for report in reports) else 1
+
+
+def command_restore(args):
+    """
+    Runs the restore command: restores a copied folder, decompressing its compressed files.
+
+    Args:
+        args (argparse.Namespace): The parsed command line arguments.
+
+    Returns:
+        int: The exit code, 0 if every file was restored and matches its checksum.
+    """
+    summary = restore_folder(args.folder, args.destination, workers=args.workers)
+    outcome = {'source': args.folder, **summary.to_dict(), 'status': 'failed' if summary.failures else 'ok'}
+    if args.json:
+        json.dump(outcome, sys.stdout, indent=2)
+        sys.stdout.write("\n")
+    else:
+        print(format_outcome(outcome))
+    return 0 if outcome['status'] == 'ok' else 1
+
+
+def command_watch(args):
+    """
+    Runs the watch command: copies every capture folder dropped in a directory, until interrupted.
+
+    Each outcome is printed as soon as the folder is copied, and exported like the
+    outcomes of the copy command. The reports of deferred verifications are printed as
+    they complete. SIGINT and SIGTERM stop the watcher once the running copies and
+    verifications finish.
+
+    Args:
+        args (argparse.Namespace): The parsed command line arguments.
+
+    Returns:
+        int: The exit code.
+    """
+    throttle = Throttle(args.limit, args.schedule) if args.limit or args.schedule else None
+    cache = ChecksumCache(args.cache_path or default_cache_path()) if args.cache else None
+    stop_event = threading.Event()
+    lock = threading.Lock()
+
+    def report_verification(report):
+        with lock:
+            if args.json:
+                print(json.dumps(report.to_dict()), flush=True)
+            else:
+                print(format_report(report.to_dict()), flush=True)
+
+    verifier = Verifier(args.workers, on_report=report_verification) \
+        if VERIFY_DEFERRED in verification_modes(args) else None
+
+    def report(name, outcome):
+        with lock:
+            if args.metrics_log:
+                append_jsonl(args.metrics_log, [dict(outcome, finished_at=time.time())])
+                outcome.pop('files', None)
+            if args.prometheus_textfile:
+                write_prometheus_textfile(args.prometheus_textfile, [outcome])
+            if args.json:
+                print(json.dumps(outcome), flush=True)
+            else:
+                print(format_outcome(outcome), flush=True)
+
+    def ingest(folder, resume_folders, on_destination_folders):
+        def progress(event):
+            if event.kind == 'start':
+                on_destination_folders(event.destination_folders)
+
+        return run_copy(folder, args, cache, throttle, resume_folders, verifier, progress)
+
+    def stop(signum, frame):
+        stop_event.set()
+
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(signum, stop)
+    try:
+        with DropFolderWatcher(args.drop_dir, ingest, state_path=args.state, jobs=args.jobs, settle_seconds=args.settle,
+                               poll_interval=args.poll_interval, max_queued=args.max_queued,
+                               max_attempts=args.max_attempts, retry_delay=args.retry_delay,
+                               use_inotify=False if args.polling else None, retry_failed=args.retry_failed,
+                               on_outcome=report) as watcher:
+            watcher.run(stop_event)
+    finally:
+        if verifier is not None:
+            verifier.close()
+        if cache is not None:
+            cache.close()
+    return 0
+
+
+def add_copy_arguments(parser):
+    """
+    Adds the options of a copy, shared by the copy and watch commands, to a parser.
+
+    Args:
+        parser (argparse.ArgumentParser): The parser of the command.
+    """
+    parser.add_argument('-d', '--destination', required=True, action='append',
+                        help="Destination root directory; repeat it to copy to several roots, "
+                             "reading each source once.")
+    parser.add_argument('-w', '--workers', type=int, default=DEFAULT_WORKERS,
+                        help="Number of files copied concurrently per source.")
+    parser.add_argument('-a', '--algorithm', default='sha256', choices=available_algorithms(),
+                        metavar='ALGORITHM', help="Hashing algorithm used to verify the copies.")
+    verify_group = parser.add_mutually_exclusive_group()
+    verify_group.add_argument('--verify', dest='verify_modes', action='append', choices=VERIFY_MODES, metavar='MODE',
+                              help="How the copies are verified: full (read back), sampled (compare blocks of large "
+                                   "files), deferred (read back in the background) or none. Repeat it to give the mode "
+                                   "of each destination, in order.")
+    verify_group.add_argument('--no-verify', dest='verify', action='store_false',
+                              help="Do not read the copies back to verify them, like --verify none.")
+    parser.add_argument('--compress', action='append', choices=CODECS + ('none',), metavar='CODEC',
+                        help="Compress the copies that would shrink, with zstd (gzip if zstandard is not installed), "
+                             "gzip or none. Repeat it to give the codec of each destination, in order.")
+    parser.add_argument('--backend', default='stream', choices=['stream', 'auto'] + list(BACKENDS),
+                        help="How the bytes are transferred.")
+    parser.add_argument('-r', '--recursive', action='store_true', help="Copy the subdirectories too.")
+    parser.add_argument('--staging', choices=STAGING_MODES,
+                        help="Write each file, or the whole folder, aside and rename it into place once complete.")
+    parser.add_argument('--small-file-threshold', type=int, default=SMALL_FILE_THRESHOLD, metavar='BYTES',
+                        help="Size up to which files are copied in memory, in batches (0 to disable).")
+    parser.add_argument('--limit', type=parse_rate, metavar='RATE',
+                        help="Maximum copy rate of all the sources together, e.g. 50M (bytes per second).")
+    parser.add_argument('--schedule', type=parse_schedule, metavar='WINDOWS',
+                        help="Rates by time of day, overriding --limit, e.g. '07:00-19:00=20M,19:00-07:00=unlimited'.")
+    parser.add_argument('--low-priority', action='store_true',
+                        help="Copy at a low CPU and I/O priority, to leave the disk to other processes.")
+    parser.add_argument('--dedup', action='store_true',
+                        help="Hardlink content already stored under the destination root instead of copying it.")
+    parser.add_argument('--cache', action='store_true', help="Cache source checksums between runs.")
+    parser.add_argument('--cache-path', help="Path of the checksum cache database.")
+    parser.add_argument('--metrics-log', metavar='PATH',
+                        help="Append the results, with the metrics of every file, to a JSON-lines log.")
+    parser.add_argument('--prometheus-textfile', metavar='PATH',
+                        help="Write the metrics of the run to a .prom file for the node exporter.")
+
+
+def build_parser():
+    """
+    Builds the command line parser.
+
+    Returns:
+        argparse.ArgumentParser: The parser.
+    """
+    parser = argparse.ArgumentParser(prog='copy_app', description="Safely copy capture folders.")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    copy_parser = subparsers.add_parser('copy', help="Copy one or more capture folders.")
+    copy_parser.add_argument('sources', nargs='+', help="Source directories or glob patterns.")
+    add_copy_arguments(copy_parser)
+    copy_parser.add_argument('-j', '--jobs', type=int, default=1,
+                             help="Number of source directories copied concurrently.")
+    copy_parser.add_argument('--resume', action='store_true', help="Resume the incomplete copy of each source, if any.")
+    copy_parser.add_argument('-n', '--dry-run', action='store_true', help="Show what would be copied.")
+    copy_parser.add_argument('--json', action='store_true', help="Print the results as JSON.")
+    copy_parser.set_defaults(func=command_copy)
+
+    watch_parser = subparsers.add_parser('watch', help="Copy every capture folder dropped in a directory, "
+                                                       "once it is complete.")
+    watch_parser.add_argument('drop_dir', help="Directory the capture folders are dropped in.")
+    add_copy_arguments(watch_parser)
+    watch_parser.add_argument('-j', '--jobs', type=int, default=1, help="Number of folders copied concurrently.")
+    watch_parser.add_argument('--settle', type=float, default=DEFAULT_SETTLE_SECONDS, metavar='SECONDS',
+                              help="Time the files of a folder must stay unchanged before it is copied.")
+    watch_parser.add_argument('--poll-interval', type=float, default=DEFAULT_POLL_INTERVAL, metavar='SECONDS',
+                              help="Time between two checks of the drop directory.")
+    watch_parser.add_argument('--polling', action='store_true',
+                              help="Check the drop directory periodically instead of using inotify.")
+    watch_parser.add_argument('--max-queued', type=int, default=DEFAULT_MAX_QUEUED,
+                              help="Number of complete folders waiting for a worker beyond which new ones wait.")
+    watch_parser.add_argument('--max-attempts', type=int, default=DEFAULT_MAX_ATTEMPTS,
+                              help="Number of times a failed folder is copied before it is left aside.")
+    watch_parser.add_argument('--retry-delay', type=float, default=DEFAULT_RETRY_DELAY, metavar='SECONDS',
+                              help="Time before a failed folder is copied again.")
+    watch_parser.add_argument('--retry-failed', action='store_true',
+                              help="Copy again the folders left aside by an earlier run.")
+    watch_parser.add_argument('--state', metavar='PATH',
+                              help="Path of the file recording the queue and the folders already copied.")
+    watch_parser.add_argument('--json', action='store_true', help="Print every result as a line of JSON.")
+    watch_parser.set_defaults(func=command_watch, dry_run=False, resume=False)
+
+    verify_parser = subparsers.add_parser('verify', help="Re-verify copied folders against their manifest.")
+    verify_parser.add_argument('folders', nargs='+', help="Destination folders, e.g. /archive/test_1_2.")
+    verify_parser.add_argument('-w', '--workers', type=int, default=DEFAULT_WORKERS,
+                               help="Number of files verified concurrently.")
+    verify_parser.add_argument('--record', action='store_true',
+                               help="Record the outcome in the manifest, so a resumed copy recopies the bad files.")
+    verify_parser.add_argument('--json', action='store_true', help="Print the results as JSON.")
+    verify_parser.set_defaults(func=command_verify)
+
+    restore_parser = subparsers.add_parser('restore', help="Restore a copied folder, decompressing its files.")
+    restore_parser.add_argument('folder', help="Destination folder to restore, e.g. /nas/test_1_2.")
+    restore_parser.add_argument('destination', help="Folder to restore the files to.")
+    restore_parser.add_argument('-w', '--workers', type=int, default=DEFAULT_WORKERS,
+                                help="Number of files restored concurrently.")
+    restore_parser.add_argument('--json', action='store_true', help="Print the result as JSON.")
+    restore_parser.set_defaults(func=command_restore)
+
+    gc_parser = subparsers.add_parser('gc', help="Remove deduplicated content no folder references any more.")
+    gc_parser.add_argument('destination', help="Destination root directory.")
+    gc_parser.add_argument('-n', '--dry-run', action='store_true', help="Show what would be removed.")
+    gc_parser.add_argument('--json', action='store_true', help="Print the result as JSON.")
+    gc_parser.set_defaults(func=command_gc)
+
+    return parser
+
+
+def main(argv=None):
+    """
+    Runs the command line interface.
+
+    Args:
+        argv (list, optional): The arguments. Defaults to sys.argv[1:].
+
+    Returns:
+        int: The exit code.
+    """
+    args = build_parser().parse_args(argv)
+    try:
+        return args.func(args)
+    except (OSError, ValueError) as e:
+        print(f"copy_app: error: {e}", file=sys.stderr)
+        return 2
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,292 @@
+"""
+Compression of the copies written to archive destinations.
+
+Files are compressed as they are copied, with zstd when the zstandard package is
+installed and with gzip from the standard library otherwise. A compressed copy is
+stored under the name of the file with the suffix of its codec (video.csv.zst); its
+checksum remains the checksum of the uncompressed content, so a verified copy still
+holds the same bytes as the source once decompressed.
+
+Files that would not shrink are copied as they are: media and archives recognised by
+their extension, and files whose sampled bytes look random.
+"""
+import collections
+import gzip
+import math
+import os
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+CODEC_ZSTD = 'zstd'
+CODEC_GZIP = 'gzip'
+CODECS = (CODEC_ZSTD, CODEC_GZIP)
+
+# Suffix added to the name of a compressed copy.
+SUFFIXES = {CODEC_ZSTD: '.zst', CODEC_GZIP: '.gz'}
+
+# Compression levels: fast enough to keep up with a NAS link on one core.
+ZSTD_LEVEL = 3
+GZIP_LEVEL = 3
+
+# Files smaller than this are not worth the header and the time of a codec.
+MIN_COMPRESS_SIZE = 4 * 1024
+
+# Extensions of formats that are already compressed.
+INCOMPRESSIBLE_EXTENSIONS = frozenset((
+    '.mp3', '.mp4', '.m4a', '.m4v', '.mov', '.mkv', '.avi', '.webm', '.aac', '.ogg', '.opus', '.flac', '.wma',
+    '.jpg', '.jpeg', '.png', '.gif', '.webp', '.heic', '.h264', '.h265', '.hevc',
+    '.gz', '.tgz', '.zst', '.xz', '.bz2', '.lz4', '.zip', '.7z', '.rar',
+))
+
+# Number of bytes sampled from the middle of a file to estimate its entropy.
+ENTROPY_SAMPLE_SIZE = 64 * 1024
+
+# Files whose sample has more bits of entropy per byte than this are left uncompressed.
+MAX_ENTROPY = 7.5
+
+# Files at least this large are compressed by several threads.
+PARALLEL_THRESHOLD = 16 * 1024 * 1024
+
+# Largest number of threads compressing one file.
+MAX_COMPRESS_THREADS = 4
+
+# Size of the chunks read when decompressing.
+READ_CHUNK = 1024 * 1024
+
+# Errors raised when reading a corrupt or truncated compressed file.
+DECOMPRESSION_ERRORS = (OSError, EOFError, zlib.error) + ((zstandard.ZstdError,) if zstandard is not None else ())
+
+
+def resolve_codec(codec):
+    """
+    Returns the codec that compresses for a requested codec.
+
+    Args:
+        codec (str): One of CODECS.
+
+    Returns:
+        str: codec, or CODEC_GZIP for CODEC_ZSTD when the zstandard package is not installed.
+
+    Raises:
+        ValueError: If codec is not one of CODECS.
+    """
+    if codec not in CODECS:
+        raise ValueError(f"Unknown compression {codec}, expected one of {', '.join(CODECS)}")
+    if codec == CODEC_ZSTD and zstandard is None:
+        return CODEC_GZIP
+    return codec
+
+
+def compressed_path(path, codec):
+    """
+    Returns the path a file is stored at once compressed with a codec.
+    """
+    return path + SUFFIXES[codec]
+
+
+def entropy(data):
+    """
+    Returns the Shannon entropy of some bytes, in bits per byte (0 to 8).
+    """
+    if not data:
+        return 0.0
+    total = len(data)
+    return -sum(count / total * math.log2(count / total) for count in collections.Counter(data).values())
+
+
+def read_sample(path, size):
+    """
+    Reads ENTROPY_SAMPLE_SIZE bytes from the middle of a file, past any header.
+    """
+    offset = max(0, size // 2 - ENTROPY_SAMPLE_SIZE // 2)
+    with open(path, 'rb', buffering=0) as f:
+        f.seek(offset)
+        return f.read(ENTROPY_SAMPLE_SIZE)
+
+
+def choose_codec(path, codec, size=None, sample=None):
+    """
+    Decides whether a file is compressed, and with which codec.
+
+    The decision only depends on the name and content of the file, so a resumed copy
+    makes the same one.
+
+    Args:
+        path (str): The path of the source file.
+        codec (str): The requested codec, one of CODECS, or None not to compress.
+        size (int, optional): The size of the file in bytes. Defaults to None, which stats the file.
+        sample (bytes, optional): The content of the file, or a part of it, to estimate its entropy.
+            Defaults to None, which reads a sample from the middle of the file.
+
+    Returns:
+        str: The codec to compress the file with, or None to copy it as it is.
+    """
+    if codec is None or os.path.splitext(path)[1].lower() in INCOMPRESSIBLE_EXTENSIONS:
+        return None
+    if size is None:
+        size = os.path.getsize(path)
+    if size < MIN_COMPRESS_SIZE:
+        return None
+    if sample is None:
+        sample = read_sample(path, size)
+    elif len(sample) > ENTROPY_SAMPLE_SIZE:
+        middle = len(sample) // 2 - ENTROPY_SAMPLE_SIZE // 2
+        sample = sample[middle:middle + ENTROPY_SAMPLE_SIZE]
+    if entropy(sample) > MAX_ENTROPY:
+        return None
+    return resolve_codec(codec)
+
+
+def compression_threads(size):
+    """
+    Returns the number of threads compressing a file of a given size.
+    """
+    if size < PARALLEL_THRESHOLD:
+        return 1
+    return max(1, min(MAX_COMPRESS_THREADS, os.cpu_count() or 1))
+
+
+def compress_bytes(data, codec):
+    """
+    Compresses bytes held in memory in one go.
+    """
+    if codec == CODEC_ZSTD:
+        return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(data)
+    return gzip.compress(data, GZIP_LEVEL, mtime=0)
+
+
+def decompress_bytes(data, codec):
+    """
+    Decompresses bytes compressed by compress_bytes or a StreamCompressor.
+    """
+    if codec == CODEC_ZSTD:
+        return zstandard.ZstdDecompressor().decompressobj().decompress(data)
+    return gzip.decompress(data)
+
+
+class StreamCompressor:
+    """
+    Compresses a file chunk by chunk, as it is copied.
+
+    With several threads, zstd splits the stream into jobs compressed in parallel. For
+    gzip, each chunk is compressed by a thread of a pool into a gzip member of its own,
+    as pigz does: the members are written in order, and the concatenation is a valid
+    gzip file for every gzip reader. zlib releases the GIL, so the threads run in
+    parallel.
+
+    Attributes:
+        codec (str): The codec, one of CODECS.
+        threads (int): The number of threads compressing the stream.
+    """
+
+    def __init__(self, codec, threads=1):
+        self.codec = codec
+        self.threads = threads
+        self._pool = None
+        self._pending = []
+        if codec == CODEC_ZSTD:
+            self._compressor = zstandard.ZstdCompressor(level=ZSTD_LEVEL, threads=threads if threads > 1 else 0) \
+                .compressobj()
+        elif threads > 1:
+            self._pool = ThreadPoolExecutor(max_workers=threads)
+        else:
+            self._compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def compress(self, chunk):
+        """
+        Compresses a chunk of the stream.
+
+        Args:
+            chunk (bytes): The next bytes of the file.
+
+        Returns:
+            bytes: The compressed bytes ready to be written, possibly none.
+        """
+        if self._pool is None:
+            return self._compressor.compress(chunk)
+        self._pending.append(self._pool.submit(gzip.compress, chunk, GZIP_LEVEL, mtime=0))
+        ready = []
+        # Keep every thread busy, and at most two chunks per thread in memory
+        while self._pending and (self._pending[0].done() or len(self._pending) > 2 * self.threads):
+            ready.append(self._pending.pop(0).result())
+        return b''.join(ready)
+
+    def flush(self):
+        """
+        Ends the stream.
+
+        Returns:
+            bytes: The last compressed bytes.
+        """
+        if self._pool is None:
+            return self._compressor.flush()
+        try:
+            return b''.join(future.result() for future in self._pending)
+        finally:
+            self._pending = []
+            self._pool.shutdown(wait=True)
+
+    def close(self):
+        """
+        Stops the threads of an unfinished stream.
+        """
+        if self._pool is not None:
+            for future in self._pending:
+                future.cancel()
+            self._pool.shutdown(wait=True)
+
+
+def open_decompressed(path, codec):
+    """
+    Opens a compressed copy for reading its uncompressed content.
+
+    Args:
+        path (str): The path of the compressed copy.
+        codec (str): Its codec, one of CODECS.
+
+    Returns:
+        file object: A binary file object, to be closed by the caller.
+    """
+    if codec == CODEC_ZSTD:
+        if zstandard is None:
+            raise ValueError(f"{path} is compressed with zstd: install the zstandard package to read it")
+        return zstandard.ZstdDecompressor().stream_reader(open(path, 'rb'), read_across_frames=True,
+                                                          closefd=True)
+    return gzip.open(path, 'rb')
+
+
+def decompress_file(path, codec, destination_path=None, hash_func=None):
+    """
+    Reads the uncompressed content of a compressed copy, hashing it and optionally writing it.
+
+    Args:
+        path (str): The path of the compressed copy.
+        codec (str): Its codec, one of CODECS.
+        destination_path (str, optional): Where to write the uncompressed content.
+        hash_func (hashlib object, optional): Updated with the uncompressed content.
+
+    Returns:
+        int: The size of the uncompressed content in bytes.
+    """
+    size = 0
+    with open_decompressed(path, codec) as source:
+        destination = open(destination_path, 'wb') if destination_path is not None else None
+        try:
+            while True:
+                chunk = source.read(READ_CHUNK)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if hash_func is not None:
+                    hash_func.update(chunk)
+                if destination is not None:
+                    destination.write(chunk)
+        finally:
+            if destination is not None:
+                destination.close()
+    return size
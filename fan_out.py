@@ -0,0 +1,155 @@
+"""
+Write a file to several destinations from a single read of its source.
+
+Every chunk read from the source is hashed once and queued to a writer thread per
+destination, so the destinations are written concurrently. Each queue holds at most
+FAN_OUT_QUEUE_CHUNKS chunks: a fast destination runs ahead of a slow one by at most
+that much, and the memory used is bounded whatever the size of the file. A destination
+that cannot be written fails on its own, without stopping the others.
+"""
+import queue
+import threading
+import time
+from concurrent.futures import wait
+from metrics import PHASE_COMPRESS, PHASE_SOURCE_HASH, PHASE_THROTTLE, PHASE_WRITE
+
+# Number of chunks a destination may lag behind the read of the source.
+FAN_OUT_QUEUE_CHUNKS = 4
+
+# Put on the queue of a destination when the read of the source fails.
+_ABORT = object()
+
+
+def _write_chunk(destination, chunk, compressor, times):
+    """
+    Writes a chunk to a destination, None being the end of the file, and adds the time spent to times.
+    """
+    started = time.perf_counter()
+    if compressor is not None:
+        chunk = compressor.compress(chunk) if chunk is not None else compressor.flush()
+        compressed = time.perf_counter()
+        times[PHASE_COMPRESS] += compressed - started
+        started = compressed
+    if chunk is not None:
+        destination.write(chunk)
+    times[PHASE_WRITE] += time.perf_counter() - started
+
+
+def _drain(chunks):
+    """
+    Takes the chunks of a queue up to the end of the file, so the reader never waits on a destination that failed.
+    """
+    chunk = chunks.get()
+    while chunk is not None and chunk is not _ABORT:
+        chunk = chunks.get()
+
+
+def _write_chunks(chunks, write_path, failed, metrics=None, compressor=None):
+    """
+    Writes the chunks queued for a destination to a file, until the end of the file.
+
+    Returns:
+        bool: True if the whole file was written, False if the read of the source failed.
+
+    Raises:
+        OSError: If the file could not be written or compressed; failed is set first.
+    """
+    times = {PHASE_WRITE: 0.0, PHASE_COMPRESS: 0.0}
+    chunk = b''
+    try:
+        with open(write_path, 'wb') as destination:
+            while chunk is not None and chunk is not _ABORT:
+                chunk = chunks.get()
+                if chunk is not _ABORT:
+                    _write_chunk(destination, chunk, compressor, times)
+    except Exception:
+        failed.set()
+        if chunk is not None and chunk is not _ABORT:
+            _drain(chunks)
+        raise
+    finally:
+        if compressor is not None:
+            compressor.close()
+        if metrics is not None:
+            for phase, seconds in times.items():
+                metrics.add(phase, seconds)
+    return chunk is None
+
+
+def _feed_writers(file_path, buffer_size, hash_func, chunks, failed, writers, throttle=None, on_progress=None,
+                  metrics=None):
+    """
+    Reads a file once for the writers, hashing it on the way.
+
+    Every chunk is queued to each writer that has not failed. Once the file is read, or
+    its read fails, the end of the file (or _ABORT) is queued to every writer and the
+    writers are waited for.
+
+    Raises:
+        OSError: If the file could not be read.
+    """
+    end = _ABORT
+    read_time = throttle_time = 0.0
+    clock = time.perf_counter
+    try:
+        with open(file_path, 'rb', buffering=0) as source:
+            while True:
+                read_started = clock()
+                # A new chunk per read: the writers still hold the previous ones
+                chunk = source.read(buffer_size)
+                if not chunk:
+                    read_time += clock() - read_started
+                    break
+                if hash_func is not None:
+                    hash_func.update(chunk)
+                read_time += clock() - read_started
+                if throttle is not None:
+                    throttle_time += throttle.consume(len(chunk))
+                for key, queued in chunks.items():
+                    if not failed[key].is_set():
+                        queued.put(chunk)
+                if on_progress is not None:
+                    on_progress(len(chunk))
+        end = None
+    finally:
+        for queued in chunks.values():
+            queued.put(end)
+        wait(list(writers.values()))
+        if metrics is not None:
+            metrics.add(PHASE_SOURCE_HASH, read_time)
+            metrics.add(PHASE_THROTTLE, throttle_time)
+
+
+def write_copies(file_path, write_paths, executor, buffer_size, hash_func=None, compressors=None, throttle=None,
+                 on_progress=None, metrics=None):
+    """
+    Writes a file to several paths, reading it only once.
+
+    Args:
+        file_path (str): The path of the file.
+        write_paths (dict): The path of each copy, keyed by any ID.
+        executor (Executor): Runs the writers, with at least one thread per copy.
+        buffer_size (int): The size of the chunks read, in bytes.
+        hash_func (optional): A hash object, e.g. from checksums.new_hasher, fed with every chunk read.
+        compressors (dict, optional): The compress.StreamCompressor of each copy written compressed,
+            keyed like write_paths.
+        throttle (Throttle, optional): Limits the rate at which the file is read.
+        on_progress (callable, optional): Called with the number of bytes read after every chunk.
+            It may raise to abort the copy.
+        metrics (PhaseTimer, optional): Receives the time spent in each phase of the copy.
+
+    Returns:
+        dict: The finished writer of each copy, keyed like write_paths: a Future that resolves to
+        True, or raises the error that failed the copy.
+
+    Raises:
+        OSError: If the file could not be read.
+    """
+    compressors = compressors or {}
+    chunks = {key: queue.Queue(FAN_OUT_QUEUE_CHUNKS) for key in write_paths}
+    failed = {key: threading.Event() for key in write_paths}
+    writers = {key: executor.submit(_write_chunks, chunks[key], write_path, failed[key], metrics,
+                                    compressors.get(key))
+               for key, write_path in write_paths.items()}
+    _feed_writers(file_path, buffer_size, hash_func, chunks, failed, writers, throttle, on_progress, metrics)
+    return writers
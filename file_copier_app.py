@@ -1,8 +1,49 @@
+import os
+import queue
+import threading
+import time
 import tkinter as tk
-from tkinter import messagebox, filedialog
-from PIL import Image, ImageTk
-from file_operations import copy_files, get_single_json_file_path
-from utils import get_value_from_dict
+from tkinter import messagebox, filedialog, ttk
+
+# PIL and the copy engine are imported when first needed, not to delay the first window.
+
+# Interval at which the Tk loop polls the copy worker for progress, in milliseconds.
+POLL_INTERVAL_MS = 100
+
+# The logo shown at the top of the window, and the size it is shown at.
+HEADER_IMAGE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'images', 'logo_copy_app.png')
+HEADER_IMAGE_SIZE = (400, 200)
+
+
+def resized_image_path(image_path, width, height):
+    """
+    Returns the path of the cached copy of an image resized to the given dimensions.
+
+    Args:
+        image_path (str): The file path of the image.
+        width (int): The width of the resized image.
+        height (int): The height of the resized image.
+
+    Returns:
+        str: The path of a PNG file next to the image, e.g. images/logo_copy_app_400x200.png.
+    """
+    return f"{os.path.splitext(image_path)[0]}_{width}x{height}.png"
+
+
+def measure_startup(root, started):
+    """
+    Shows the window and returns the time it took to appear.
+
+    Args:
+        root (tk.Tk): The root window of the application, with its widgets created.
+        started (float): The time.perf_counter() value at the start of the process.
+
+    Returns:
+        float: The time to the first window in seconds.
+    """
+    root.update()
+    return time.perf_counter() - started
+
 
 class FileCopierApp:
     """
@@ -11,13 +52,19 @@ class FileCopierApp:
     Attributes:
         root (tk.Tk): The root window of the application.
         header_image_path (str): The file path of the header image.
-        header_image (PIL.ImageTk.PhotoImage): The resized header image.
+        header_image (tk.PhotoImage): The resized header image.
         header_label (tk.Label): The label widget displaying the header image.
         source_dir_entry (tk.Entry): The entry widget for the source directory path.
         source_browse_button (tk.Button): The button widget for browsing the source directory.
         destination_dir_entry (tk.Entry): The entry widget for the destination directory path.
         destination_browse_button (tk.Button): The button widget for browsing the destination directory.
         copy_button (tk.Button): The button widget for triggering the file copy process.
+        progress_bar (ttk.Progressbar): The bar showing the progress of the copy.
+        status_label (tk.Label): The label showing the current file, speed and remaining time.
+        cancel_button (tk.Button): The button widget for cancelling the copy.
+        progress_queue (queue.Queue): The queue the copy worker reports its progress through.
+        cancel_event (threading.Event): Set to ask the copy worker to stop.
+        copy_thread (threading.Thread): The thread running the current copy, if any.
     """
     
     def __init__(self, root):
@@ -32,11 +79,11 @@ class FileCopierApp:
         self.root.configure(bg="white")  # Set the background color of the root window
         
         # Set the window size and center it on the screen
-        self.set_window_size_and_center(700, 500)
+        self.set_window_size_and_center(700, 600)
         
         # Load and resize the header image
-        self.header_image_path = "./images/logo_copy_app.png"
-        self.header_image = self.load_and_resize_image(self.header_image_path, 400, 200)
+        self.header_image_path = HEADER_IMAGE_PATH
+        self.header_image = self.load_and_resize_image(self.header_image_path, *HEADER_IMAGE_SIZE)
         
         self.header_label = tk.Label(root, image=self.header_image, bg="white")
         self.header_label.pack(pady=5)
@@ -56,18 +103,32 @@ class FileCopierApp:
         
         # Create a button to trigger the copy_files function
         self.copy_button = tk.Button(root, text="Copy Files", command=self.copy_files, bg="white")
-        self.copy_button.pack(pady=20)
+        self.copy_button.pack(pady=10)
+
+        # Create the progress bar, the status line and the cancel button of the copy
+        self.progress_bar = ttk.Progressbar(root, length=400, mode='determinate')
+        self.progress_bar.pack(pady=5)
+        self.status_label = tk.Label(root, text="", bg="white")
+        self.status_label.pack(pady=5)
+        self.cancel_button = tk.Button(root, text="Cancel", command=self.cancel_copy, bg="white", state=tk.DISABLED)
+        self.cancel_button.pack(pady=5)
+
+        self.progress_queue = queue.Queue()
+        self.cancel_event = threading.Event()
+        self.copy_thread = None
+        self.reset_progress()
         
     def set_window_size_and_center(self, width, height):
         """
         Sets the size of the root window and centers it on the screen.
+
+        The screen size is known before the window is drawn, so the window is placed once,
+        without waiting for Tk to lay it out first.
         
         Args:
             width (int): The width of the window.
             height (int): The height of the window.
         """
-        self.root.geometry(f'{width}x{height}')
-        self.root.update_idletasks()
         x = (self.root.winfo_screenwidth() // 2) - (width // 2)
         y = (self.root.winfo_screenheight() // 2) - (height // 2)
         self.root.geometry(f'{width}x{height}+{x}+{y}')
@@ -75,6 +136,10 @@ class FileCopierApp:
     def load_and_resize_image(self, image_path, width, height):
         """
         Loads an image from the given file path and resizes it to the specified dimensions.
+
+        The resized image is cached as a PNG file next to the image, which Tk reads
+        natively: PIL is only imported to resize the image again, when the cache is
+        missing or older than the image.
         
         Args:
             image_path (str): The file path of the image.
@@ -82,11 +147,26 @@ class FileCopierApp:
             height (int): The desired height of the resized image.
         
         Returns:
-            PIL.ImageTk.PhotoImage: The resized image as a PhotoImage object.
+            tk.PhotoImage: The resized image, a PIL.ImageTk.PhotoImage when it was resized again.
         """
+        cached_path = resized_image_path(image_path, width, height)
+        try:
+            if os.path.getmtime(cached_path) >= os.path.getmtime(image_path):
+                return tk.PhotoImage(master=self.root, file=cached_path)
+        except (OSError, tk.TclError):
+            pass
+
+        from PIL import Image, ImageTk
         image = Image.open(image_path)
         image = image.resize((width, height), Image.LANCZOS)
-        return ImageTk.PhotoImage(image)
+        try:
+            # Written aside and renamed, so that a window starting meanwhile never reads half of it
+            image.save(cached_path + '.tmp', format='PNG', optimize=True)
+            os.replace(cached_path + '.tmp', cached_path)
+        except OSError:
+            # A read-only installation resizes the image on every start
+            pass
+        return ImageTk.PhotoImage(image, master=self.root)
     
     def browse_source_dir(self):
         """
@@ -109,20 +189,151 @@ class FileCopierApp:
     def copy_files(self):
         """
         Copies files from the source directory to the destination directory.
-        Displays a success message if the copy process is successful, or a warning message if an error occurs.
+
+        The copy runs in a background thread so the window stays responsive; its progress
+        is polled from the Tk loop by poll_progress, which reports the outcome once the
+        copy is over.
         """
         source_dir = self.source_dir_entry.get()
         destination_dir = self.destination_dir_entry.get()
-        
+
+        self.reset_progress()
+        self.cancel_event.clear()
+        self.copy_button.config(state=tk.DISABLED)
+        self.cancel_button.config(state=tk.NORMAL)
+        self.status_label.config(text="Starting the copy...")
+
+        self.copy_thread = threading.Thread(target=self.run_copy, args=(source_dir, destination_dir), daemon=True)
+        self.copy_thread.start()
+        self.root.after(POLL_INTERVAL_MS, self.poll_progress)
+
+    def run_copy(self, source_dir, destination_dir):
+        """
+        Runs the copy in the worker thread, reporting progress and the outcome through progress_queue.
+
+        This method must not touch any Tk widget.
+
+        Args:
+            source_dir (str): The source directory.
+            destination_dir (str): The destination root directory.
+        """
         try:
+            from file_operations import copy_files, get_single_json_file_path
             json_file_path = get_single_json_file_path(source_dir)
-            copy_files(source_dir, destination_dir, json_file_path)
-            messagebox.showinfo("Success", "Files copied successfully!")
+            summary = copy_files(source_dir, destination_dir, json_file_path,
+                                 progress=lambda event: self.progress_queue.put(('progress', event)),
+                                 cancel_event=self.cancel_event)
         except Exception as e:
-            messagebox.showwarning("Warning", str(e))
-            self.root.quit()
-            self.root.destroy()
-            exit(1)
+            self.progress_queue.put(('finished', e))
+        else:
+            self.progress_queue.put(('finished', summary))
+
+    def cancel_copy(self):
+        """
+        Asks the copy worker to stop. Files being copied are left as resumable partial copies.
+        """
+        self.cancel_event.set()
+        self.cancel_button.config(state=tk.DISABLED)
+        self.status_label.config(text="Cancelling...")
+
+    def reset_progress(self):
+        """
+        Resets the progress of the copy before a new one starts.
+        """
+        self.total_bytes = None
+        self.bytes_done = 0
+        self.current_file = None
+        self.start_time = time.perf_counter()
+        self.progress_bar.stop()
+        self.progress_bar.config(mode='determinate', maximum=1, value=0)
+
+    def poll_progress(self):
+        """
+        Applies the progress reported by the copy worker, and reports the outcome once the copy is over.
+        """
+        outcome = None
+        finished = False
+        while True:
+            try:
+                kind, payload = self.progress_queue.get_nowait()
+            except queue.Empty:
+                break
+            if kind == 'progress':
+                self.handle_progress_event(payload)
+            else:
+                finished = True
+                outcome = payload
+
+        if finished:
+            self.finish_copy(outcome)
+        else:
+            self.update_status()
+            self.root.after(POLL_INTERVAL_MS, self.poll_progress)
+
+    def handle_progress_event(self, event):
+        """
+        Updates the progress of the copy from an event of the copy worker.
+
+        Args:
+            event (file_operations.ProgressEvent): The event.
+        """
+        if event.kind == 'start':
+            self.total_bytes = event.total_bytes
+            self.start_time = time.perf_counter()
+            if self.total_bytes is None:
+                self.progress_bar.config(mode='indeterminate')
+                self.progress_bar.start()
+            else:
+                self.progress_bar.config(maximum=max(1, self.total_bytes))
+        elif event.kind == 'file':
+            self.current_file = os.path.basename(event.file_path)
+        elif event.kind == 'bytes':
+            self.bytes_done += event.bytes
+            if self.total_bytes is not None:
+                self.progress_bar.config(value=self.bytes_done)
+
+    def update_status(self):
+        """
+        Shows the current file, the speed and the remaining time of the copy.
+        """
+        if self.current_file is None or self.cancel_event.is_set():
+            return
+        elapsed = time.perf_counter() - self.start_time
+        speed = self.bytes_done / elapsed if elapsed > 0 else 0
+        status = f"{self.current_file} - {speed / 1024 ** 2:.1f} MB/s"
+        if self.total_bytes is not None:
+            status += f" - {self.bytes_done / 1024 ** 2:.1f} of {self.total_bytes / 1024 ** 2:.1f} MB"
+            if speed > 0:
+                remaining = int((self.total_bytes - self.bytes_done) / speed)
+                status += f" - ETA {remaining // 3600}:{remaining // 60 % 60:02d}:{remaining % 60:02d}"
+        self.status_label.config(text=status)
+
+    def finish_copy(self, outcome):
+        """
+        Reports the outcome of the copy and gets the window ready for the next one.
+
+        Args:
+            outcome: The CopySummary of a successful copy, or the exception that ended it.
+        """
+        from file_operations import CopyCancelled, CopyFilesError
+
+        self.copy_thread = None
+        self.progress_bar.stop()
+        self.copy_button.config(state=tk.NORMAL)
+        self.cancel_button.config(state=tk.DISABLED)
+        self.status_label.config(text="")
+
+        if isinstance(outcome, CopyCancelled):
+            messagebox.showinfo("Cancelled", "The copy was cancelled. Files already copied were kept.")
+        elif isinstance(outcome, CopyFilesError):
+            failures = outcome.summary.failures
+            details = "\n".join(f"{os.path.basename(path)}: {error}" for path, error in sorted(failures.items()))
+            messagebox.showwarning("Warning", f"{len(failures)} files could not be copied:\n{details}")
+        elif isinstance(outcome, Exception):
+            messagebox.showwarning("Warning", str(outcome))
+        else:
+            self.progress_bar.config(value=self.progress_bar['maximum'])
+            messagebox.showinfo("Success", "Files copied successfully!")
 
 if __name__ == "__main__":
     root = tk.Tk()
@@ -1,10 +1,245 @@
 import os
 import shutil
-import json
 import glob
 import re
-import hashlib
-from utils import get_value_from_dict
+import string
+import mmap
+import random
+import threading
+import time
+from contextlib import ExitStack, contextmanager, nullcontext
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from dataclasses import dataclass, field, asdict
+from utils import find_value_in_json_file
+from transfer import transfer_file
+from checksums import available_algorithms, new_hasher, chunk_size_for, MMAP_THRESHOLD
+from manifest import (
+    Manifest, MANIFEST_FILE_NAME, STATE_PARTIAL, STATE_COPIED, STATE_SAMPLED, STATE_VERIFIED, STATE_FAILED,
+    load_copy_record, read_first_copy_record,
+)
+from object_store import ObjectStore
+from metrics import (
+    FileMetrics, PhaseTimer, PHASE_COMPRESS, PHASE_FSYNC, PHASE_LISTING, PHASE_SOURCE_HASH, PHASE_THROTTLE,
+    PHASE_VERIFY, PHASE_WRITE,
+)
+from throttle import lower_priority
+from staging import STAGING_FOLDER, STAGING_MODES, StagedWrites, fsync_path, publish_folder, staging_folder_path
+from compress import (
+    DECOMPRESSION_ERRORS, SUFFIXES, StreamCompressor, choose_codec, compress_bytes, compressed_path,
+    compression_threads, decompress_file, read_sample, resolve_codec,
+)
+from fan_out import write_copies
+from small_files import SMALL_FILE_THRESHOLD, copy_tasks, read_back, write_file
+
+# Name of the file listing the checksum of every copied file, in the format of sha256sum and friends.
+CHECKSUM_FILE_NAME = 'checksums.{algorithm}'
+
+# Number of files copied concurrently by copy_files.
+DEFAULT_WORKERS = 4
+
+# Number of files of a recursive copy sorted together so each batch is copied largest first.
+SCHEDULING_WINDOW = 1024
+
+# Number of bytes between two checkpoints of a file being copied, from which a resumed copy continues.
+CHECKPOINT_INTERVAL = 64 * 1024 * 1024
+
+# Hidden directory of a destination root recording the highest sequence number allocated to each test ID.
+SEQUENCE_INDEX_DIR_NAME = '.sequence_index'
+
+# Number of the latest destination folders of a test ID searched for a copy to resume.
+RESUME_SEARCH_FOLDERS = 32
+
+# How a copy is checked against its source, see verify_copy: the whole destination is read
+# back, only sampled blocks of it are, it is read back after copy_files returns (see
+# verification.Verifier), or it is not checked.
+VERIFY_FULL = 'full'
+VERIFY_SAMPLED = 'sampled'
+VERIFY_DEFERRED = 'deferred'
+VERIFY_NONE = 'none'
+VERIFY_MODES = (VERIFY_FULL, VERIFY_SAMPLED, VERIFY_DEFERRED, VERIFY_NONE)
+
+# In sampled mode, files up to this size are verified in full; larger ones by comparing
+# SAMPLE_BLOCKS blocks of SAMPLE_BLOCK_SIZE bytes with the source.
+SAMPLE_THRESHOLD = 64 * 1024 * 1024
+SAMPLE_BLOCKS = 16
+SAMPLE_BLOCK_SIZE = 1024 * 1024
+
+_buffers = threading.local()
+
+
+@dataclass
+class CopySummary:
+    """
+    The outcome of a copy_files run, and its performance report.
+
+    Attributes:
+        destination_folder (str): The folder the files were copied to.
+        files_copied (int): The number of files copied successfully.
+        files_skipped (int): The number of files skipped because a resumed run had already copied them.
+        bytes_copied (int): The number of bytes copied successfully.
+        elapsed (float): The wall time of the copy in seconds.
+        failures (dict): The error message of every file that failed, keyed by source path.
+        backends (dict): The number of files copied by each transfer backend.
+        started_at (float): The Unix time the copy started.
+        phases (dict): The seconds spent in each metrics.PHASES phase, summed over the workers.
+        files (list): The FileMetrics of every file copied.
+        verification (str): How the copies were verified, one of VERIFY_MODES.
+        compression (str): The codec the copies were compressed with, one of compress.CODECS, or None.
+        bytes_stored (int): With compression, the number of bytes the files copied take in the destination.
+    """
+    destination_folder: str
+    files_copied: int = 0
+    files_skipped: int = 0
+    bytes_copied: int = 0
+    elapsed: float = 0.0
+    failures: dict = field(default_factory=dict)
+    backends: dict = field(default_factory=dict)
+    started_at: float = 0.0
+    phases: dict = field(default_factory=dict)
+    files: list = field(default_factory=list)
+    verification: str = VERIFY_FULL
+    compression: str = None
+    bytes_stored: int = 0
+
+    @property
+    def throughput(self):
+        """
+        float: The copy throughput in bytes per second.
+        """
+        return self.bytes_copied / self.elapsed if self.elapsed > 0 else 0.0
+
+    @property
+    def files_per_second(self):
+        """
+        float: The number of files copied per second.
+        """
+        return self.files_copied / self.elapsed if self.elapsed > 0 else 0.0
+
+    def to_dict(self, include_files=False):
+        """
+        Returns the summary as a JSON-serializable dictionary.
+
+        Args:
+            include_files (bool, optional): Include the metrics of every file. Defaults to False.
+
+        Returns:
+            dict: The fields of the summary, its throughput and its files per second.
+        """
+        summary = dict(asdict(self), throughput=self.throughput, files_per_second=self.files_per_second)
+        if include_files:
+            summary['files'] = [dict(file, throughput=metrics.throughput)
+                                for file, metrics in zip(summary['files'], self.files)]
+        else:
+            del summary['files']
+        return summary
+
+    def __str__(self):
+        lines = [
+            f"Copied {self.files_copied} files ({self.bytes_copied / 1024 ** 2:.1f} MiB) "
+            f"in {self.elapsed:.2f} s ({self.throughput / 1024 ** 2:.1f} MiB/s) to {self.destination_folder}."
+        ]
+        if self.files_skipped:
+            lines.append(f"Skipped {self.files_skipped} files already copied by a previous run.")
+        if self.verification != VERIFY_FULL:
+            lines.append(f"Verification: {self.verification}.")
+        if self.compression is not None:
+            lines.append(f"Compressed with {self.compression}: {self.bytes_stored / 1024 ** 2:.1f} MiB stored.")
+        if self.failures:
+            lines.append(f"{len(self.failures)} files failed:")
+            lines.extend(f"  {path}: {error}" for path, error in sorted(self.failures.items()))
+        if self.backends:
+            backends = ", ".join(f"{name} ({count})" for name, count in sorted(self.backends.items()))
+            lines.append(f"Transfer backends: {backends}")
+        return "\n".join(lines)
+
+
+@dataclass
+class CopyResult:
+    """
+    The outcome of copying a single file.
+
+    Attributes:
+        source_path (str): The path of the source file.
+        destination_path (str): The path of the copied file.
+        size (int): The size of the file in bytes.
+        checksum (str): The checksum of the source file.
+        algorithm (str): The hashing algorithm used for the checksum.
+        backend (str): How the bytes were transferred: 'stream' or a transfer.BACKENDS name.
+        skipped (bool): True if the file was not copied because a previous run already had.
+        elapsed (float): The wall time of the copy in seconds.
+        compression (str): The codec the copy is compressed with, or None. The destination path then
+            has the suffix of the codec, while the size and the checksum are those of the source.
+        stored_size (int): The size of the destination file in bytes.
+    """
+    source_path: str
+    destination_path: str
+    size: int
+    checksum: str
+    algorithm: str
+    backend: str
+    skipped: bool = False
+    elapsed: float = 0.0
+    compression: str = None
+    stored_size: int = None
+
+
+@dataclass
+class ProgressEvent:
+    """
+    A progress report sent by copy_files to its progress callback.
+
+    Attributes:
+        kind (str): 'start' once before any file is copied, then 'file' when a file
+            starts, 'bytes' as its bytes are copied, and 'done' or 'failed' when it ends.
+        file_path (str): The source file the event is about, None for 'start'.
+        bytes (int): For 'bytes', the number of bytes copied since the previous event.
+        total_files (int): For 'start', the number of files to copy, None if not known up front.
+        total_bytes (int): For 'start', the number of bytes to copy, None if not known up front.
+        error (str): For 'failed', the error message.
+        destination_folders (list): For 'start', the destination folder of each root, in order.
+    """
+    kind: str
+    file_path: str = None
+    bytes: int = 0
+    total_files: int = None
+    total_bytes: int = None
+    error: str = None
+    destination_folders: list = None
+
+
+class CopyFilesError(Exception):
+    """
+    Raised by copy_files when one or more files could not be copied.
+
+    Attributes:
+        summary (CopySummary): The summary of the run, including every failure; with several
+            destination roots, the summary of the first root with failures.
+        summaries (list): The summary of every destination root.
+    """
+
+    def __init__(self, summary, summaries=None):
+        super().__init__(str(summary))
+        self.summary = summary
+        self.summaries = summaries if summaries is not None else [summary]
+
+
+class CopyCancelled(Exception):
+    """
+    Raised by copy_files when the copy is cancelled before every file has been copied.
+
+    Files that were being copied are left as partial copies recorded in the manifest,
+    so the copy can be resumed later.
+
+    Attributes:
+        summary (CopySummary): The summary of what was copied before the cancellation; with
+            several destination roots, the summary of the first root.
+        summaries (list): The summary of every destination root.
+    """
+
+    def __init__(self, summary=None, summaries=None):
+        super().__init__("The copy was cancelled.")
+        self.summary = summary
+        self.summaries = summaries if summaries is not None else ([summary] if summary is not None else [])
 
 def get_single_json_file_path(source_dir):
     """
@@ -29,107 +264,1853 @@ def get_single_json_file_path(source_dir):
     
     return json_files[0]
 
-def set_destination_folder(destination_root_dir, test_id):
+def read_test_id(json_file_path):
     """
-    Sets the destination folder for copying files based on the given test ID.
+    Reads the test ID from the metadata JSON file of a capture.
+
+    The file is scanned with utils.find_value_in_json_file, which stops as soon as the
+    key is found instead of loading the whole document.
 
     Args:
-        destination_root_dir (str): The root directory where the destination folders are located.
-        test_id (str): The test ID used to identify the destination folder.
+        json_file_path (str): The path to the JSON file.
 
     Returns:
-        str: The path of the destination folder.
+        str: The value of the 'test_sequence_id' key.
+
+    Raises:
+        ValueError: If the key 'test_sequence_id' is not found in the JSON file.
+    """
+    test_id = find_value_in_json_file(json_file_path, 'test_sequence_id')
+    if not test_id:
+        raise ValueError("The key 'test_sequence_id' is not found in the JSON file.")
+    return test_id
+
+
+def _sequence_folder(destination_root_dir, test_id, count):
+    return os.path.join(destination_root_dir, f"{test_id}_{count}")
+
+
+def _read_sequence_hint(destination_root_dir, test_id):
+    """
+    Returns the sequence number recorded in the index of a test ID, or 0 if there is none.
+    """
+    try:
+        with open(os.path.join(destination_root_dir, SEQUENCE_INDEX_DIR_NAME, test_id), encoding='utf-8') as hint_file:
+            return int(hint_file.read().strip() or 0)
+    except (OSError, ValueError):
+        return 0
+
+
+def _write_sequence_hint(destination_root_dir, test_id, count):
+    """
+    Records the latest sequence number allocated to a test ID.
 
+    The index is only a hint: concurrent writers may leave an older number behind,
+    which costs the next allocation a few extra probes but never a wrong folder.
+    """
+    index_dir = os.path.join(destination_root_dir, SEQUENCE_INDEX_DIR_NAME)
+    hint_path = os.path.join(index_dir, test_id)
+    temporary_path = f"{hint_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        os.makedirs(index_dir, exist_ok=True)
+        with open(temporary_path, 'w', encoding='utf-8') as hint_file:
+            hint_file.write(str(count))
+        os.replace(temporary_path, hint_path)
+    except OSError:
+        # The folder has been allocated; without the hint the next allocation scans the root
+        try:
+            os.remove(temporary_path)
+        except OSError:
+            pass
+
+
+def _scan_sequence_number(destination_root_dir, test_id):
+    """
+    Returns the highest n of the `<test_id>_<n>` folders in a directory by listing it, or 0 if there is none.
     """
-    existing_folders = os.listdir(destination_root_dir)
     count = 0
     pattern = re.compile(rf"^{re.escape(test_id)}_(\d+)$")
-    
-    for folder in existing_folders:
-        match = pattern.match(folder)
+    for entry in _scandir(destination_root_dir):
+        match = pattern.match(entry.name)
         if match:
             folder_count = int(match.group(1))
             if folder_count > count:
                 count = folder_count
-    
-    count += 1
-    destination_folder = os.path.join(destination_root_dir, f"{test_id}_{count}")
+    return count
+
+
+def _latest_sequence_number(destination_root_dir, test_id):
+    """
+    Returns the highest n of the `<test_id>_<n>` folders in a directory, or 0 if there is none.
+
+    The sequence index of the root gives a starting point, from which the folders
+    created since are probed one by one. The root is only listed when the index has
+    no valid entry for the test ID, e.g. for the first copy of the test ID or for
+    folders created by an older version of the app.
+
+    Args:
+        destination_root_dir (str): The root directory where the destination folders are located.
+        test_id (str): The test ID used to identify the destination folders.
+
+    Returns:
+        int: The highest sequence number.
+    """
+    count = _read_sequence_hint(destination_root_dir, test_id)
+    if count <= 0 or not os.path.isdir(_sequence_folder(destination_root_dir, test_id, count)):
+        return _scan_sequence_number(destination_root_dir, test_id)
+    while os.path.isdir(_sequence_folder(destination_root_dir, test_id, count + 1)):
+        count += 1
+    return count
+
+
+def set_destination_folder(destination_root_dir, test_id):
+    """
+    Sets the destination folder for copying files based on the given test ID.
+
+    The folder is not created, so another copy may take it in the meantime; use
+    allocate_destination_folder to reserve it.
+
+    Args:
+        destination_root_dir (str): The root directory where the destination folders are located.
+        test_id (str): The test ID used to identify the destination folder.
+
+    Returns:
+        str: The path of the destination folder.
+
+    """
+    count = _latest_sequence_number(destination_root_dir, test_id) + 1
+    destination_folder = _sequence_folder(destination_root_dir, test_id, count)
     return destination_folder
 
 
-def compute_checksum(file_path, algorithm='sha256'):
+def allocate_destination_folder(destination_root_dir, test_id):
+    """
+    Creates the next `<test_id>_<n>` folder, even when several copies of the test ID run concurrently.
+
+    The folder is reserved with an exclusive mkdir: if another copy creates it first,
+    the next sequence number is tried, so each copy gets a folder of its own. The
+    sequence index of the root is then updated, so the next allocation does not need
+    to list the root.
+
+    Args:
+        destination_root_dir (str): The root directory where the destination folders are located.
+        test_id (str): The test ID used to identify the destination folder.
+
+    Returns:
+        str: The path of the created destination folder.
+
+    Raises:
+        ValueError: If the test ID is not a plain file name, e.g. contains a path separator.
+    """
+    if test_id in ('', os.curdir, os.pardir) or any(sep in test_id for sep in ('/', os.sep, os.altsep) if sep):
+        raise ValueError(f"The test ID {test_id!r} cannot be used as a folder name.")
+    os.makedirs(destination_root_dir, exist_ok=True)
+    count = _latest_sequence_number(destination_root_dir, test_id)
+    while True:
+        count += 1
+        destination_folder = _sequence_folder(destination_root_dir, test_id, count)
+        try:
+            os.mkdir(destination_folder)
+        except FileExistsError:
+            continue
+        _write_sequence_hint(destination_root_dir, test_id, count)
+        return destination_folder
+
+
+def source_identity(source_dir, json_file_path):
+    """
+    Identifies the capture a copy is made from, to tell it from other captures of the same test ID.
+
+    Args:
+        source_dir (str): The path to the source directory.
+        json_file_path (str): The path to the metadata JSON file of the capture.
+
+    Returns:
+        dict: The absolute path of the source directory ('source') and the sha256 checksum
+        of the metadata file ('metadata_checksum'), as recorded in the manifest of the copy.
+    """
+    hash_func = new_hasher('sha256')
+    with open(json_file_path, 'rb') as json_file:
+        for chunk in iter(lambda: json_file.read(1024 * 1024), b''):
+            hash_func.update(chunk)
+    return {'source': os.path.abspath(source_dir), 'metadata_checksum': hash_func.hexdigest()}
+
+
+def _copied_from(destination_folder, source, incomplete_only=False):
+    """
+    Tells whether a destination folder holds a copy of a source, from the copy record of its manifest.
+
+    The manifest may also be in the staging folder of the destination folder, for a copy
+    that was building the folder aside (see copy_files); such a copy has not completed,
+    whatever its manifest says, since the folder was never published.
+
+    Args:
+        destination_folder (str): The destination folder.
+        source (dict): The identity of the source, see source_identity.
+        incomplete_only (bool, optional): Only accept a copy that has not completed. Defaults to False.
+
+    Returns:
+        bool: True if the folder was copied from the source, and its copy is incomplete if required.
+    """
+    for folder in (destination_folder, staging_folder_path(destination_folder)):
+        manifest_path = os.path.join(folder, MANIFEST_FILE_NAME)
+        # The source is on the first line, so the manifests of other copies are not read through
+        record = read_first_copy_record(manifest_path)
+        if record is None:
+            continue
+        if any(record.get(key) != value for key, value in source.items()):
+            return False
+        if not incomplete_only or folder != destination_folder:
+            return True
+        return not load_copy_record(manifest_path).get('complete', False)
+    return False
+
+
+def find_resumable_folder(destination_root_dir, test_id, source):
+    """
+    Returns the destination folder of a test ID holding an incomplete copy of a source.
+
+    Several captures may share a test ID, so a folder is only resumed for the source it
+    was copied from, and only while its copy has not completed: a complete copy, or the
+    copy of another capture, is never written to again. The RESUME_SEARCH_FOLDERS latest
+    folders of the test ID are searched, newest first.
+
+    Args:
+        destination_root_dir (str): The root directory where the destination folders are located.
+        test_id (str): The test ID used to identify the destination folder.
+        source (dict): The identity of the source, see source_identity.
+
+    Returns:
+        str: The path of the folder, or None if there is nothing to resume.
+    """
+    latest = _latest_sequence_number(destination_root_dir, test_id)
+    for count in range(latest, max(0, latest - RESUME_SEARCH_FOLDERS), -1):
+        destination_folder = _sequence_folder(destination_root_dir, test_id, count)
+        if _copied_from(destination_folder, source, incomplete_only=True):
+            return destination_folder
+    return None
+
+
+def compute_checksum(file_path, algorithm='sha256', use_mmap=None):
     """
     Compute the checksum of a file.
 
+    The file is read in chunks sized by checksums.chunk_size_for, or hashed through
+    a memory map when it is large.
+
     Parameters:
     file_path (str): The path to the file.
-    algorithm (str, optional): The hashing algorithm to use. Defaults to 'sha256'.
+    algorithm (str, optional): The hashing algorithm to use, see checksums.available_algorithms. Defaults to 'sha256'.
+    use_mmap (bool, optional): Hash a memory map of the file instead of reading it in chunks.
+        Defaults to None, which maps files of at least checksums.MMAP_THRESHOLD bytes.
 
     Returns:
     str: The computed checksum of the file.
     """
-    hash_func = hashlib.new(algorithm)
-    with open(file_path, 'rb') as f:
-        for chunk in iter(lambda: f.read(4096), b''):
-            hash_func.update(chunk)
+    hash_func = new_hasher(algorithm)
+    with open(file_path, 'rb', buffering=0) as f:
+        size = os.fstat(f.fileno()).st_size
+        if use_mmap is None:
+            use_mmap = size >= MMAP_THRESHOLD
+        if use_mmap:
+            # An empty file cannot be mapped, and its checksum is the empty hash
+            if size > 0:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                    hash_func.update(mapped)
+        else:
+            buffer = _get_buffer(chunk_size_for(size, file_path))
+            while True:
+                read = f.readinto(buffer)
+                if not read:
+                    break
+                hash_func.update(buffer[:read])
     return hash_func.hexdigest()
 
 
-def safe_copy(file_path, destination_folder):
+def verification_mode(verify):
     """
-    Copy a file and verify its integrity using checksums.
+    Normalizes the verify argument of the copy functions to one of VERIFY_MODES.
 
-    Parameters:
-    - file_path (str): The path of the file to be copied.
-    - destination_folder (str): The destination folder where the file will be copied to.
+    Args:
+        verify (bool or str): True for VERIFY_FULL, False or None for VERIFY_NONE, or a VERIFY_MODES name.
 
     Returns:
-    - str: The path of the copied file.
+        str: The verification mode.
 
     Raises:
-    - ValueError: If the checksum of the source file does not match the checksum of the copied file.
+        ValueError: If verify is not a known mode.
     """
-    # Compute checksum of the source file
-    source_checksum = compute_checksum(file_path)
-    
-    # Perform the copy operation
-    destination_path = shutil.copy(file_path, destination_folder)
-    
-    # Compute checksum of the copied file
-    destination_checksum = compute_checksum(destination_path)
-    
-    # Verify the checksums
-    if source_checksum != destination_checksum:
-        raise ValueError("Checksum mismatch: the file was not copied correctly.")
-    
-    return destination_path
+    if verify is True:
+        return VERIFY_FULL
+    if verify is False or verify is None:
+        return VERIFY_NONE
+    if verify not in VERIFY_MODES:
+        raise ValueError(f"Unknown verification mode {verify}, expected one of {', '.join(VERIFY_MODES)}")
+    return verify
+
 
-def copy_files(source_dir, destination_root_dir, json_file_path):
+def _verified_state(mode):
     """
-    Copy files from the source directory to the destination directory based on the provided JSON file.
+    Returns the manifest state of a file copied and checked in a verification mode.
+    """
+    if mode == VERIFY_FULL:
+        return STATE_VERIFIED
+    if mode == VERIFY_SAMPLED:
+        return STATE_SAMPLED
+    return STATE_COPIED
+
+
+def sample_offsets(size, blocks=SAMPLE_BLOCKS, block_size=SAMPLE_BLOCK_SIZE):
+    """
+    Picks the blocks of a file compared with the source in sampled mode.
+
+    The first and the last block are always sampled, where truncated and partially
+    written copies differ; the others are picked at random among the whole blocks of
+    the file, so every run samples different blocks.
 
     Args:
-        source_dir (str): The path to the source directory.
-        destination_root_dir (str): The path to the root directory where the files will be copied.
-        json_file_path (str): The path to the JSON file containing the necessary information.
+        size (int): The size of the file in bytes.
+        blocks (int, optional): The number of blocks to sample. Defaults to SAMPLE_BLOCKS.
+        block_size (int, optional): The size of a block in bytes. Defaults to SAMPLE_BLOCK_SIZE.
 
-    Raises:
-        ValueError: If the key 'test_sequence_id' is not found in the JSON file.
+    Returns:
+        list: The sorted offsets of the blocks; every block of the file if it has at most blocks blocks.
+    """
+    count = -(-size // block_size)
+    if count <= blocks:
+        return [index * block_size for index in range(count)]
+    middle = random.sample(range(1, count - 1), blocks - 2)
+    return sorted([0, size - block_size] + [index * block_size for index in middle])
+
+
+def _read_block(f, offset, block_size):
+    """
+    Reads a block of a file opened without buffering.
+    """
+    if hasattr(os, 'pread'):
+        return os.pread(f.fileno(), block_size, offset)
+    f.seek(offset)
+    return f.read(block_size)
+
+
+def verify_copy(source_path, destination_path, checksum, algorithm='sha256', mode=VERIFY_FULL, use_mmap=False,
+                compression=None):
+    """
+    Checks a copy against its source.
+
+    VERIFY_FULL hashes the whole destination. VERIFY_SAMPLED compares the blocks picked
+    by sample_offsets byte for byte for files larger than SAMPLE_THRESHOLD, which catches
+    truncated or partially written copies but not an isolated corrupt block. A compressed
+    copy is always decompressed and hashed; the other modes read nothing.
+
+    Args:
+        source_path (str): The path of the source file.
+        destination_path (str): The path of the copy.
+        checksum (str): The checksum of the source file.
+        algorithm (str, optional): The hashing algorithm of the checksum. Defaults to 'sha256'.
+        mode (str, optional): One of VERIFY_MODES. Defaults to VERIFY_FULL.
+        use_mmap (bool, optional): Hash the destination through a memory map. Defaults to False.
+        compression (str, optional): The codec the copy is compressed with, one of compress.CODECS.
 
     Returns:
-        None
+        bool: False if the copy does not match the source.
     """
-    with open(json_file_path) as json_file:
-        data = json.load(json_file)
-    
-    test_id = get_value_from_dict(data, 'test_sequence_id')
-    if not test_id:
-        raise ValueError("The key 'test_sequence_id' is not found in the JSON file.")
-    
-    destination_folder = set_destination_folder(destination_root_dir, test_id)
-    os.makedirs(destination_folder, exist_ok=True)
-    
-    for file_name in os.listdir(source_dir):
-        file_path = os.path.join(source_dir, file_name)
-        if os.path.isfile(file_path):
-            safe_copy(file_path, destination_folder)
\ No newline at end of file
+    if mode not in (VERIFY_FULL, VERIFY_SAMPLED):
+        return True
+    if compression is not None:
+        hash_func = new_hasher(algorithm)
+        try:
+            decompress_file(destination_path, compression, hash_func=hash_func)
+        except DECOMPRESSION_ERRORS:
+            return False
+        return hash_func.hexdigest() == checksum
+    if mode == VERIFY_SAMPLED:
+        size = os.path.getsize(destination_path)
+        if size > SAMPLE_THRESHOLD:
+            with open(source_path, 'rb', buffering=0) as source, open(destination_path, 'rb', buffering=0) as copy:
+                if os.fstat(source.fileno()).st_size != size:
+                    return False
+                return all(_read_block(source, offset, SAMPLE_BLOCK_SIZE) ==
+                           _read_block(copy, offset, SAMPLE_BLOCK_SIZE)
+                           for offset in sample_offsets(size, SAMPLE_BLOCKS, SAMPLE_BLOCK_SIZE))
+    if use_mmap:
+        return compute_checksum(destination_path, algorithm, use_mmap=True) == checksum
+    return compute_checksum(destination_path, algorithm) == checksum
+
+
+def _get_buffer(buffer_size):
+    """
+    Returns a buffer of the requested size, reused across calls made from the same thread.
+
+    Args:
+        buffer_size (int): The size of the buffer in bytes.
+
+    Returns:
+        memoryview: A view of exactly buffer_size bytes of the reusable buffer.
+    """
+    buffer = getattr(_buffers, 'buffer', None)
+    if buffer is None or len(buffer) < buffer_size:
+        buffer = bytearray(buffer_size)
+        _buffers.buffer = buffer
+    return memoryview(buffer)[:buffer_size]
+
+
+@contextmanager
+def _measure(metrics, phase):
+    """
+    Adds the time spent in the body of a with statement to a phase, if there is a PhaseTimer.
+    """
+    if metrics is None:
+        yield
+        return
+    with metrics.measure(phase):
+        yield
+
+
+def _relative_path(path, folder):
+    """
+    Returns the path of a file relative to a folder, with forward slashes.
+
+    Paths built by joining onto the folder are sliced directly; only other paths go
+    through os.path.relpath, which is comparatively slow when called for every file.
+    """
+    prefix = os.path.join(folder, '')
+    relative_path = path[len(prefix):] if path.startswith(prefix) else os.path.relpath(path, folder)
+    return relative_path.replace(os.sep, '/')
+
+
+def _destination_path(file_path, destination):
+    """
+    Resolves the path a file is copied to, following the same rules as shutil.copy.
+
+    Args:
+        file_path (str): The path of the source file.
+        destination (str): A destination folder or a destination file path.
+
+    Returns:
+        str: The destination file path.
+    """
+    if os.path.isdir(destination):
+        return os.path.join(destination, os.path.basename(file_path))
+    return destination
+
+
+def _continue_copy(source, destination, buffer, hash_func, algorithm, offset, offset_checksum):
+    """
+    Positions a resumed copy_with_checksum after the bytes a previous copy reached.
+
+    The first offset bytes of the source are hashed again, unless the copy is not hashed,
+    and the copy starts over if they no longer match offset_checksum.
+
+    Returns:
+        tuple: (hash_func, position): the hash of the source up to the position the copy continues from.
+    """
+    if hash_func is None:
+        # The checksum is known already: the rest of the file is copied without hashing it
+        source.seek(offset)
+        destination.seek(offset)
+        destination.truncate()
+        return None, offset
+    position = 0
+    while position < offset:
+        read = source.readinto(buffer[:min(offset - position, len(buffer))])
+        if not read:
+            break
+        hash_func.update(buffer[:read])
+        position += read
+    if position != offset or hash_func.hexdigest() != offset_checksum:
+        hash_func = new_hasher(algorithm)
+        position = 0
+        source.seek(0)
+    destination.seek(position)
+    destination.truncate()
+    return hash_func, position
+
+
+def copy_with_checksum(file_path, destination_path, algorithm='sha256', buffer_size=None, offset=0,
+                       offset_checksum=None, checkpoint=None, on_progress=None, throttle=None, metrics=None):
+    """
+    Copy a file while computing its checksum, reading the source only once.
+
+    Every chunk read from the source is fed to the hash function and to the writer. A
+    copy can continue from the offset a previous copy reached, see _continue_copy.
+
+    Args:
+        file_path (str): The path of the file to be copied.
+        destination_path (str): The path of the file to write.
+        algorithm (str, optional): The hashing algorithm to use. Defaults to 'sha256'.
+            None copies the file without hashing it, e.g. when its checksum is already known.
+        buffer_size (int, optional): The size of the copy buffer in bytes.
+            Defaults to None, which picks it with checksums.chunk_size_for.
+        offset (int, optional): The number of bytes already copied to the destination. Defaults to 0.
+        offset_checksum (str, optional): The checksum of the first offset bytes of the source.
+        checkpoint (callable, optional): Called as checkpoint(offset, offset_checksum) every
+            CHECKPOINT_INTERVAL bytes, once the bytes copied so far have been synced to disk.
+        on_progress (callable, optional): Called with the number of bytes copied after every chunk,
+            and once with the offset the copy resumes from. It may raise to abort the copy.
+        throttle (Throttle, optional): Limits the rate at which the chunks are written.
+        metrics (PhaseTimer, optional): Receives the time spent reading and hashing, writing,
+            syncing and waiting for the throttle.
+
+    Returns:
+        str: The checksum of the bytes that were copied, or None if algorithm is None.
+    """
+    hash_func = new_hasher(algorithm) if algorithm is not None else None
+    resume = offset > 0 and os.path.exists(destination_path) and os.path.getsize(destination_path) >= offset
+    with open(file_path, 'rb', buffering=0) as source, open(destination_path, 'r+b' if resume else 'wb') as destination:
+        buffer = _get_buffer(buffer_size or chunk_size_for(os.fstat(source.fileno()).st_size, file_path))
+        position = 0
+        if resume:
+            hash_func, position = _continue_copy(source, destination, buffer, hash_func, algorithm, offset,
+                                                 offset_checksum)
+        if on_progress is not None and position:
+            on_progress(position)
+
+        next_checkpoint = position + CHECKPOINT_INTERVAL
+        # Phase times are summed locally and reported once, to keep the loop lock-free
+        read_time = write_time = sync_time = throttle_time = 0.0
+        clock = time.perf_counter
+        try:
+            while True:
+                started = clock()
+                read = source.readinto(buffer)
+                if not read:
+                    read_time += clock() - started
+                    break
+                chunk = buffer[:read]
+                if hash_func is not None:
+                    hash_func.update(chunk)
+                read_time += clock() - started
+                if throttle is not None:
+                    throttle_time += throttle.consume(read)
+                started = clock()
+                destination.write(chunk)
+                write_time += clock() - started
+                position += read
+                if on_progress is not None:
+                    on_progress(read)
+                if checkpoint is not None and position >= next_checkpoint:
+                    started = clock()
+                    destination.flush()
+                    os.fsync(destination.fileno())
+                    sync_time += clock() - started
+                    checkpoint(position, hash_func.hexdigest() if hash_func is not None else None)
+                    next_checkpoint = position + CHECKPOINT_INTERVAL
+        finally:
+            if metrics is not None:
+                metrics.add(PHASE_SOURCE_HASH, read_time)
+                metrics.add(PHASE_WRITE, write_time)
+                metrics.add(PHASE_FSYNC, sync_time)
+                metrics.add(PHASE_THROTTLE, throttle_time)
+    shutil.copymode(file_path, destination_path)
+    return hash_func.hexdigest() if hash_func is not None else None
+
+
+def copy_with_compression(file_path, destination_path, codec, algorithm='sha256', buffer_size=None,
+                          on_progress=None, throttle=None, metrics=None):
+    """
+    Copy a file compressed, while computing the checksum of its uncompressed content.
+
+    Like copy_with_checksum, the source is read once; every chunk is hashed and handed
+    to a compress.StreamCompressor, with several threads for large files (see
+    compress.compression_threads). A compressed copy cannot continue from a checkpoint:
+    an interrupted copy starts over.
+
+    Args:
+        file_path (str): The path of the file to be copied.
+        destination_path (str): The path of the compressed file to write.
+        codec (str): The codec, one of compress.CODECS.
+        algorithm (str, optional): The hashing algorithm to use, or None not to hash the file. Defaults to 'sha256'.
+        buffer_size (int, optional): The size of the chunks read, in bytes. Defaults to None, which picks it
+            with checksums.chunk_size_for.
+        on_progress (callable, optional): Called with the number of bytes read after every chunk.
+            It may raise to abort the copy.
+        throttle (Throttle, optional): Limits the rate at which the source is read.
+        metrics (PhaseTimer, optional): Receives the time spent in each phase of the copy.
+
+    Returns:
+        str: The checksum of the source file, or None if algorithm is None.
+    """
+    hash_func = new_hasher(algorithm) if algorithm is not None else None
+    read_time = compress_time = write_time = throttle_time = 0.0
+    clock = time.perf_counter
+    with open(file_path, 'rb', buffering=0) as source, open(destination_path, 'wb') as destination:
+        size = os.fstat(source.fileno()).st_size
+        if buffer_size is None:
+            buffer_size = chunk_size_for(size, file_path)
+        compressor = StreamCompressor(codec, compression_threads(size))
+        try:
+            while True:
+                started = clock()
+                # A new chunk per read: the compression threads may still hold the previous ones
+                chunk = source.read(buffer_size)
+                if not chunk:
+                    read_time += clock() - started
+                    break
+                if hash_func is not None:
+                    hash_func.update(chunk)
+                read_time += clock() - started
+                if throttle is not None:
+                    throttle_time += throttle.consume(len(chunk))
+                started = clock()
+                compressed = compressor.compress(chunk)
+                compress_time += clock() - started
+                started = clock()
+                destination.write(compressed)
+                write_time += clock() - started
+                if on_progress is not None:
+                    on_progress(len(chunk))
+            started = clock()
+            compressed = compressor.flush()
+            compress_time += clock() - started
+            destination.write(compressed)
+        except BaseException:
+            compressor.close()
+            raise
+        finally:
+            if metrics is not None:
+                metrics.add(PHASE_SOURCE_HASH, read_time)
+                metrics.add(PHASE_COMPRESS, compress_time)
+                metrics.add(PHASE_WRITE, write_time)
+                metrics.add(PHASE_THROTTLE, throttle_time)
+    shutil.copymode(file_path, destination_path)
+    return hash_func.hexdigest() if hash_func is not None else None
+
+
+def _resume_point(manifest, relative_path, source_fields, destination_path, verify, write_path=None):
+    """
+    Looks up how far a previous run got with a file.
+
+    Args:
+        manifest (Manifest): The manifest of the destination folder.
+        relative_path (str): The path of the file relative to the destination folder.
+        source_fields (dict): The size, mtime_ns and algorithm of the current copy.
+        destination_path (str): The path of the destination file.
+        verify (bool or str): How the current copy verifies the destination, see verification_mode.
+        write_path (str, optional): The path the file is written to, if it is staged. Defaults to destination_path.
+
+    Returns:
+        tuple: (entry, offset, offset_checksum). entry is the manifest entry if the file is
+        already copied and can be skipped, None otherwise.
+    """
+    entry = manifest.get(relative_path)
+    if entry is None or any(entry.get(key) != value for key, value in source_fields.items()):
+        return None, 0, None
+    mode = verification_mode(verify)
+    if mode == VERIFY_FULL:
+        done_states = (STATE_VERIFIED,)
+    elif mode == VERIFY_SAMPLED:
+        done_states = (STATE_VERIFIED, STATE_SAMPLED)
+    else:
+        done_states = (STATE_VERIFIED, STATE_SAMPLED, STATE_COPIED)
+    if entry.get('state') in done_states and os.path.exists(destination_path) \
+            and os.path.getsize(destination_path) == entry.get('stored_size', entry['size']):
+        return entry, 0, None
+    if entry.get('state') == STATE_PARTIAL and os.path.exists(write_path or destination_path):
+        return None, entry.get('offset', 0), entry.get('offset_checksum')
+    return None, 0, None
+
+
+def _skipped_result(file_path, destination_path, entry, algorithm, backend, codec):
+    """
+    Returns the outcome of a file skipped because the manifest entry of a previous run lists it as copied.
+    """
+    return CopyResult(file_path, destination_path, entry['size'], entry['checksum'], algorithm, backend,
+                      skipped=True, compression=codec, stored_size=entry.get('stored_size', entry['size']))
+
+
+def _matches_source(file_path, write_path, checksum, algorithm, mode, metrics=None, use_mmap=False,
+                    compression=None):
+    """
+    Verifies a copy as its verification mode says, see verify_copy; a mode that does not read it back accepts it.
+    """
+    if mode not in (VERIFY_FULL, VERIFY_SAMPLED):
+        return True
+    with _measure(metrics, PHASE_VERIFY):
+        return verify_copy(file_path, write_path, checksum, algorithm, mode, use_mmap=use_mmap,
+                           compression=compression)
+
+
+def _reject_copy(manifest, relative_path, staged, destination_path, flush=True, **fields):
+    """
+    Records a copy that does not match its source as failed, so a resumed copy starts it over, and drops it.
+
+    Raises:
+        ValueError: Always, for the mismatch.
+    """
+    if manifest is not None:
+        manifest.record(relative_path, flush=flush, state=STATE_FAILED, **fields)
+    if staged is not None:
+        staged.discard(destination_path)
+    raise ValueError("Checksum mismatch: the file was not copied correctly.")
+
+
+def _record_copied(manifest, relative_path, staged, destination_path, state, checksum, stored_size, codec,
+                   flush=True, **fields):
+    """
+    Hands a checked copy to its batch of staged writes and records its final state in the manifest.
+    """
+    if staged is not None:
+        staged.add(destination_path, stored_size)
+    if manifest is not None:
+        compression_fields = {'compression': codec, 'stored_size': stored_size} if codec is not None else {}
+        manifest.record(relative_path, flush=flush, state=state, checksum=checksum, offset=None,
+                        offset_checksum=None, **fields, **compression_fields)
+
+
+def _checkpoint_recorder(manifest, relative_path):
+    """
+    Returns the checkpoint callback of copy_with_checksum that records the progress of a file in its manifest.
+    """
+    def record_checkpoint(position, position_checksum):
+        manifest.record(relative_path, sync=True, state=STATE_PARTIAL, offset=position,
+                        offset_checksum=position_checksum)
+
+    return record_checkpoint
+
+
+def _link_from_store(file_path, write_path, stat, algorithm, cached_checksum, cache, store, mode, metrics):
+    """
+    Links the content of a file from the object store of copy_file, if the store holds it.
+
+    The store only checks the size of its objects, so the linked file is read back as the
+    verification mode says; an object that does not match is dropped from the store and the
+    file copied instead.
+
+    Returns:
+        tuple: (checksum, linked): the checksum of the source, and whether its copy was linked.
+    """
+    if cached_checksum is None:
+        with _measure(metrics, PHASE_SOURCE_HASH):
+            cached_checksum = compute_checksum(file_path, algorithm)
+        if cache is not None:
+            cache.put(stat, algorithm, cached_checksum)
+    with _measure(metrics, PHASE_WRITE):
+        linked = store.link(cached_checksum, stat.st_size, write_path)
+    if linked and not _matches_source(file_path, write_path, cached_checksum, algorithm, mode, metrics):
+        store.discard(cached_checksum)
+        os.remove(write_path)
+        linked = False
+    return cached_checksum, linked
+
+
+def _start_copy(manifest, destination_path, write_path, stat, algorithm, resume, verify, restart):
+    """
+    Records the copy of copy_file as started in its manifest, unless a previous run already copied the file.
+
+    Returns:
+        tuple: (relative_path, entry, offset, offset_checksum): the path of the file in the manifest,
+        its entry if it can be skipped, and where a partial copy continues from (from the start
+        when restart is True).
+    """
+    relative_path = _relative_path(destination_path, manifest.folder)
+    source_fields = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'algorithm': algorithm}
+    entry, offset, offset_checksum = None, 0, None
+    if resume:
+        entry, offset, offset_checksum = _resume_point(manifest, relative_path, source_fields, destination_path,
+                                                       verify, write_path)
+    if entry is not None:
+        return relative_path, entry, 0, None
+    if restart:
+        offset, offset_checksum = 0, None
+    manifest.record(relative_path, state=STATE_PARTIAL, offset=offset, offset_checksum=offset_checksum,
+                    **source_fields)
+    return relative_path, None, offset, offset_checksum
+
+
+def _copy_from_store(file_path, destination_path, write_path, stat, algorithm, mode, cached_checksum, cache, store,
+                     manifest, relative_path, staged, on_progress, started, metrics):
+    """
+    Links a file from the object store of copy_file, see _link_from_store.
+
+    Returns:
+        tuple: (checksum, result): the checksum of the source, and the CopyResult of the
+        copy, or None if the file must be copied.
+    """
+    checksum, linked = _link_from_store(file_path, write_path, stat, algorithm, cached_checksum, cache, store, mode,
+                                        metrics)
+    if not linked:
+        return checksum, None
+    if on_progress is not None:
+        on_progress(stat.st_size)
+    _record_copied(manifest, relative_path, staged, destination_path, _verified_state(mode), checksum, stat.st_size,
+                   None)
+    return checksum, CopyResult(file_path, destination_path, stat.st_size, checksum, algorithm, 'dedup',
+                                elapsed=time.perf_counter() - started)
+
+
+def _write_copy(file_path, write_path, backend, codec, algorithm, buffer_size, offset, offset_checksum, checkpoint,
+                on_progress, throttle, metrics):
+    """
+    Writes the copy of copy_file with its backend, hashing the source on the way unless algorithm is None.
+
+    Returns:
+        tuple: (backend, checksum): the backend that copied the file, and the checksum of the source or None.
+    """
+    if codec is not None:
+        return backend, copy_with_compression(file_path, write_path, codec, algorithm, buffer_size, on_progress,
+                                              throttle, metrics)
+    if backend == 'stream':
+        return backend, copy_with_checksum(file_path, write_path, algorithm, buffer_size, offset, offset_checksum,
+                                           checkpoint, on_progress, throttle, metrics)
+    backend = transfer_file(file_path, write_path, backend, throttle, metrics)
+    if on_progress is not None:
+        on_progress(os.path.getsize(write_path))
+    if algorithm is None:
+        return backend, None
+    with _measure(metrics, PHASE_SOURCE_HASH):
+        return backend, compute_checksum(file_path, algorithm, use_mmap=True)
+
+
+def copy_file(file_path, destination_folder, algorithm='sha256', verify=True, backend='stream',
+              buffer_size=None, manifest=None, resume=False, cache=None, on_progress=None, staged=None, store=None,
+              throttle=None, metrics=None, compression=None):
+    """
+    Copy a file, verify its integrity using checksums and report how it was copied.
+
+    The 'stream' backend reads the source once, hashing it as it is written; the other
+    backends let the kernel move the bytes (see transfer.transfer_file). A compressed
+    copy gets the suffix of its codec, and the checksum of the source.
+
+    Args:
+        file_path (str): The path of the file to be copied.
+        destination_folder (str): The destination folder, or the destination file path.
+        algorithm (str, optional): The hashing algorithm to use. Defaults to 'sha256'.
+        verify (bool or str, optional): How to verify the copy, see verification_mode. Defaults to True.
+        backend (str, optional): 'stream', 'auto' or a transfer.BACKENDS name. Defaults to 'stream'.
+        buffer_size (int, optional): The size of the copy buffer of the 'stream' backend in bytes.
+        manifest (Manifest, optional): The manifest the progress of the copy is recorded in.
+        resume (bool, optional): Skip a file the manifest lists as copied, and continue a partial copy
+            from its last checkpoint. Defaults to False.
+        cache (ChecksumCache, optional): The cache of source checksums.
+        on_progress (callable, optional): Called with the number of bytes copied as the copy goes.
+            It may raise to abort the copy.
+        staged (StagedWrites, optional): The batch that renames the verified file into place.
+        store (ObjectStore, optional): Links content the store already holds instead of copying it.
+        throttle (Throttle, optional): Limits the rate of the copy.
+        metrics (PhaseTimer, optional): Receives the time spent in each phase of the copy.
+        compression (str, optional): The codec to compress the copy with, see compress.choose_codec.
+            Not used with an object store or a kernel backend.
+
+    Returns:
+        CopyResult: The outcome of the copy.
+
+    Raises:
+        ValueError: If the checksum of the source file does not match the checksum of the copied file.
+    """
+    started = time.perf_counter()
+    mode = verification_mode(verify)
+    destination_path = _destination_path(file_path, destination_folder)
+    compressed = compression is not None and backend == 'stream' and store is None
+    codec = choose_codec(file_path, compression) if compressed else None
+    if codec is not None:
+        destination_path = compressed_path(destination_path, codec)
+    write_path = staged.staging_path(destination_path) if staged is not None else destination_path
+
+    relative_path, offset, offset_checksum, record_checkpoint = None, 0, None, None
+    stat = os.stat(file_path) if manifest is not None or cache is not None or store is not None else None
+    cached_checksum = cache.get(stat, algorithm) if cache is not None else None
+    if manifest is not None:
+        # A compressed copy starts over
+        relative_path, entry, offset, offset_checksum = _start_copy(manifest, destination_path, write_path, stat,
+                                                                    algorithm, resume, verify, codec is not None)
+        if entry is not None:
+            if on_progress is not None:
+                on_progress(entry['size'])
+            return _skipped_result(file_path, destination_path, entry, algorithm, backend, codec)
+        record_checkpoint = _checkpoint_recorder(manifest, relative_path)
+
+    if store is not None:
+        cached_checksum, result = _copy_from_store(file_path, destination_path, write_path, stat, algorithm, mode,
+                                                   cached_checksum, cache, store, manifest, relative_path, staged,
+                                                   on_progress, started, metrics)
+        if result is not None:
+            return result
+
+    # Copy the file, computing the checksum of the source on the way unless it is cached
+    backend, source_checksum = _write_copy(file_path, write_path, backend, codec,
+                                           algorithm if cached_checksum is None else None, buffer_size, offset,
+                                           offset_checksum, record_checkpoint, on_progress, throttle, metrics)
+    if cached_checksum is None and cache is not None:
+        cache.put(stat, algorithm, source_checksum)
+    source_checksum = source_checksum if cached_checksum is None else cached_checksum
+
+    if not _matches_source(file_path, write_path, source_checksum, algorithm, mode, metrics,
+                           use_mmap=backend != 'stream', compression=codec):
+        _reject_copy(manifest, relative_path, staged, destination_path, offset=0, offset_checksum=None)
+
+    stored_size = os.path.getsize(write_path)
+    size = stored_size if codec is None else os.path.getsize(file_path)
+    if store is not None:
+        store.add(write_path, source_checksum)
+    _record_copied(manifest, relative_path, staged, destination_path, _verified_state(mode), source_checksum,
+                   stored_size, codec)
+
+    return CopyResult(file_path, destination_path, size, source_checksum, algorithm, backend,
+                      elapsed=time.perf_counter() - started, compression=codec, stored_size=stored_size)
+
+
+def _previous_copy(manifest, destination_path, stat, algorithm, resume, verify):
+    """
+    Looks up a file in the manifest of its destination folder, see _resume_point.
+
+    Returns:
+        tuple: (relative_path, source_fields, entry): the path of the file in the manifest, the size,
+        mtime_ns and algorithm of the copy, and the entry of a previous run that already copied the file, or None.
+    """
+    if manifest is None:
+        return None, {}, None
+    relative_path = _relative_path(destination_path, manifest.folder)
+    source_fields = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'algorithm': algorithm}
+    entry = _resume_point(manifest, relative_path, source_fields, destination_path, verify)[0] if resume else None
+    return relative_path, source_fields, entry
+
+
+def copy_small_file(file_path, destination_path, algorithm='sha256', verify=True, manifest=None, resume=False,
+                    staged=None, throttle=None, metrics=None, compression=None):
+    """
+    Copy a small file in memory and verify its integrity.
+
+    The file is read, written and read back with a single call each (see small_files),
+    and the copy compared with the bytes in memory, in VERIFY_SAMPLED mode too. Its
+    manifest entry is not flushed: the caller flushes the manifest once per batch.
+
+    Args:
+        file_path (str): The path of the file to be copied.
+        destination_path (str): The path of the destination file.
+        algorithm (str, optional): The hashing algorithm to use. Defaults to 'sha256'.
+        verify (bool or str, optional): How to verify the copy, see verification_mode. Defaults to True.
+        manifest (Manifest, optional): The manifest of the destination folder.
+        resume (bool, optional): Skip the file if the manifest lists it as copied. Defaults to False.
+        staged (StagedWrites, optional): The batch the file is staged in, see copy_file.
+        throttle (Throttle, optional): Limits the rate of the copy.
+        metrics (PhaseTimer, optional): Receives the time spent in each phase of the copy.
+        compression (str, optional): The codec to compress the copy with, see copy_file.
+
+    Returns:
+        CopyResult: The outcome of the copy, with the 'small' backend.
+
+    Raises:
+        ValueError: If the copied file does not match the source file.
+    """
+    started = time.perf_counter()
+    mode = verification_mode(verify)
+    with open(file_path, 'rb', buffering=0) as source:
+        stat = os.fstat(source.fileno())
+        data = codec = None
+        if compression is not None:
+            # Whether the file is compressed, and so its destination name, depends on its content
+            data = source.read()
+            codec = choose_codec(file_path, compression, stat.st_size, data)
+        if codec is not None:
+            destination_path = compressed_path(destination_path, codec)
+        relative_path, source_fields, entry = _previous_copy(manifest, destination_path, stat, algorithm, resume,
+                                                             verify)
+        if entry is not None:
+            return _skipped_result(file_path, destination_path, entry, algorithm, 'small', codec)
+        if data is None:
+            data = source.read()
+    write_path = staged.staging_path(destination_path) if staged is not None else destination_path
+
+    hash_func = new_hasher(algorithm)
+    hash_func.update(data)
+    checksum = hash_func.hexdigest()
+    hashed = time.perf_counter()
+    payload = compress_bytes(data, codec) if codec is not None else data
+    compressed = time.perf_counter()
+    waited = throttle.consume(len(data)) if throttle is not None else 0.0
+    write_started = time.perf_counter()
+    write_file(write_path, payload, stat.st_mode)
+    if metrics is not None:
+        metrics.add(PHASE_SOURCE_HASH, hashed - started)
+        metrics.add(PHASE_COMPRESS, compressed - hashed)
+        metrics.add(PHASE_THROTTLE, waited)
+        metrics.add(PHASE_WRITE, time.perf_counter() - write_started)
+
+    verified = mode in (VERIFY_FULL, VERIFY_SAMPLED)
+    if verified:
+        with _measure(metrics, PHASE_VERIFY):
+            matches = read_back(write_path, codec) == data
+        if not matches:
+            _reject_copy(manifest, relative_path, staged, destination_path, flush=False, **source_fields)
+
+    _record_copied(manifest, relative_path, staged, destination_path, STATE_VERIFIED if verified else STATE_COPIED,
+                   checksum, len(payload), codec, flush=False, **source_fields)
+    return CopyResult(file_path, destination_path, len(data), checksum, algorithm, 'small',
+                      elapsed=time.perf_counter() - started, compression=codec, stored_size=len(payload))
+
+
+def _each(value, count):
+    """
+    Returns an option of copy_file_to_targets for each destination: the list given, or the value repeated.
+    """
+    return list(value) if isinstance(value, (list, tuple)) else [value] * count
+
+
+def _target_codecs(file_path, stat, compression):
+    """
+    Returns the codec each destination of copy_file_to_targets compresses a file with, from a single sample of it.
+    """
+    if not any(compression):
+        return [None] * len(compression)
+    sample = read_sample(file_path, stat.st_size)
+    return [choose_codec(file_path, codec, stat.st_size, sample) for codec in compression]
+
+
+def _start_target(file_path, destination_path, manifest, stat, algorithm, resume, mode, codec):
+    """
+    Records the copy of a file to a destination of copy_file_to_targets as started in its manifest.
+
+    Returns:
+        tuple: (relative_path, skipped): the path of the file in the manifest, and the CopyResult
+        of a destination that already holds the file, or None.
+    """
+    relative_path, source_fields, entry = _previous_copy(manifest, destination_path, stat, algorithm, resume, mode)
+    if entry is not None:
+        return relative_path, _skipped_result(file_path, destination_path, entry, algorithm, 'stream', codec)
+    if manifest is not None:
+        manifest.record(relative_path, state=STATE_PARTIAL, offset=0, offset_checksum=None, **source_fields)
+    return relative_path, None
+
+
+def _finish_target(file_path, size, writer, write_path, destination_path, manifest, relative_path, staged, checksum,
+                   algorithm, mode, codec, started, metrics):
+    """
+    Verifies the copy of a file to a destination of copy_file_to_targets once written, and records it.
+    """
+    try:
+        writer.result()
+        shutil.copymode(file_path, write_path)
+        if not _matches_source(file_path, write_path, checksum, algorithm, mode, metrics, compression=codec):
+            _reject_copy(manifest, relative_path, staged, destination_path, offset=0, offset_checksum=None)
+        stored_size = os.path.getsize(write_path)
+    except Exception:
+        if staged is not None:
+            staged.discard(destination_path)
+        raise
+    _record_copied(manifest, relative_path, staged, destination_path, _verified_state(mode), checksum, stored_size,
+                   codec)
+    return CopyResult(file_path, destination_path, size, checksum, algorithm, 'stream',
+                      elapsed=time.perf_counter() - started, compression=codec, stored_size=stored_size)
+
+
+def _outcome(future):
+    """
+    Returns the result of a finished task, or the exception it failed with.
+    """
+    try:
+        return future.result()
+    except Exception as e:
+        return e
+
+
+def copy_file_to_targets(file_path, destination_paths, algorithm='sha256', verify=True, buffer_size=None,
+                         manifests=None, resume=False, cache=None, on_progress=None, staged=None, throttle=None,
+                         metrics=None, executor=None, compression=None):
+    """
+    Copy a file to several destinations, reading and hashing the source only once.
+
+    The destinations are written concurrently by fan_out.write_copies, then each is
+    verified in its own mode and fails on its own. A failure to read the source fails
+    every destination. Partial copies start over rather than continue from a checkpoint.
+
+    Args:
+        file_path (str): The path of the file to be copied.
+        destination_paths (list): The paths of the destination files.
+        algorithm (str, optional): The hashing algorithm to use. Defaults to 'sha256'.
+        verify (bool, str or list, optional): How to verify the copies, see verification_mode, or a list
+            of the mode of each destination. Defaults to True.
+        buffer_size (int, optional): The size of the chunks in bytes. Defaults to None, which
+            picks it with checksums.chunk_size_for.
+        manifests (list, optional): The Manifest of each destination folder, or None.
+        resume (bool, optional): Skip the destinations whose manifest lists the file as copied. Defaults to False.
+        cache (ChecksumCache, optional): The cache of source checksums.
+        on_progress (callable, optional): Called with the number of bytes read after every chunk.
+            It may raise to abort the copy.
+        staged (list, optional): The StagedWrites batch of each destination, or None.
+        throttle (Throttle, optional): Limits the rate at which the source is read.
+        metrics (PhaseTimer, optional): Receives the time spent in each phase of the copy.
+        executor (Executor, optional): Runs the writers, with at least one thread per destination.
+            Defaults to None, which starts threads for this file.
+        compression (str or list, optional): The codec to compress the copies with, see copy_file,
+            or a list of the codec of each destination (None for no compression).
+
+    Returns:
+        list: The CopyResult of each destination, or the exception it failed with.
+
+    Raises:
+        OSError: If the source file could not be read.
+    """
+    started = time.perf_counter()
+    count = len(destination_paths)
+    manifests = manifests or [None] * count
+    staged = staged or [None] * count
+    modes = [verification_mode(mode) for mode in _each(verify, count)]
+    stat = os.stat(file_path)
+    codecs = _target_codecs(file_path, stat, _each(compression, count))
+    destination_paths = [compressed_path(path, codec) if codec is not None else path
+                         for path, codec in zip(destination_paths, codecs)]
+    relative_paths, results = [None] * count, [None] * count
+    for i in range(count):
+        relative_paths[i], results[i] = _start_target(file_path, destination_paths[i], manifests[i], stat, algorithm,
+                                                      resume, modes[i], codecs[i])
+    active = [i for i in range(count) if results[i] is None]
+    if not active:
+        if on_progress is not None:
+            on_progress(stat.st_size)
+        return results
+
+    write_paths = {i: staged[i].staging_path(destination_paths[i]) if staged[i] is not None
+                   else destination_paths[i] for i in active}
+    compressors = {i: StreamCompressor(codecs[i], compression_threads(stat.st_size))
+                   for i in active if codecs[i] is not None}
+    cached_checksum = cache.get(stat, algorithm) if cache is not None else None
+    hash_func = new_hasher(algorithm) if cached_checksum is None else None
+    with ThreadPoolExecutor(max_workers=len(active)) if executor is None else nullcontext(executor) as executor:
+        writers = write_copies(file_path, write_paths, executor, buffer_size or chunk_size_for(stat.st_size, file_path),
+                               hash_func, compressors, throttle, on_progress, metrics)
+        checksum = cached_checksum if cached_checksum is not None else hash_func.hexdigest()
+        if cached_checksum is None and cache is not None:
+            cache.put(stat, algorithm, checksum)
+        # The writers are done, so the verifications get their threads
+        verifications = {i: executor.submit(_finish_target, file_path, stat.st_size, writers[i], write_paths[i],
+                                            destination_paths[i], manifests[i], relative_paths[i], staged[i],
+                                            checksum, algorithm, modes[i], codecs[i], started, metrics)
+                         for i in active}
+        for i, future in verifications.items():
+            results[i] = _outcome(future)
+    return results
+
+
+def safe_copy(file_path, destination_folder, algorithm='sha256', verify=True, buffer_size=None, atomic=False):
+    """
+    Copy a file and verify its integrity using checksums.
+
+    The source is read once: its checksum is computed from the same bytes that are
+    written to the destination. When verify is enabled, the destination is read back
+    and its checksum compared against the source checksum.
+
+    In atomic mode the file is written and verified under a hidden partial name, synced
+    and only then renamed to its final name, so a crash or a checksum mismatch never
+    leaves a corrupt file under the final name.
+
+    Parameters:
+    - file_path (str): The path of the file to be copied.
+    - destination_folder (str): The destination folder where the file will be copied to.
+    - algorithm (str, optional): The hashing algorithm to use. Defaults to 'sha256'.
+    - verify (bool or str, optional): Re-read the destination to verify it, or a verification mode: 'sampled'
+      compares sampled blocks of large files with the source instead, see verify_copy. Defaults to True.
+    - buffer_size (int, optional): The size of the copy buffer in bytes. Defaults to None, which adapts it
+      to the size of the file.
+    - atomic (bool, optional): Stage the copy and rename it into place once verified. Defaults to False.
+
+    Returns:
+    - str: The path of the copied file.
+
+    Raises:
+    - ValueError: If the checksum of the source file does not match the checksum of the copied file.
+    """
+    if not atomic:
+        return copy_file(file_path, destination_folder, algorithm, verify, buffer_size=buffer_size).destination_path
+    with StagedWrites() as staged:
+        return copy_file(file_path, destination_folder, algorithm, verify, buffer_size=buffer_size,
+                         staged=staged).destination_path
+
+
+def format_checksum_line(result, destination_folder):
+    """
+    Formats the checksum of a copied file as a line of a checksum file.
+
+    The checksum file uses the format of sha256sum and friends, so it can be checked
+    later with `sha256sum -c checksums.sha256` from inside the destination folder. A
+    compressed copy is listed under the name of the source file, with the checksum of
+    the uncompressed content: the line checks the file once restored.
+
+    Args:
+        result (CopyResult): The outcome of the copy of the file.
+        destination_folder (str): The folder the files were copied to.
+
+    Returns:
+        str: The line, with its trailing newline.
+    """
+    destination_path = result.destination_path
+    suffix = SUFFIXES.get(result.compression)
+    if suffix is not None:
+        destination_path = destination_path[:-len(suffix)]
+    return f"{result.checksum}  {_relative_path(destination_path, destination_folder)}\n"
+
+
+def list_source_files(source_dir):
+    """
+    Lists the regular files at the top level of a directory, largest first.
+
+    Copying the largest files first keeps a long file from being left as the tail
+    of a parallel copy.
+
+    Args:
+        source_dir (str): The directory to list.
+
+    Returns:
+        list: (path, size) tuples sorted by decreasing size.
+    """
+    files = []
+    with os.scandir(source_dir) as entries:
+        for entry in entries:
+            if entry.is_file():
+                files.append((entry.path, entry.stat().st_size))
+    files.sort(key=lambda item: item[1], reverse=True)
+    return files
+
+
+def iter_source_tree(source_dir):
+    """
+    Walks a directory tree, yielding its entries as they are read.
+
+    The walk uses os.scandir and an explicit stack, so it neither recurses nor holds
+    more than the directories still to visit in memory. The type of each entry comes
+    from the DirEntry, without an extra stat call. Symbolic links to directories are
+    not followed.
+
+    Args:
+        source_dir (str): The root of the tree.
+
+    Yields:
+        tuple: (entry, relative_path) for every file and directory below the root.
+    """
+    stack = ['']
+    while stack:
+        relative_dir = stack.pop()
+        with os.scandir(os.path.join(source_dir, relative_dir)) as entries:
+            for entry in entries:
+                relative_path = os.path.join(relative_dir, entry.name)
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(relative_path)
+                yield entry, relative_path
+
+
+def iter_source_files(source_dir, recursive=False):
+    """
+    Yields the regular files of a directory as they are read, without listing it first.
+
+    Args:
+        source_dir (str): The directory to walk.
+        recursive (bool, optional): Also walk the subdirectories. Defaults to False.
+
+    Yields:
+        tuple: (path, relative_path, size) for every file.
+    """
+    if recursive:
+        entries = iter_source_tree(source_dir)
+    else:
+        entries = ((entry, entry.name) for entry in _scandir(source_dir))
+    for entry, relative_path in entries:
+        if entry.is_file():
+            yield entry.path, relative_path, entry.stat().st_size
+
+
+def _scandir(directory):
+    """
+    Yields the entries of a directory, closing the scandir iterator when done.
+    """
+    with os.scandir(directory) as entries:
+        yield from entries
+
+
+def create_destination_tree(source_dir, destination_folder):
+    """
+    Creates the directory tree of a source directory under a destination folder.
+
+    All the directories are created in one pass before any file is copied, so the
+    copy workers never have to create or check for them.
+
+    Args:
+        source_dir (str): The root of the source tree.
+        destination_folder (str): The folder the tree is recreated in.
+
+    Returns:
+        int: The number of directories created.
+    """
+    count = 0
+    for entry, relative_path in iter_source_tree(source_dir):
+        if entry.is_dir(follow_symlinks=False):
+            os.makedirs(os.path.join(destination_folder, relative_path), exist_ok=True)
+            count += 1
+    return count
+
+
+def is_checksum_file_name(name):
+    """
+    Tells whether a file name is that of a checksum file, `checksums.<algorithm>` with a known algorithm.
+
+    Args:
+        name (str): The file name.
+
+    Returns:
+        bool: True for a checksum file name.
+    """
+    prefix = CHECKSUM_FILE_NAME.format(algorithm='')
+    return name.startswith(prefix) and name[len(prefix):] in available_algorithms()
+
+
+def _lists_source_files(checksum_file_path, source_dir):
+    """
+    Tells whether every line of a checksum file lists a file of a source, as the checksum file of a copy of it does.
+    """
+    try:
+        with open(checksum_file_path, encoding='utf-8') as checksum_file:
+            for line in checksum_file:
+                checksum, separator, relative_path = line.rstrip('\n').partition('  ')
+                if not separator or not checksum or any(c not in string.hexdigits for c in checksum):
+                    return False
+                path = os.path.join(source_dir, relative_path)
+                if not any(os.path.isfile(path + suffix) for suffix in ('',) + tuple(SUFFIXES.values())):
+                    return False
+    except (OSError, UnicodeDecodeError):
+        return False
+    return True
+
+
+def is_bookkeeping_file(source_dir, relative_path):
+    """
+    Tells whether a file at the top of a source is the bookkeeping of an earlier copy of the source.
+
+    A source that is itself a copied or restored folder holds the manifest and the
+    checksum file of that copy. They describe the earlier copy and copy_files writes its
+    own, so they are not copied: a manifest starting with a copy record, and a checksum
+    file whose every line lists a file of the source. Other files are copied, whatever
+    their name.
+
+    Args:
+        source_dir (str): The source directory.
+        relative_path (str): The path of a source file relative to the source directory.
+
+    Returns:
+        bool: True if the file must not be copied.
+    """
+    if '/' in relative_path or os.sep in relative_path:
+        return False
+    path = os.path.join(source_dir, relative_path)
+    if relative_path == MANIFEST_FILE_NAME:
+        return read_first_copy_record(path) is not None
+    return is_checksum_file_name(relative_path) and _lists_source_files(path, source_dir)
+
+
+def _without_bookkeeping(files, source_dir, algorithm, on_reserved):
+    """
+    Leaves the bookkeeping files of an earlier copy out of the files of copy_files, see is_bookkeeping_file.
+
+    Another file taking the name of the manifest or of the checksum file of the copy
+    cannot be copied: it is handed to on_reserved with the reason.
+    """
+    reserved = (MANIFEST_FILE_NAME, CHECKSUM_FILE_NAME.format(algorithm=algorithm))
+    prefix = CHECKSUM_FILE_NAME.format(algorithm='')
+    for item in files:
+        relative_path = item[1]
+        if relative_path == MANIFEST_FILE_NAME or relative_path.startswith(prefix):
+            if is_bookkeeping_file(source_dir, relative_path):
+                continue
+            if relative_path in reserved:
+                on_reserved(item[0], f"{relative_path} is the name of a bookkeeping file of the copy")
+                continue
+        yield item
+
+
+def _largest_first(files, window):
+    """
+    Reorders a stream of files so each window of files is copied largest first.
+
+    Args:
+        files (iterable): (path, relative_path, size) tuples.
+        window (int): The number of files sorted together.
+
+    Yields:
+        tuple: The same tuples, sorted by decreasing size within each window.
+    """
+    batch = []
+    for item in files:
+        batch.append(item)
+        if len(batch) >= window:
+            batch.sort(key=lambda item: item[2], reverse=True)
+            yield from batch
+            batch = []
+    batch.sort(key=lambda item: item[2], reverse=True)
+    yield from batch
+
+
+def _per_root(value, roots, description):
+    """
+    Returns the value of an option of copy_files for each destination root: the list given, or the value repeated.
+
+    Raises:
+        ValueError: If a list does not give one value per root.
+    """
+    values = list(value) if isinstance(value, (list, tuple)) else [value] * len(roots)
+    if len(values) != len(roots):
+        raise ValueError(f"{len(values)} {description} given for {len(roots)} destination roots.")
+    return values
+
+
+def _root_options(roots, backend, dedup, verify, resume, compression, verifier):
+    """
+    Checks the options of copy_files and returns the verification mode, the folder to resume and the codec of each root.
+
+    Raises:
+        ValueError: If the options cannot be used together, see copy_files.
+    """
+    if len(roots) > 1 and (backend != 'stream' or dedup):
+        raise ValueError("Copying to several destination roots needs the 'stream' backend, without dedup.")
+    modes = [verification_mode(mode) for mode in _per_root(verify, roots, 'verification modes')]
+    if VERIFY_DEFERRED in modes and verifier is None:
+        raise ValueError("Deferred verification needs a verifier.")
+    resumes = _per_root(resume, roots, 'folders to resume')
+    codecs = [resolve_codec(codec) if codec is not None else None
+              for codec in _per_root(compression, roots, 'compression codecs')]
+    if any(codecs) and (backend != 'stream' or dedup):
+        raise ValueError("Compression needs the 'stream' backend, without dedup.")
+    return modes, resumes, codecs
+
+
+def _files_to_copy(source_dir, recursive, targets, timer, algorithm, on_reserved):
+    """
+    Lists the files copy_files copies, leaving out the bookkeeping of an earlier copy (see _without_bookkeeping).
+
+    A recursive copy creates the directory tree in every target and streams the files,
+    largest first within each SCHEDULING_WINDOW; a flat copy lists them all up front,
+    largest first.
+
+    Returns:
+        tuple: (files, total_files, total_bytes): an iterable of (path, relative_path, size) tuples,
+        and the totals, None if not known up front.
+    """
+    if recursive:
+        with timer.measure(PHASE_LISTING):
+            for target in targets:
+                create_destination_tree(source_dir, target.working_folder)
+        source_files = timer.timed_iter(PHASE_LISTING, iter_source_files(source_dir, recursive=True))
+        files = _without_bookkeeping(source_files, source_dir, algorithm, on_reserved)
+        return _largest_first(files, SCHEDULING_WINDOW), None, None
+    with timer.measure(PHASE_LISTING):
+        listing = [(path, os.path.basename(path), size) for path, size in list_source_files(source_dir)
+                   if not is_bookkeeping_file(source_dir, os.path.basename(path))]
+    files = _without_bookkeeping(listing, source_dir, algorithm, on_reserved)
+    return files, len(listing), sum(size for _, _, size in listing)
+
+
+def _copy_targets(source_dir, roots, json_file_path, algorithm, backend, staging, dedup, verify, resume, compression,
+                  verifier, timer):
+    """
+    Checks the options of copy_files and creates the _CopyTarget of each destination root.
+
+    Returns:
+        tuple: (targets, source): the targets, and the source they copy, see source_identity.
+
+    Raises:
+        ValueError: If the options cannot be used together, see copy_files.
+    """
+    if staging is not None and staging not in STAGING_MODES:
+        raise ValueError(f"Unknown staging mode {staging}, expected one of {', '.join(STAGING_MODES)}")
+    if not roots:
+        raise ValueError("No destination root directory to copy to.")
+    modes, resumes, codecs = _root_options(roots, backend, dedup, verify, resume, compression, verifier)
+    stores = [ObjectStore(root, algorithm) if dedup else None for root in roots]
+    test_id = read_test_id(json_file_path)
+    source = source_identity(source_dir, json_file_path)
+    targets = [_CopyTarget(root, test_id, source, algorithm, target_resume, staging, store, timer, mode, codec)
+               for root, target_resume, store, mode, codec in zip(roots, resumes, stores, modes, codecs)]
+    return targets, source
+
+
+class _PendingCopies:
+    """
+    The tasks submitted to the workers of copy_files and not collected yet.
+
+    Submitting a task beyond max_pending first collects the tasks already done, so the
+    listing of the source never runs far ahead of the copy. Collecting a task hands the
+    outcomes of each of its files to on_file.
+    """
+
+    def __init__(self, max_pending, target_count, on_file):
+        """
+        Args:
+            max_pending (int): The number of tasks pending beyond which submit collects.
+            target_count (int): The number of destination roots each file is copied to.
+            on_file (callable): Called as on_file(file_path, size, outcomes) with the CopyResult
+                or exception of each target.
+        """
+        self.max_pending = max_pending
+        self.target_count = target_count
+        self.on_file = on_file
+        # The files of every pending task, as (file_path, size) pairs
+        self._files = {}
+
+    def submit(self, future, files):
+        """
+        Adds a submitted task.
+
+        Args:
+            future (Future): The task, returning the outcomes of each of its files.
+            files (list): The (file_path, size) pairs of its files.
+        """
+        self._files[future] = files
+        if len(self._files) >= self.max_pending:
+            self.collect(wait(self._files, return_when=FIRST_COMPLETED).done)
+
+    def cancel(self):
+        """
+        Cancels the pending tasks that have not started.
+        """
+        for future in self._files:
+            future.cancel()
+
+    def collect(self, futures=None):
+        """
+        Waits for tasks and hands the outcomes of their files to on_file.
+
+        Args:
+            futures (iterable, optional): The tasks to collect. Defaults to None, which collects them all.
+        """
+        for future in list(self._files) if futures is None else futures:
+            files = self._files.pop(future)
+            if future.cancelled():
+                continue
+            try:
+                outcomes = future.result()
+            except Exception as e:
+                outcomes = [[e] * self.target_count] * len(files)
+            for (file_path, size), file_outcomes in zip(files, outcomes):
+                self.on_file(file_path, size, file_outcomes)
+
+
+class _CopyTarget:
+    """
+    A destination root of copy_files, and the state of the copy to it.
+
+    Creating the target allocates (or, when resuming, finds) its destination folder and
+    decides where the files are written, see copy_files. resume is a bool, or the folder
+    to resume, which is only resumed if it holds a copy of the source. The manifest and
+    the checksum file are opened by start.
+    """
+
+    def __init__(self, root, test_id, source, algorithm, resume, staging, store, timer, verification, compression):
+        if isinstance(resume, (str, os.PathLike)):
+            destination_folder = resume if _copied_from(resume, source) else None
+        else:
+            destination_folder = find_resumable_folder(root, test_id, source) if resume else None
+        self.resumed = destination_folder is not None
+        if destination_folder is None:
+            destination_folder = allocate_destination_folder(root, test_id)
+        self.store = store
+        # The folder the files are written to: the destination folder, or its staging folder
+        # while it has not been published (a resumed copy continues in the published folder)
+        self.working_folder = destination_folder
+        self.staged = None
+        if staging == STAGING_FOLDER and not os.listdir(destination_folder):
+            self.working_folder = staging_folder_path(destination_folder)
+            os.makedirs(self.working_folder, exist_ok=True)
+            self.staged = StagedWrites(promote=False, metrics=timer)
+        elif staging is not None:
+            self.staged = StagedWrites(metrics=timer)
+        self.summary = CopySummary(destination_folder, started_at=time.time(), verification=verification,
+                                   compression=compression)
+        self.checksum_file_path = os.path.join(self.working_folder, CHECKSUM_FILE_NAME.format(algorithm=algorithm))
+        self.manifest = None
+        self.checksum_file = None
+
+    def start(self, stack, source):
+        """
+        Opens the manifest and the checksum file of the copy, until stack is closed.
+
+        Args:
+            stack (ExitStack): Closes the files.
+            source (dict): The source of the copy, see source_identity.
+        """
+        self.manifest = stack.enter_context(Manifest(self.working_folder))
+        # On the first line of a new manifest, so find_resumable_folder can tell the source of the folder
+        self.manifest.record_copy(**source, complete=False)
+        self.checksum_file = stack.enter_context(open(self.checksum_file_path, 'w', encoding='utf-8'))
+
+    def finish(self, cancelled):
+        """
+        Renames the staged files into place, and records the copy as complete unless it was cancelled or failed.
+
+        Args:
+            cancelled (bool): Whether the copy was cancelled.
+        """
+        if self.staged is not None:
+            self.staged.flush()
+        if not cancelled and not self.summary.failures:
+            self.manifest.record_copy(complete=True)
+
+    def record(self, file_path, size, outcome):
+        """
+        Adds the outcome of the copy of a file to the summary and the checksum file.
+
+        Args:
+            file_path (str): The source file.
+            size (int): The size of the source file.
+            outcome (CopyResult or Exception): The outcome of its copy to this target.
+
+        Returns:
+            bool: True if the file was copied or skipped, False if it failed.
+        """
+        summary = self.summary
+        if isinstance(outcome, Exception):
+            summary.failures[file_path] = str(outcome)
+            return False
+        self.checksum_file.write(format_checksum_line(outcome, self.working_folder))
+        if outcome.skipped:
+            summary.files_skipped += 1
+            return True
+        summary.files_copied += 1
+        summary.bytes_copied += size
+        if summary.compression is not None:
+            summary.bytes_stored += outcome.stored_size
+        summary.backends[outcome.backend] = summary.backends.get(outcome.backend, 0) + 1
+        summary.files.append(FileMetrics(file_path, size, outcome.elapsed, outcome.backend))
+        return True
+
+    def complete(self, timer, verifier):
+        """
+        Publishes the staged folder of a copy without failures, and submits it to the verifier in deferred mode.
+
+        Args:
+            timer (PhaseTimer): Receives the time spent publishing the folder.
+            verifier (Verifier): The verifier of the deferred verification mode.
+        """
+        summary = self.summary
+        if self.working_folder != summary.destination_folder and not summary.failures:
+            with timer.measure(PHASE_FSYNC):
+                fsync_path(self.checksum_file_path)
+                publish_folder(self.working_folder, summary.destination_folder)
+            self.working_folder = summary.destination_folder
+        if summary.verification == VERIFY_DEFERRED and self.working_folder == summary.destination_folder:
+            verifier.submit_folder(summary.destination_folder)
+
+
+class _CopyRun:
+    """
+    The tasks the workers of copy_files run, and the recording of their outcomes.
+
+    Every task returns, for each of its files, the outcome of the copy to each target:
+    a CopyResult, or the exception the copy failed with.
+
+    Attributes:
+        writer_pool (Executor): The writers of copy_file_to_targets, set by copy_files with several targets.
+    """
+
+    def __init__(self, targets, algorithm, backend, resume, cache, throttle, timer, progress, cancel_event):
+        self.targets = targets
+        self.algorithm = algorithm
+        self.backend = backend
+        self.resume = resume
+        self.cache = cache
+        self.throttle = throttle
+        self.timer = timer
+        self.progress = progress
+        self.cancel_event = cancel_event
+        self.writer_pool = None
+
+    def cancelled(self):
+        return self.cancel_event is not None and self.cancel_event.is_set()
+
+    def report(self, event):
+        if self.progress is not None:
+            self.progress(event)
+
+    def run_tasks(self, executor, tasks, max_pending):
+        """
+        Submits tasks to the workers until every task is done or the copy is cancelled, recording their outcomes.
+
+        Args:
+            executor (Executor): The workers.
+            tasks (iterable): The (batched, items) tasks of small_files.copy_tasks.
+            max_pending (int): The number of tasks submitted ahead of the workers, see _PendingCopies.
+        """
+        pending = _PendingCopies(max_pending, len(self.targets), self.record)
+        for batched, items in tasks:
+            if self.cancelled():
+                break
+            if batched:
+                future = executor.submit(self.copy_batch,
+                                         [(file_path, relative_path) for file_path, relative_path, _ in items])
+            else:
+                future = executor.submit(self.copy_one, items[0][0], items[0][1])
+            pending.submit(future, [(file_path, size) for file_path, _, size in items])
+        if self.cancelled():
+            pending.cancel()
+        pending.collect()
+
+    def copy_one(self, file_path, relative_path):
+        """
+        Copies a file to every target, with copy_file or, for several targets, copy_file_to_targets.
+        """
+        if self.cancelled():
+            raise CopyCancelled()
+        self.report(ProgressEvent('file', file_path))
+
+        def on_progress(copied):
+            if self.cancelled():
+                raise CopyCancelled()
+            self.report(ProgressEvent('bytes', file_path, bytes=copied))
+
+        targets = self.targets
+        if len(targets) > 1:
+            return [copy_file_to_targets(file_path, [os.path.join(target.working_folder, relative_path)
+                                                     for target in targets],
+                                         self.algorithm, [target.summary.verification for target in targets],
+                                         manifests=[target.manifest for target in targets], resume=self.resume,
+                                         cache=self.cache, on_progress=on_progress,
+                                         staged=[target.staged for target in targets], throttle=self.throttle,
+                                         metrics=self.timer, executor=self.writer_pool,
+                                         compression=[target.summary.compression for target in targets])]
+        target = targets[0]
+        return [[copy_file(file_path, os.path.join(target.working_folder, relative_path), self.algorithm,
+                           target.summary.verification, self.backend, manifest=target.manifest, resume=self.resume,
+                           cache=self.cache, on_progress=on_progress, staged=target.staged, store=target.store,
+                           throttle=self.throttle, metrics=self.timer, compression=target.summary.compression)]]
+
+    def copy_batch(self, batch):
+        """
+        Copies a batch of small files to the single target with copy_small_file, flushing its manifest once.
+        """
+        # The failures are returned rather than raised, so every file gets its own outcome
+        target = self.targets[0]
+        outcomes = []
+        try:
+            for file_path, relative_path in batch:
+                if self.cancelled():
+                    outcomes.append([CopyCancelled()])
+                    continue
+                self.report(ProgressEvent('file', file_path))
+                try:
+                    result = copy_small_file(file_path, os.path.join(target.working_folder, relative_path),
+                                             self.algorithm, target.summary.verification, manifest=target.manifest,
+                                             resume=self.resume, staged=target.staged, throttle=self.throttle,
+                                             metrics=self.timer, compression=target.summary.compression)
+                except Exception as e:
+                    outcomes.append([e])
+                    continue
+                self.report(ProgressEvent('bytes', file_path, bytes=result.size))
+                outcomes.append([result])
+        finally:
+            target.manifest.flush()
+        return outcomes
+
+    def reject(self, file_path, error):
+        """
+        Records a source file that cannot be copied as failed in every target, and reports it.
+        """
+        for target in self.targets:
+            target.summary.failures[file_path] = error
+        self.report(ProgressEvent('failed', file_path, error=error))
+
+    def record(self, file_path, size, outcomes):
+        """
+        Records the outcomes of the copy of a file in every target and reports it, unless it was cancelled.
+        """
+        if any(isinstance(outcome, CopyCancelled) for outcome in outcomes):
+            return
+        fan_out = len(self.targets) > 1
+        errors = [f"{target.summary.destination_folder}: {outcome}" if fan_out else str(outcome)
+                  for target, outcome in zip(self.targets, outcomes) if not target.record(file_path, size, outcome)]
+        if errors:
+            self.report(ProgressEvent('failed', file_path, error='; '.join(errors)))
+        else:
+            self.report(ProgressEvent('done', file_path))
+
+
+def copy_files(source_dir, destination_root_dir, json_file_path, workers=DEFAULT_WORKERS, algorithm='sha256', verify=True,
+               backend='stream', resume=False, cache=None, recursive=False, progress=None, cancel_event=None,
+               staging=None, dedup=False, small_file_threshold=SMALL_FILE_THRESHOLD, throttle=None, low_priority=False,
+               verifier=None, compression=None):
+    """
+    Copy files from the source directory to the destination directory based on the provided JSON file.
+
+    The files are copied concurrently, largest first, into a new destination folder of
+    each root (see allocate_destination_folder), with a manifest recording the state of
+    every file and a checksum file. A file that fails does not stop the others: the
+    failures are reported once every file has been processed.
+
+    Args:
+        source_dir (str): The path to the source directory.
+        destination_root_dir (str): The path to the root directory where the files will be copied,
+            or a list of such paths to copy the files to all of them.
+        json_file_path (str): The path to the JSON file containing the necessary information.
+        workers (int, optional): The number of files copied concurrently.
+        algorithm (str, optional): The hashing algorithm used to verify the copies. Defaults to 'sha256'.
+        verify (bool, str or list, optional): How to verify the copies, see verification_mode, or a list of
+            the mode of each root. Defaults to True, which reads every copied file back.
+        backend (str, optional): How the bytes are transferred, see copy_file. Defaults to 'stream'.
+        resume (bool or list, optional): Resume an incomplete copy of the source, or a list of the destination
+            folder to resume in each root (None for a new folder); a folder that does not hold a copy of the
+            source is not resumed. Defaults to False.
+        cache (ChecksumCache, optional): A cache of source checksums, see copy_file.
+        recursive (bool, optional): Copy the subdirectories too. Defaults to False.
+        progress (callable, optional): Called with a ProgressEvent as the copy goes. It must be thread-safe.
+        cancel_event (threading.Event, optional): Set it to cancel the copy.
+        staging (str, optional): None to write the files in place, or one of staging.STAGING_MODES.
+        dedup (bool, optional): Share identical content through the object store of the destination root.
+            Defaults to False.
+        small_file_threshold (int, optional): The size up to which files are copied in batches, in bytes.
+            0 copies every file on its own. Defaults to SMALL_FILE_THRESHOLD.
+        throttle (Throttle, optional): Limits the rate of the copy, across all the workers.
+        low_priority (bool, optional): Run the workers at a low CPU and I/O priority. Defaults to False.
+        verifier (verification.Verifier, optional): Verifies the folders of the roots in VERIFY_DEFERRED mode.
+        compression (str or list, optional): The codec to compress the copies with, one of compress.CODECS, or a
+            list of the codec of each root (None for no compression). Defaults to None.
+
+    Raises:
+        ValueError: If the key 'test_sequence_id' is not found in the JSON file, the algorithm
+            cannot be used to deduplicate, several roots are given with dedup or a kernel backend,
+            a verification mode is unknown or deferred without a verifier, a codec is unknown
+            or used with dedup or a kernel backend, or the test ID cannot be used as a folder name.
+        CopyFilesError: If one or more files could not be copied to one or more roots.
+        CopyCancelled: If cancel_event was set before every file was copied.
+
+    Returns:
+        CopySummary: The summary of the copy, or a list of the summaries of each root if
+        destination_root_dir is a list.
+    """
+    single_root = isinstance(destination_root_dir, (str, os.PathLike))
+    roots = [destination_root_dir] if single_root else list(destination_root_dir)
+    timer = PhaseTimer()
+    targets, source = _copy_targets(source_dir, roots, json_file_path, algorithm, backend, staging, dedup, verify,
+                                    resume, compression, verifier, timer)
+    # The files are looked up in the manifests only if a folder was resumed
+    resume = any(target.resumed for target in targets)
+    run = _CopyRun(targets, algorithm, backend, resume, cache, throttle, timer, progress, cancel_event)
+    start = time.perf_counter()
+    files, total_files, total_bytes = _files_to_copy(source_dir, recursive, targets, timer, algorithm, run.reject)
+    if dedup or backend != 'stream' or len(targets) > 1:
+        small_file_threshold = 0
+
+    initializer = lower_priority if low_priority else None
+    with ExitStack() as stack:
+        for target in targets:
+            target.start(stack, source)
+        # Entered before the copy workers, so it shuts down after them
+        if len(targets) > 1:
+            run.writer_pool = stack.enter_context(ThreadPoolExecutor(max_workers=max(1, workers) * len(targets),
+                                                                     initializer=initializer))
+        executor = stack.enter_context(ThreadPoolExecutor(max_workers=max(1, workers), initializer=initializer))
+        run.report(ProgressEvent('start', total_files=total_files, total_bytes=total_bytes,
+                                 destination_folders=[target.summary.destination_folder for target in targets]))
+        run.run_tasks(executor, copy_tasks(files, small_file_threshold), max(1, workers) * 4)
+        for target in targets:
+            target.finish(run.cancelled())
+    if not run.cancelled():
+        for target in targets:
+            target.complete(timer, verifier)
+    elapsed = time.perf_counter() - start
+    phases = timer.snapshot()
+    summaries = [target.summary for target in targets]
+    for summary in summaries:
+        summary.elapsed = elapsed
+        summary.phases = dict(phases)
+
+    if run.cancelled():
+        raise CopyCancelled(summaries[0], summaries)
+    failed = [summary for summary in summaries if summary.failures]
+    if failed:
+        raise CopyFilesError(failed[0], summaries)
+    return summaries[0] if single_root else summaries
@@ -1,9 +1,20 @@
-import tkinter as tk
-from file_copier_app import FileCopierApp
+import time
+
+# Taken before the other imports, which are part of the time to the first window
+STARTED = time.perf_counter()
+
+import sys  # noqa: E402
+import tkinter as tk  # noqa: E402
+from file_copier_app import FileCopierApp, measure_startup  # noqa: E402
 
 # Create the main window
 root = tk.Tk()
 app = FileCopierApp(root)
 
-# Run the Tkinter event loop
-root.mainloop()
\ No newline at end of file
+if '--startup-time' in sys.argv[1:]:
+    # Measure the time to the first window and exit, see `python benchmarks.py startup`
+    print(f"{measure_startup(root, STARTED) * 1000:.1f} ms to the first window")
+    root.destroy()
+else:
+    # Run the Tkinter event loop
+    root.mainloop()
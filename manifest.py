@@ -0,0 +1,214 @@
+import json
+import os
+import threading
+
+# Name of the manifest written in every destination folder.
+MANIFEST_FILE_NAME = 'manifest.jsonl'
+
+# The copy of the file has started; offset bytes have been written and synced.
+STATE_PARTIAL = 'partial'
+# The file has been copied but the destination was not read back.
+STATE_COPIED = 'copied'
+# The file has been copied and the destination checksum matches the source.
+STATE_VERIFIED = 'verified'
+# The file has been copied and sampled blocks of the destination match the source.
+STATE_SAMPLED = 'sampled'
+# The copy did not match the source and must start over.
+STATE_FAILED = 'failed'
+
+# Key of the lines of a manifest describing the copy of the whole folder rather than a file.
+COPY_RECORD_KEY = 'copy'
+
+# Largest number of characters read from the first line of a file that may be a manifest.
+FIRST_LINE_LIMIT = 64 * 1024
+
+
+class Manifest:
+    """
+    A record of the state of every file copied to a destination folder.
+
+    The manifest is an append-only JSON-lines file: every update appends the full
+    entry of one file and the last line written for a path wins. Lines are flushed as
+    they are written, so the manifest survives a crash of the copy.
+
+    Lines under COPY_RECORD_KEY describe the copy of the folder as a whole, e.g. the
+    source it is copied from and whether the copy completed; they are merged the same way.
+
+    Attributes:
+        folder (str): The destination folder the manifest describes.
+        path (str): The path of the manifest file.
+        entries (dict): The latest entry of every file, keyed by path relative to the folder.
+        copy_record (dict): The latest fields of the copy record, empty if none was recorded.
+    """
+
+    def __init__(self, folder):
+        """
+        Opens the manifest of a destination folder, loading the entries already recorded.
+
+        Args:
+            folder (str): The destination folder.
+        """
+        self.folder = folder
+        self.path = os.path.join(folder, MANIFEST_FILE_NAME)
+        self.entries, self.copy_record = _load_manifest(self.path)
+        self._lock = threading.Lock()
+        self._file = open(self.path, 'a', encoding='utf-8')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def get(self, relative_path):
+        """
+        Returns the entry of a file, or None if it has not been recorded.
+
+        Args:
+            relative_path (str): The path of the file relative to the folder.
+
+        Returns:
+            dict: The entry of the file.
+        """
+        with self._lock:
+            entry = self.entries.get(relative_path)
+            return dict(entry) if entry is not None else None
+
+    def record(self, relative_path, sync=False, flush=True, **fields):
+        """
+        Updates the entry of a file and appends it to the manifest.
+
+        Args:
+            relative_path (str): The path of the file relative to the folder.
+            sync (bool, optional): Also fsync the manifest, for checkpoints that must survive a power loss.
+            flush (bool, optional): Flush the line to the file. Entries recorded without flushing
+                are written with the next flush; a crash may lose them. Defaults to True.
+            **fields: The fields to update, e.g. size, mtime_ns, checksum, algorithm, state, offset.
+
+        Returns:
+            dict: The updated entry.
+        """
+        with self._lock:
+            entry = dict(self.entries.get(relative_path, {}), **fields)
+            entry['path'] = relative_path
+            self.entries[relative_path] = entry
+            self._file.write(json.dumps(entry) + '\n')
+            if flush or sync:
+                self._file.flush()
+            if sync:
+                os.fsync(self._file.fileno())
+            return dict(entry)
+
+    def record_copy(self, **fields):
+        """
+        Updates the copy record of the folder, and syncs the manifest.
+
+        Args:
+            **fields: The fields to update, e.g. source, metadata_checksum, complete.
+
+        Returns:
+            dict: The updated copy record.
+        """
+        with self._lock:
+            self.copy_record = dict(self.copy_record, **fields)
+            self._file.write(json.dumps({COPY_RECORD_KEY: self.copy_record}) + '\n')
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            return dict(self.copy_record)
+
+    def flush(self):
+        """
+        Flushes the entries recorded without flushing to the file.
+        """
+        with self._lock:
+            self._file.flush()
+
+    def close(self):
+        """
+        Flushes and closes the manifest file.
+        """
+        with self._lock:
+            if not self._file.closed:
+                self._file.flush()
+                os.fsync(self._file.fileno())
+                self._file.close()
+
+
+def _load_manifest(manifest_path):
+    """
+    Reads the latest entry of every file and the copy record from a manifest file.
+
+    A truncated last line, left by a crash in the middle of a write, is ignored.
+
+    Returns:
+        tuple: (entries, copy_record), both empty if the manifest does not exist.
+    """
+    entries = {}
+    copy_record = {}
+    if not os.path.exists(manifest_path):
+        return entries, copy_record
+    with open(manifest_path, encoding='utf-8') as manifest_file:
+        for line in manifest_file:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue
+            if COPY_RECORD_KEY in entry:
+                copy_record.update(entry[COPY_RECORD_KEY])
+            elif 'path' in entry:
+                entries[entry['path']] = entry
+    return entries, copy_record
+
+
+def load_manifest_entries(manifest_path):
+    """
+    Reads the latest entry of every file from a manifest file.
+
+    A truncated last line, left by a crash in the middle of a write, is ignored.
+
+    Args:
+        manifest_path (str): The path of the manifest file.
+
+    Returns:
+        dict: The entries keyed by relative path; empty if the manifest does not exist.
+    """
+    return _load_manifest(manifest_path)[0]
+
+
+def load_copy_record(manifest_path):
+    """
+    Reads the copy record from a manifest file.
+
+    Args:
+        manifest_path (str): The path of the manifest file.
+
+    Returns:
+        dict: The latest fields of the copy record; empty if the manifest does not exist or has none.
+    """
+    return _load_manifest(manifest_path)[1]
+
+
+def read_first_copy_record(manifest_path):
+    """
+    Reads the copy record written on the first line of a manifest file, without reading the rest.
+
+    copy_files writes the source of a copy on the first line of the manifest, so this
+    tells where a folder was copied from at the cost of one line, however many files
+    the manifest lists.
+
+    Args:
+        manifest_path (str): The path of the manifest file.
+
+    Returns:
+        dict: The fields of the copy record, or None if the manifest does not exist or does not start with one.
+    """
+    try:
+        with open(manifest_path, encoding='utf-8') as manifest_file:
+            line = manifest_file.readline(FIRST_LINE_LIMIT)
+    except (FileNotFoundError, UnicodeDecodeError):
+        return None
+    try:
+        entry = json.loads(line)
+    except ValueError:
+        return None
+    return entry.get(COPY_RECORD_KEY) if isinstance(entry, dict) else None
@@ -0,0 +1,215 @@
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+
+# Phases of a copy run whose time is measured.
+PHASE_LISTING = 'listing'
+PHASE_SOURCE_HASH = 'source_hash'
+PHASE_WRITE = 'write'
+PHASE_COMPRESS = 'compress'
+PHASE_VERIFY = 'verify'
+PHASE_FSYNC = 'fsync'
+PHASE_THROTTLE = 'throttle'
+PHASES = (PHASE_LISTING, PHASE_SOURCE_HASH, PHASE_WRITE, PHASE_COMPRESS, PHASE_VERIFY, PHASE_FSYNC, PHASE_THROTTLE)
+
+# Prefix of the names of the exported Prometheus metrics.
+PROMETHEUS_PREFIX = 'copy_app'
+
+
+class PhaseTimer:
+    """
+    Accumulates the time spent in each phase of a copy, from any number of threads.
+
+    The times of the workers are summed, so with several workers the total of a phase
+    can exceed the wall time of the run.
+
+    Attributes:
+        totals (dict): The seconds spent in each phase, keyed by phase name.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.totals = dict.fromkeys(PHASES, 0.0)
+
+    def add(self, phase, seconds):
+        """
+        Adds time to a phase.
+
+        Args:
+            phase (str): The phase, usually one of PHASES.
+            seconds (float): The time spent in the phase.
+        """
+        with self._lock:
+            self.totals[phase] = self.totals.get(phase, 0.0) + seconds
+
+    @contextmanager
+    def measure(self, phase):
+        """
+        Measures the time spent in the body of a with statement.
+
+        Args:
+            phase (str): The phase the time is added to.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(phase, time.perf_counter() - start)
+
+    def timed_iter(self, phase, iterable):
+        """
+        Yields the items of an iterable, adding the time spent producing them to a phase.
+
+        Args:
+            phase (str): The phase the time is added to.
+            iterable (iterable): The items, e.g. a streamed directory listing.
+
+        Yields:
+            The items of the iterable.
+        """
+        iterator = iter(iterable)
+        while True:
+            start = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                self.add(phase, time.perf_counter() - start)
+                return
+            self.add(phase, time.perf_counter() - start)
+            yield item
+
+    def snapshot(self):
+        """
+        Returns a copy of the totals.
+
+        Returns:
+            dict: The seconds spent in each phase.
+        """
+        with self._lock:
+            return dict(self.totals)
+
+
+@dataclass
+class FileMetrics:
+    """
+    The timing of the copy of one file.
+
+    Attributes:
+        path (str): The path of the source file.
+        size (int): The size of the file in bytes.
+        elapsed (float): The wall time of the copy of the file in seconds.
+        backend (str): How the bytes were transferred.
+    """
+    path: str
+    size: int
+    elapsed: float
+    backend: str
+
+    @property
+    def throughput(self):
+        """
+        float: The copy throughput of the file in bytes per second.
+        """
+        return self.size / self.elapsed if self.elapsed > 0 else 0.0
+
+
+def append_jsonl(path, records):
+    """
+    Appends records to a JSON-lines log, one line per record.
+
+    Args:
+        path (str): The path of the log; it is created if needed.
+        records (iterable): JSON-serializable dictionaries, e.g. CopySummary.to_dict() results.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    with open(path, 'a', encoding='utf-8') as log_file:
+        for record in records:
+            log_file.write(json.dumps(record, sort_keys=True) + '\n')
+
+
+def _escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _metric_line(name, value, labels):
+    if labels:
+        label_text = ','.join(f'{key}="{_escape_label(label)}"' for key, label in sorted(labels.items()))
+        return f"{PROMETHEUS_PREFIX}_{name}{{{label_text}}} {value!r}"
+    return f"{PROMETHEUS_PREFIX}_{name} {value!r}"
+
+
+def format_prometheus(reports, elapsed=None, labels=None, timestamp=None):
+    """
+    Formats the reports of a run in the Prometheus text exposition format.
+
+    The reports of every source copied by the run are aggregated into gauges describing
+    the last run, e.g. copy_app_last_run_bytes or copy_app_last_run_phase_seconds{phase="write"}.
+
+    Args:
+        reports (list): The outcomes of the run, each a CopySummary.to_dict() result with a
+            'status' key ('ok', 'failed' or 'error'), see cli.run_copy.
+        elapsed (float, optional): The wall time of the run. Defaults to the longest copy.
+        labels (dict, optional): Labels added to every metric, e.g. the host or destination.
+        timestamp (float, optional): The Unix time the run finished. Defaults to now.
+
+    Returns:
+        str: The metrics.
+    """
+    labels = dict(labels or {})
+    copied = [report for report in reports if report.get('status') != 'error']
+    files_copied = sum(report.get('files_copied', 0) for report in copied)
+    bytes_copied = sum(report.get('bytes_copied', 0) for report in copied)
+    if elapsed is None:
+        elapsed = max((report.get('elapsed', 0.0) for report in copied), default=0.0)
+    phases = dict.fromkeys(PHASES, 0.0)
+    for report in copied:
+        for phase, seconds in report.get('phases', {}).items():
+            phases[phase] = phases.get(phase, 0.0) + seconds
+
+    metrics = [
+        ('last_run_timestamp_seconds', "Unix time the last copy run finished.",
+         [({}, float(timestamp if timestamp is not None else time.time()))]),
+        ('last_run_duration_seconds', "Wall time of the last copy run.", [({}, float(elapsed))]),
+        ('last_run_sources', "Sources of the last copy run by status.",
+         [({'status': status}, sum(report.get('status') == status for report in reports))
+          for status in ('ok', 'failed', 'error')]),
+        ('last_run_files', "Files of the last copy run by status.",
+         [({'status': 'copied'}, files_copied),
+          ({'status': 'skipped'}, sum(report.get('files_skipped', 0) for report in copied)),
+          ({'status': 'failed'}, sum(len(report.get('failures', {})) for report in copied))]),
+        ('last_run_bytes', "Bytes copied by the last copy run.", [({}, bytes_copied)]),
+        ('last_run_throughput_bytes_per_second', "Bytes copied per second by the last copy run.",
+         [({}, bytes_copied / elapsed if elapsed > 0 else 0.0)]),
+        ('last_run_files_per_second', "Files copied per second by the last copy run.",
+         [({}, files_copied / elapsed if elapsed > 0 else 0.0)]),
+        ('last_run_phase_seconds', "Seconds spent in each phase of the last copy run, summed over the workers.",
+         [({'phase': phase}, seconds) for phase, seconds in sorted(phases.items())]),
+    ]
+    lines = []
+    for name, help_text, samples in metrics:
+        lines.append(f"# HELP {PROMETHEUS_PREFIX}_{name} {help_text}")
+        lines.append(f"# TYPE {PROMETHEUS_PREFIX}_{name} gauge")
+        lines.extend(_metric_line(name, value, dict(labels, **sample_labels)) for sample_labels, value in samples)
+    return '\n'.join(lines) + '\n'
+
+
+def write_prometheus_textfile(path, reports, elapsed=None, labels=None):
+    """
+    Writes the metrics of a run to a file read by the textfile collector of the Prometheus node exporter.
+
+    The file is replaced atomically, so the collector never reads a partial file.
+
+    Args:
+        path (str): The path of the .prom file, in the directory of the textfile collector.
+        reports (list): The outcomes of the run, see format_prometheus.
+        elapsed (float, optional): The wall time of the run.
+        labels (dict, optional): Labels added to every metric.
+    """
+    temporary_path = f"{path}.{os.getpid()}.tmp"
+    with open(temporary_path, 'w', encoding='utf-8') as prom_file:
+        prom_file.write(format_prometheus(reports, elapsed, labels))
+    os.replace(temporary_path, path)
@@ -0,0 +1,190 @@
+import errno
+import os
+from transfer import transfer_file
+
+# Hidden directory of the destination root holding the content-addressed objects.
+OBJECT_STORE_DIR_NAME = '.objects'
+
+# Algorithms whose checksums are trusted to identify content. A collision would link
+# the wrong bytes into a folder, so fast non-cryptographic checksums are refused.
+DEDUP_ALGORITHMS = ('sha256', 'sha384', 'sha512', 'blake2b', 'blake2s', 'sha3_256', 'sha3_384', 'sha3_512')
+
+# Errors meaning a file cannot be hardlinked, so the next way of sharing it should be tried.
+LINK_FALLBACK_ERRNOS = {errno.EMLINK, errno.EPERM, errno.EXDEV, errno.ENOTSUP, errno.EOPNOTSUPP}
+
+
+class ObjectStore:
+    """
+    A content-addressed store of copied files, shared by the folders of a destination root.
+
+    Every copied file is also linked into the store under its checksum. A later copy
+    of the same content is then hardlinked from the store instead of being written
+    again, so it costs neither write bandwidth nor disk space. When a hardlink is not
+    possible (e.g. the link count limit of the file system is reached), the object is
+    cloned with a reflink where the file system supports it.
+
+    Hardlinked copies share one inode: a file modified in place is modified in every
+    folder holding it. Copies are meant to be read only.
+
+    Objects only referenced by the store have a link count of 1 and are removed by
+    collect_garbage.
+
+    Attributes:
+        root (str): The destination root the store belongs to.
+        algorithm (str): The hashing algorithm of the checksums.
+        path (str): The directory of the objects.
+    """
+
+    def __init__(self, root, algorithm='sha256'):
+        """
+        Opens the object store of a destination root.
+
+        Args:
+            root (str): The destination root.
+            algorithm (str, optional): The hashing algorithm of the checksums, one of DEDUP_ALGORITHMS.
+
+        Raises:
+            ValueError: If the algorithm cannot identify content safely.
+        """
+        if algorithm not in DEDUP_ALGORITHMS:
+            raise ValueError(f"Deduplication needs a cryptographic hash, not {algorithm}; "
+                             f"use one of {', '.join(DEDUP_ALGORITHMS)}")
+        self.root = root
+        self.algorithm = algorithm
+        self.path = os.path.join(root, OBJECT_STORE_DIR_NAME, algorithm)
+
+    def object_path(self, checksum):
+        """
+        Returns the path of the object with a checksum.
+
+        Args:
+            checksum (str): The checksum of the content.
+
+        Returns:
+            str: The path of the object, fanned out by the first two characters of the checksum.
+        """
+        return os.path.join(self.path, checksum[:2], checksum[2:])
+
+    def link(self, checksum, size, destination_path):
+        """
+        Creates a file from the object with a checksum, if the store holds it.
+
+        Args:
+            checksum (str): The checksum of the content.
+            size (int): The size of the content in bytes, checked against the object.
+            destination_path (str): The path of the file to create; an existing file is replaced.
+
+        Returns:
+            bool: True if the file was created from the store, False if it must be copied.
+        """
+        object_path = self.object_path(checksum)
+        try:
+            if os.path.getsize(object_path) != size:
+                return False
+        except OSError:
+            return False
+        try:
+            os.remove(destination_path)
+        except FileNotFoundError:
+            pass
+        try:
+            os.link(object_path, destination_path)
+            return True
+        except FileNotFoundError:
+            # Collected in the meantime
+            return False
+        except OSError as e:
+            if e.errno not in LINK_FALLBACK_ERRNOS:
+                raise
+        try:
+            transfer_file(object_path, destination_path, 'reflink')
+            return True
+        except OSError:
+            try:
+                os.remove(destination_path)
+            except FileNotFoundError:
+                pass
+            return False
+
+    def discard(self, checksum):
+        """
+        Removes the object with a checksum from the store, e.g. because its content no longer matches it.
+
+        Files already linked to the object keep their content.
+
+        Args:
+            checksum (str): The checksum of the content.
+        """
+        try:
+            os.remove(self.object_path(checksum))
+        except FileNotFoundError:
+            pass
+
+    def add(self, file_path, checksum):
+        """
+        Links a copied file into the store, unless the store already holds its content.
+
+        Args:
+            file_path (str): The path of the copied and verified file.
+            checksum (str): The checksum of the file.
+
+        Returns:
+            bool: True if the file was added, False if the store already held it or the file cannot be linked.
+        """
+        object_path = self.object_path(checksum)
+        os.makedirs(os.path.dirname(object_path), exist_ok=True)
+        try:
+            os.link(file_path, object_path)
+        except (FileExistsError, FileNotFoundError):
+            # Already stored, or its directory was just collected
+            return False
+        except OSError as e:
+            if e.errno not in LINK_FALLBACK_ERRNOS:
+                raise
+            return False
+        return True
+
+
+def collect_garbage(root, dry_run=False):
+    """
+    Removes the objects no folder of a destination root references any more.
+
+    An object still linked from a folder has a link count above 1. An object that is
+    only in the store (its folders were deleted, or it was reflinked or copied instead
+    of hardlinked) is removed: at worst a later copy of its content is written again.
+
+    Args:
+        root (str): The destination root.
+        dry_run (bool, optional): Only count the objects that would be removed. Defaults to False.
+
+    Returns:
+        dict: The number of objects kept and removed, and the number of bytes freed.
+    """
+    stats = {'objects_kept': 0, 'objects_removed': 0, 'bytes_freed': 0}
+    store_dir = os.path.join(root, OBJECT_STORE_DIR_NAME)
+    if not os.path.isdir(store_dir):
+        return stats
+    for directory, _, names in os.walk(store_dir, topdown=False):
+        for name in names:
+            object_path = os.path.join(directory, name)
+            try:
+                stat = os.stat(object_path)
+            except FileNotFoundError:
+                continue
+            if stat.st_nlink > 1:
+                stats['objects_kept'] += 1
+                continue
+            if not dry_run:
+                try:
+                    os.remove(object_path)
+                except FileNotFoundError:
+                    continue
+            stats['objects_removed'] += 1
+            stats['bytes_freed'] += stat.st_size
+        if not dry_run and directory != store_dir:
+            try:
+                os.rmdir(directory)
+            except OSError:
+                # Not empty
+                pass
+    return stats
@@ -0,0 +1,124 @@
+"""
+Restore copied folders, compressed or not, to plain copies of their source.
+
+The files of a destination folder are read back as listed in its manifest: compressed
+copies are decompressed, the others copied, and every restored file is checked against
+the checksum recorded when it was copied before it appears under its name. The
+checksum files are restored too, so the restored folder can be checked with
+`sha256sum -c` and friends.
+"""
+import glob
+import os
+import shutil
+import time
+from concurrent.futures import ThreadPoolExecutor
+from checksums import new_hasher
+from compress import SUFFIXES, decompress_file
+from file_operations import (
+    CHECKSUM_FILE_NAME, DEFAULT_WORKERS, CopySummary, copy_with_checksum, is_checksum_file_name,
+)
+from manifest import MANIFEST_FILE_NAME, STATE_COPIED, STATE_SAMPLED, STATE_VERIFIED, load_manifest_entries
+from staging import partial_path
+
+
+def restore_file(path, destination_path, compression=None, algorithm='sha256'):
+    """
+    Writes the content of a copied file to a new file, decompressing it if needed.
+
+    Args:
+        path (str): The path of the copy.
+        destination_path (str): The path of the file to write.
+        compression (str, optional): The codec the copy is compressed with, one of compress.CODECS.
+        algorithm (str, optional): The hashing algorithm of the checksum returned. Defaults to 'sha256'.
+
+    Returns:
+        str: The checksum of the content written.
+    """
+    if compression is None:
+        return copy_with_checksum(path, destination_path, algorithm)
+    hash_func = new_hasher(algorithm)
+    decompress_file(path, compression, destination_path, hash_func)
+    shutil.copymode(path, destination_path)
+    return hash_func.hexdigest()
+
+
+def _stays_inside(relative_path):
+    """
+    Tells whether a path of a manifest names a file inside the folder it is relative to.
+    """
+    path = os.path.normpath(relative_path)
+    return not (os.path.isabs(path) or os.path.splitdrive(path)[0] or path == os.pardir
+                or path.startswith(os.pardir + os.sep))
+
+
+def _restore_entry(folder, destination_folder, relative_path, entry):
+    """
+    Restores one file of a folder, returning the number of bytes restored.
+    """
+    compression = entry.get('compression')
+    restored_path = relative_path[:-len(SUFFIXES[compression])] if compression is not None else relative_path
+    destination_path = os.path.join(destination_folder, os.path.normpath(restored_path))
+    os.makedirs(os.path.dirname(destination_path), exist_ok=True)
+    write_path = partial_path(destination_path)
+    try:
+        checksum = restore_file(os.path.join(folder, relative_path), write_path, compression, entry['algorithm'])
+        if checksum != entry['checksum']:
+            raise ValueError("Checksum mismatch: the copy does not match the source it was copied from.")
+        os.replace(write_path, destination_path)
+    except BaseException:
+        try:
+            os.remove(write_path)
+        except FileNotFoundError:
+            pass
+        raise
+    return entry['size']
+
+
+def restore_folder(folder, destination_folder, workers=DEFAULT_WORKERS):
+    """
+    Restores a destination folder to a plain copy of its source.
+
+    Files are restored concurrently. A file that fails, e.g. because its copy does not
+    match its checksum any more, does not stop the others, and is reported in the
+    failures of the summary, as is a manifest entry whose path leaves the folder.
+
+    Args:
+        folder (str): The destination folder, e.g. /nas/test_1_2.
+        destination_folder (str): The folder to restore the files to. It is created if needed.
+        workers (int, optional): The number of files restored concurrently.
+
+    Returns:
+        CopySummary: The outcome of the restore; the failures are keyed by path relative to folder.
+
+    Raises:
+        FileNotFoundError: If the folder has no manifest.
+    """
+    entries = load_manifest_entries(os.path.join(folder, MANIFEST_FILE_NAME))
+    if not entries:
+        raise FileNotFoundError(f"{folder} has no manifest to restore it from")
+    summary = CopySummary(destination_folder, started_at=time.time())
+    start = time.perf_counter()
+    os.makedirs(destination_folder, exist_ok=True)
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        futures = {}
+        for relative_path, entry in sorted(entries.items()):
+            if entry.get('state') not in (STATE_COPIED, STATE_SAMPLED, STATE_VERIFIED):
+                summary.failures[relative_path] = f"the copy did not complete ({entry.get('state')})"
+                continue
+            if not _stays_inside(relative_path):
+                summary.failures[relative_path] = "the path leaves the restore folder"
+                continue
+            futures[relative_path] = executor.submit(_restore_entry, folder, destination_folder, relative_path, entry)
+        for relative_path, future in futures.items():
+            try:
+                summary.bytes_copied += future.result()
+            except Exception as e:
+                summary.failures[relative_path] = str(e)
+                continue
+            summary.files_copied += 1
+    for checksum_file_path in glob.glob(os.path.join(glob.escape(folder), CHECKSUM_FILE_NAME.format(algorithm='*'))):
+        if not is_checksum_file_name(os.path.basename(checksum_file_path)):
+            continue
+        shutil.copyfile(checksum_file_path, os.path.join(destination_folder, os.path.basename(checksum_file_path)))
+    summary.elapsed = time.perf_counter() - start
+    return summary
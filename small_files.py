@@ -0,0 +1,84 @@
+"""
+Copy small files in memory, several per task.
+
+A tree of many tiny files is dominated by per-file overheads rather than by its bytes:
+copy_files groups its small files in batches, each a single task of a worker, and
+copy_small_file reads, writes and reads back each of them with a single call.
+"""
+import os
+from compress import DECOMPRESSION_ERRORS, decompress_bytes
+
+# Files up to this size are copied in memory, several per worker task (see file_operations.copy_small_file).
+SMALL_FILE_THRESHOLD = 128 * 1024
+
+# Largest number of files, and of bytes, of the small files copied by one worker task.
+SMALL_FILE_BATCH = 64
+SMALL_FILE_BATCH_BYTES = 4 * 1024 * 1024
+
+
+def copy_tasks(files, small_file_threshold):
+    """
+    Groups the files streamed to copy_files into the tasks of its workers.
+
+    A file larger than the threshold is a task of its own; the smaller files are
+    grouped in batches of up to SMALL_FILE_BATCH files and SMALL_FILE_BATCH_BYTES bytes.
+
+    Args:
+        files (iterable): (path, relative_path, size) tuples.
+        small_file_threshold (int): The size up to which files are batched, in bytes.
+
+    Yields:
+        tuple: (batched, items): whether the task is a batch of small files, and its (path, relative_path, size) tuples.
+    """
+    small_files, small_bytes = [], 0
+    for item in files:
+        if item[2] > small_file_threshold:
+            yield False, [item]
+            continue
+        small_files.append(item)
+        small_bytes += item[2]
+        if len(small_files) >= SMALL_FILE_BATCH or small_bytes >= SMALL_FILE_BATCH_BYTES:
+            yield True, small_files
+            small_files, small_bytes = [], 0
+    if small_files:
+        yield True, small_files
+
+
+def write_file(path, data, mode):
+    """
+    Writes a file in a single write, bypassing the buffering of Python.
+
+    Args:
+        path (str): The path of the file; an existing file is replaced.
+        data (bytes): The content of the file.
+        mode (int): The permission bits of the file, e.g. those of its source.
+    """
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC | getattr(os, 'O_BINARY', 0), 0o666)
+    try:
+        view = memoryview(data)
+        while view:
+            view = view[os.write(fd, view):]
+    finally:
+        os.close(fd)
+    os.chmod(path, mode & 0o7777)
+
+
+def read_back(path, codec=None):
+    """
+    Reads a written file back in a single read, decompressing it if needed.
+
+    Args:
+        path (str): The path of the file.
+        codec (str, optional): The codec the file is compressed with, one of compress.CODECS.
+
+    Returns:
+        bytes: The content of the file, or None if it cannot be decompressed.
+    """
+    with open(path, 'rb', buffering=0) as f:
+        data = f.read()
+    if codec is None:
+        return data
+    try:
+        return decompress_bytes(data, codec)
+    except DECOMPRESSION_ERRORS:
+        return None
@@ -0,0 +1,260 @@
+import ctypes
+import os
+import sys
+import threading
+import time
+from metrics import PHASE_FSYNC
+
+# Staging modes of copy_files: every file is written to a partial file and renamed
+# into place once verified, or the whole folder is built aside and renamed at the end.
+STAGING_FILE = 'file'
+STAGING_FOLDER = 'folder'
+STAGING_MODES = (STAGING_FILE, STAGING_FOLDER)
+
+# Suffix of the hidden file a staged file is written to before it is renamed into place.
+PARTIAL_SUFFIX = '.partial'
+
+# Hidden directory of the destination root where staged folders are built.
+STAGING_DIR_NAME = '.staging'
+
+# A batch of staged files is made durable once it holds this many files or bytes.
+DEFAULT_BATCH_FILES = 256
+DEFAULT_BATCH_BYTES = 256 * 1024 * 1024
+
+
+def _load_syncfs():
+    """
+    Returns the syncfs function of the C library, or None where it is not available.
+    """
+    if not sys.platform.startswith('linux'):
+        return None
+    try:
+        syncfs = ctypes.CDLL(None, use_errno=True).syncfs
+    except (OSError, AttributeError):
+        return None
+    syncfs.argtypes = [ctypes.c_int]
+    return syncfs
+
+
+_syncfs = _load_syncfs()
+
+
+def partial_path(destination_path):
+    """
+    Returns the path a file is staged at before it is renamed to destination_path.
+
+    The partial file is hidden and sits next to the destination, on the same file
+    system, so the rename is atomic.
+
+    Args:
+        destination_path (str): The final path of the file.
+
+    Returns:
+        str: The path of the partial file.
+    """
+    directory, name = os.path.split(destination_path)
+    return os.path.join(directory, f".{name}{PARTIAL_SUFFIX}")
+
+
+def staging_folder_path(destination_folder):
+    """
+    Returns the hidden folder a destination folder is built in before it is renamed into place.
+
+    Args:
+        destination_folder (str): The final path of the folder.
+
+    Returns:
+        str: The path of the staging folder, in the STAGING_DIR_NAME directory of the same root.
+    """
+    root, name = os.path.split(os.path.normpath(destination_folder))
+    return os.path.join(root, STAGING_DIR_NAME, name)
+
+
+def fsync_path(path):
+    """
+    Flushes a file to disk.
+
+    Args:
+        path (str): The path of the file.
+    """
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def fsync_directory(path):
+    """
+    Flushes the entries of a directory to disk, so the files created or renamed in it survive a power loss.
+
+    Directories cannot be opened on Windows, where the file system persists renames itself;
+    this does nothing there.
+
+    Args:
+        path (str): The path of the directory.
+    """
+    if os.name == 'nt':
+        return
+    fsync_path(path)
+
+
+def sync_filesystem(path):
+    """
+    Flushes every dirty file of the file system holding a path to disk, in one system call.
+
+    Args:
+        path (str): A path on the file system.
+
+    Returns:
+        bool: True if the file system was synced, False if syncfs is not available.
+    """
+    if _syncfs is None:
+        return False
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        if _syncfs(fd) != 0:
+            error = ctypes.get_errno()
+            raise OSError(error, os.strerror(error), path)
+    finally:
+        os.close(fd)
+    return True
+
+
+class StagedWrites:
+    """
+    A batch of written files made durable together, then renamed into place.
+
+    Files are handed over once written and verified. When the batch is full, or when
+    it is flushed, the files are synced to disk, renamed from their partial path to
+    their final path and their directories synced once, so the final names only ever
+    point at complete files. A batch of several files is synced with one syncfs call
+    per file system where available, instead of one fsync per file.
+
+    Without promote, the files are already at their final path (e.g. in a staging
+    folder) and the batch only makes them durable.
+
+    The batch is thread-safe and is flushed when used as a context manager exits.
+
+    Attributes:
+        promote (bool): Rename the partial files into place.
+        batch_files (int): The number of files that triggers a flush.
+        batch_bytes (int): The number of bytes that triggers a flush.
+        metrics (PhaseTimer): Receives the time spent syncing, or None.
+    """
+
+    def __init__(self, promote=True, batch_files=DEFAULT_BATCH_FILES, batch_bytes=DEFAULT_BATCH_BYTES, metrics=None):
+        self.promote = promote
+        self.batch_files = batch_files
+        self.batch_bytes = batch_bytes
+        self.metrics = metrics
+        self._lock = threading.Lock()
+        self._pending = []
+        self._pending_bytes = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.flush()
+
+    def staging_path(self, destination_path):
+        """
+        Returns the path a file must be written to before it is added to the batch.
+
+        Args:
+            destination_path (str): The final path of the file.
+
+        Returns:
+            str: The partial path of the file, or destination_path without promote.
+        """
+        return partial_path(destination_path) if self.promote else destination_path
+
+    def add(self, destination_path, size=0):
+        """
+        Adds a written file to the batch, flushing the batch if it is full.
+
+        Args:
+            destination_path (str): The final path of the file.
+            size (int, optional): The size of the file in bytes.
+        """
+        with self._lock:
+            self._pending.append(destination_path)
+            self._pending_bytes += size
+            full = len(self._pending) >= self.batch_files or self._pending_bytes >= self.batch_bytes
+        if full:
+            self.flush()
+
+    def discard(self, destination_path):
+        """
+        Removes the partial file of a file that will not be added to the batch.
+
+        Args:
+            destination_path (str): The final path of the file.
+        """
+        if not self.promote:
+            return
+        try:
+            os.remove(partial_path(destination_path))
+        except FileNotFoundError:
+            pass
+
+    def flush(self):
+        """
+        Makes the files of the batch durable and renames them into place.
+        """
+        with self._lock:
+            pending, self._pending, self._pending_bytes = self._pending, [], 0
+        if not pending:
+            return
+        started = time.perf_counter()
+        written = [self.staging_path(path) for path in pending]
+        directories = sorted({os.path.dirname(os.path.abspath(path)) for path in pending})
+
+        synced = False
+        if len(written) > 1:
+            devices = {}
+            for directory in directories:
+                devices.setdefault(os.stat(directory).st_dev, directory)
+            synced = all(sync_filesystem(directory) for directory in devices.values())
+        if not synced:
+            for path in written:
+                fsync_path(path)
+
+        if self.promote:
+            for path in pending:
+                os.replace(partial_path(path), path)
+        for directory in directories:
+            fsync_directory(directory)
+        if self.metrics is not None:
+            self.metrics.add(PHASE_FSYNC, time.perf_counter() - started)
+
+
+def publish_folder(staging_folder, destination_folder):
+    """
+    Renames a complete staging folder to its final path, so the folder appears at once.
+
+    The directories of the staging folder are synced first, so the folder never appears
+    with missing entries after a power loss. The final path may already exist as an
+    empty directory reserving its name: it is replaced atomically on POSIX systems, and
+    removed just before the rename on Windows.
+
+    Args:
+        staging_folder (str): The folder holding the synced files.
+        destination_folder (str): The final path of the folder.
+    """
+    for directory, _, _ in os.walk(staging_folder):
+        fsync_directory(directory)
+    try:
+        os.replace(staging_folder, destination_folder)
+    except OSError:
+        if os.name != 'nt':
+            raise
+        os.rmdir(destination_folder)
+        os.rename(staging_folder, destination_folder)
+    fsync_directory(os.path.dirname(os.path.abspath(destination_folder)))
+    try:
+        os.rmdir(os.path.dirname(staging_folder))
+    except OSError:
+        # Other folders are still being staged
+        pass
@@ -0,0 +1,66 @@
+import copy
+import io
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from contextlib import redirect_stdout
+from copy_app.benchmarks import compare_reports, main
+
+
+class BenchmarkSuiteTestCase(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.baseline_path = os.path.join(self.temp_dir, 'baseline.json')
+        self.current_path = os.path.join(self.temp_dir, 'current.json')
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def run_main(self, *argv):
+        output = io.StringIO()
+        with redirect_stdout(output):
+            status = main(list(argv))
+        return status, output.getvalue()
+
+    def test_suite_and_compare(self):
+        # The smallest dataset, with a single run of each case
+        status, output = self.run_main('suite', '--datasets', 'metadata', '--metadata-mb', '1', '--lookups', '1',
+                                       '--repeat', '1', '--data-dir', os.path.join(self.temp_dir, 'data'),
+                                       '--output', self.baseline_path)
+        self.assertIsNone(status)
+        self.assertIn('get_value_from_dict/metadata', output)
+        with open(self.baseline_path) as f:
+            baseline = json.load(f)
+        self.assertEqual(list(baseline['results']), ['get_value_from_dict/metadata'])
+        self.assertGreater(baseline['results']['get_value_from_dict/metadata']['throughput'], 0)
+
+        # A run 5% slower is within the default tolerance of 10%
+        current = copy.deepcopy(baseline)
+        current['results']['get_value_from_dict/metadata']['throughput'] *= 0.95
+        with open(self.current_path, 'w') as f:
+            json.dump(current, f)
+        status, output = self.run_main('compare', self.baseline_path, self.current_path)
+        self.assertEqual(status, 0)
+        self.assertIn('-5.0%', output)
+        self.assertNotIn('REGRESSION', output)
+
+        # Not within a tolerance of 2%
+        status, output = self.run_main('compare', self.baseline_path, self.current_path, '--tolerance', '2')
+        self.assertEqual(status, 1)
+        self.assertIn('REGRESSION', output)
+
+    def test_compare_reports_peak_rss(self):
+        result = {'unit': 'MiB', 'throughput': 100.0, 'seconds': 1.0, 'amount': 100, 'peak_rss': 100 * 1024 ** 2}
+        baseline = {'format': 1, 'results': {'case': result}}
+        current = {'format': 1, 'results': {'case': dict(result, peak_rss=120 * 1024 ** 2)}}
+
+        self.assertFalse(compare_reports(baseline, current, 0.25)[0][-1])
+        self.assertTrue(compare_reports(baseline, current, 0.1)[0][-1])
+        with self.assertRaises(ValueError):
+            compare_reports(baseline, dict(current, format=2), 0.1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,63 @@
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from copy_app.checksum_cache import ChecksumCache
+
+
+class ChecksumCacheTestCase(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.cache = ChecksumCache(os.path.join(self.temp_dir, 'cache', 'checksums.sqlite'), max_entries=2)
+        self.file_paths = []
+        for i in range(3):
+            file_path = os.path.join(self.temp_dir, f'file_{i}.bin')
+            with open(file_path, 'wb') as f:
+                f.write(b'x' * i)
+            # Files modified in the last seconds are not cached
+            old = time.time() - 60
+            os.utime(file_path, (old, old))
+            self.file_paths.append(file_path)
+
+    def tearDown(self):
+        self.cache.close()
+        shutil.rmtree(self.temp_dir)
+
+    def test_put_and_get(self):
+        stat = os.stat(self.file_paths[0])
+        self.cache.put(stat, 'sha256', 'abc')
+        self.assertEqual(self.cache.get(stat, 'sha256'), 'abc')
+        self.assertIsNone(self.cache.get(stat, 'blake2b'))
+
+    def test_modified_file_misses(self):
+        self.cache.put(os.stat(self.file_paths[0]), 'sha256', 'abc')
+        os.utime(self.file_paths[0], None)
+        self.assertIsNone(self.cache.get(os.stat(self.file_paths[0]), 'sha256'))
+
+    def test_recently_modified_file_is_not_cached(self):
+        os.utime(self.file_paths[0], None)
+        stat = os.stat(self.file_paths[0])
+        self.cache.put(stat, 'sha256', 'abc')
+        self.assertIsNone(self.cache.get(stat, 'sha256'))
+
+    def test_least_recently_used_is_evicted(self):
+        stats = [os.stat(file_path) for file_path in self.file_paths]
+        self.cache.put(stats[0], 'sha256', 'a')
+        self.cache.put(stats[1], 'sha256', 'b')
+        self.cache.get(stats[0], 'sha256')
+        self.cache.put(stats[2], 'sha256', 'c')
+
+        self.assertEqual(len(self.cache), 2)
+        self.assertEqual(self.cache.get(stats[0], 'sha256'), 'a')
+        self.assertIsNone(self.cache.get(stats[1], 'sha256'))
+
+    def test_persistent(self):
+        stat = os.stat(self.file_paths[0])
+        self.cache.put(stat, 'sha256', 'abc')
+        with ChecksumCache(self.cache.path) as reopened:
+            self.assertEqual(reopened.get(stat, 'sha256'), 'abc')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,50 @@
+import hashlib
+import os
+import tempfile
+import unittest
+import zlib
+from copy_app.checksums import new_hasher, register_algorithm, available_algorithms, chunk_size_for, MB
+
+
+class NewHasherTestCase(unittest.TestCase):
+
+    def test_hashlib_algorithm(self):
+        hasher = new_hasher('blake2b')
+        hasher.update(b'Test file content')
+        self.assertEqual(hasher.hexdigest(), hashlib.blake2b(b'Test file content').hexdigest())
+
+    def test_crc32(self):
+        hasher = new_hasher('crc32')
+        hasher.update(b'Test file ')
+        copy = hasher.copy()
+        hasher.update(b'content')
+        self.assertEqual(hasher.hexdigest(), f"{zlib.crc32(b'Test file content'):08x}")
+        self.assertEqual(copy.hexdigest(), f"{zlib.crc32(b'Test file '):08x}")
+
+    def test_register_algorithm(self):
+        register_algorithm('test_sha1', hashlib.sha1)
+        self.assertIn('test_sha1', available_algorithms())
+        self.assertEqual(new_hasher('test_sha1').hexdigest(), hashlib.sha1().hexdigest())
+
+    def test_unsupported_algorithm(self):
+        with self.assertRaises(ValueError):
+            new_hasher('not_a_hash')
+
+
+class ChunkSizeForTestCase(unittest.TestCase):
+
+    def test_small_file(self):
+        self.assertEqual(chunk_size_for(100), 64 * 1024)
+
+    def test_large_file(self):
+        self.assertEqual(chunk_size_for(100 * MB), 100 * MB // 16)
+        self.assertEqual(chunk_size_for(10 * 1024 * MB), 8 * MB)
+
+    def test_multiple_of_block_size(self):
+        with tempfile.NamedTemporaryFile() as f:
+            block_size = getattr(os.stat(f.name), 'st_blksize', 1)
+            self.assertEqual(chunk_size_for(100 * MB + 1, f.name) % block_size, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,150 @@
+import io
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from contextlib import redirect_stderr, redirect_stdout
+from copy_app.cli import main, expand_sources
+
+
+class CliTestCase(unittest.TestCase):
+    def setUp(self):
+        self.source_root = tempfile.mkdtemp()
+        self.destination_root_dir = tempfile.mkdtemp()
+        self.source_dirs = []
+        for test_id in ['test_1', 'test_2']:
+            source_dir = os.path.join(self.source_root, f'capture_{test_id}')
+            os.makedirs(source_dir)
+            with open(os.path.join(source_dir, 'test.json'), 'w') as json_file:
+                json.dump({"test_sequence_id": test_id}, json_file)
+            with open(os.path.join(source_dir, 'video.mp3'), 'wb') as f:
+                f.write(os.urandom(1000))
+            self.source_dirs.append(source_dir)
+
+    def tearDown(self):
+        shutil.rmtree(self.source_root)
+        shutil.rmtree(self.destination_root_dir)
+
+    def run_main(self, *args):
+        output = io.StringIO()
+        with redirect_stdout(output):
+            exit_code = main(list(args))
+        return exit_code, output.getvalue()
+
+    def test_copy(self):
+        exit_code, output = self.run_main('copy', self.source_dirs[0], '-d', self.destination_root_dir)
+
+        self.assertEqual(exit_code, 0)
+        self.assertIn('OK 2 files copied', output)
+        self.assertTrue(os.path.exists(os.path.join(self.destination_root_dir, 'test_1_1', 'video.mp3')))
+
+    def test_batch_copy_with_glob(self):
+        exit_code, output = self.run_main('copy', os.path.join(self.source_root, 'capture_*'),
+                                          '-d', self.destination_root_dir, '--jobs', '2', '--json')
+
+        self.assertEqual(exit_code, 0)
+        results = json.loads(output)['results']
+        self.assertEqual([result['source'] for result in results], self.source_dirs)
+        self.assertEqual([result['status'] for result in results], ['ok', 'ok'])
+        self.assertEqual(sorted(name for name in os.listdir(self.destination_root_dir) if not name.startswith('.')),
+                         ['test_1_1', 'test_2_1'])
+
+    def test_copy_to_several_destinations(self):
+        mirror_root_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, mirror_root_dir)
+
+        exit_code, output = self.run_main('copy', self.source_dirs[0], '-d', self.destination_root_dir,
+                                          '-d', mirror_root_dir, '--json')
+
+        self.assertEqual(exit_code, 0)
+        results = json.loads(output)['results']
+        self.assertEqual([result['destination_folder'] for result in results],
+                         [os.path.join(self.destination_root_dir, 'test_1_1'), os.path.join(mirror_root_dir, 'test_1_1')])
+        self.assertEqual([result['status'] for result in results], ['ok', 'ok'])
+
+    def test_deferred_verification_and_verify(self):
+        exit_code, output = self.run_main('copy', self.source_dirs[0], '-d', self.destination_root_dir,
+                                          '--verify', 'deferred', '--json')
+
+        self.assertEqual(exit_code, 0)
+        folder = os.path.join(self.destination_root_dir, 'test_1_1')
+        self.assertEqual([(report['folder'], report['status']) for report in json.loads(output)['verifications']],
+                         [(folder, 'ok')])
+
+        with open(os.path.join(folder, 'video.mp3'), 'r+b') as f:
+            f.write(b'corrupt')
+        exit_code, output = self.run_main('verify', folder)
+        self.assertEqual(exit_code, 1)
+        self.assertIn('video.mp3: checksum mismatch', output)
+
+    def test_verify_and_no_verify_conflict(self):
+        with redirect_stderr(io.StringIO()), self.assertRaises(SystemExit):
+            self.run_main('copy', self.source_dirs[0], '-d', self.destination_root_dir, '--verify', 'full',
+                          '--no-verify')
+        self.assertEqual(os.listdir(self.destination_root_dir), [])
+
+    def test_compressed_copy_and_restore(self):
+        with open(os.path.join(self.source_dirs[0], 'sensors.csv'), 'w') as f:
+            f.write('12.5,sensor_1,OK\n' * 1000)
+        exit_code, output = self.run_main('copy', self.source_dirs[0], '-d', self.destination_root_dir,
+                                          '--compress', 'gzip')
+        self.assertEqual(exit_code, 0)
+        self.assertIn('compressed with gzip', output)
+
+        restore_dir = os.path.join(self.source_root, 'restored')
+        exit_code, output = self.run_main('restore', os.path.join(self.destination_root_dir, 'test_1_1'), restore_dir)
+        self.assertEqual(exit_code, 0)
+        self.assertEqual(sorted(os.listdir(restore_dir)), ['checksums.sha256', 'sensors.csv', 'test.json', 'video.mp3'])
+
+    def test_gc(self):
+        self.run_main('copy', self.source_dirs[0], '-d', self.destination_root_dir, '--dedup')
+        shutil.rmtree(os.path.join(self.destination_root_dir, 'test_1_1'))
+
+        exit_code, output = self.run_main('gc', self.destination_root_dir, '--json')
+
+        self.assertEqual(exit_code, 0)
+        self.assertEqual(json.loads(output)['objects_removed'], 2)
+
+    def test_metrics_export(self):
+        log_path = os.path.join(self.destination_root_dir, 'copy_app.jsonl')
+        prom_path = os.path.join(self.destination_root_dir, 'copy_app.prom')
+        exit_code, output = self.run_main('copy', self.source_dirs[0], '-d', self.destination_root_dir, '--json',
+                                          '--metrics-log', log_path, '--prometheus-textfile', prom_path)
+
+        self.assertEqual(exit_code, 0)
+        self.assertNotIn('files', json.loads(output)['results'][0])
+        with open(log_path) as log_file:
+            record = json.loads(log_file.readline())
+        self.assertEqual(sorted(file['path'] for file in record['files']),
+                         [os.path.join(self.source_dirs[0], name) for name in ['test.json', 'video.mp3']])
+        self.assertGreater(record['phases']['listing'], 0)
+        with open(prom_path) as prom_file:
+            self.assertIn('copy_app_last_run_files{status="copied"} 2\n', prom_file.read())
+
+    def test_dry_run(self):
+        exit_code, output = self.run_main('copy', self.source_dirs[0], '-d', self.destination_root_dir,
+                                          '--dry-run', '--json')
+
+        self.assertEqual(exit_code, 0)
+        result = json.loads(output)['results'][0]
+        self.assertEqual(result['destination_folder'], os.path.join(self.destination_root_dir, 'test_1_1'))
+        self.assertEqual(result['files'], 2)
+        self.assertEqual(os.listdir(self.destination_root_dir), [])
+
+    def test_source_without_json(self):
+        os.remove(os.path.join(self.source_dirs[1], 'test.json'))
+
+        exit_code, output = self.run_main('copy', *self.source_dirs, '-d', self.destination_root_dir, '--json')
+
+        self.assertEqual(exit_code, 1)
+        results = json.loads(output)['results']
+        self.assertEqual([result['status'] for result in results], ['ok', 'error'])
+
+    def test_expand_sources_no_match(self):
+        with self.assertRaises(FileNotFoundError):
+            expand_sources([os.path.join(self.source_root, 'missing_*')])
+
+
+if __name__ == '__main__':
+    unittest.main()
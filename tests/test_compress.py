@@ -0,0 +1,67 @@
+import gzip
+import os
+import shutil
+import tempfile
+import unittest
+from unittest.mock import patch
+from copy_app.compress import StreamCompressor, choose_codec, decompress_file, entropy, resolve_codec
+
+
+class ChooseCodecTestCase(unittest.TestCase):
+    def setUp(self):
+        self.work_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.work_dir)
+
+    def write(self, name, data):
+        path = os.path.join(self.work_dir, name)
+        with open(path, 'wb') as f:
+            f.write(data)
+        return path
+
+    def test_text_is_compressed(self):
+        path = self.write('log.csv', b'12.5,sensor_1,OK\n' * 10000)
+        self.assertEqual(choose_codec(path, 'gzip'), 'gzip')
+        self.assertIsNone(choose_codec(path, None))
+
+    def test_compressed_media_and_random_data_are_not(self):
+        self.assertIsNone(choose_codec(self.write('video.mp3', b'\0' * 10000), 'gzip'))
+        self.assertIsNone(choose_codec(self.write('noise.bin', os.urandom(100000)), 'gzip'))
+        self.assertIsNone(choose_codec(self.write('tiny.csv', b'1,2\n'), 'gzip'))
+
+    def test_entropy(self):
+        self.assertEqual(entropy(b'aaaa'), 0.0)
+        self.assertEqual(entropy(bytes(range(256))), 8.0)
+
+    def test_zstd_falls_back_to_gzip(self):
+        with patch('compress.zstandard', None):
+            self.assertEqual(resolve_codec('zstd'), 'gzip')
+        with self.assertRaises(ValueError):
+            resolve_codec('lzma')
+
+
+class StreamCompressorTestCase(unittest.TestCase):
+    def test_parallel_gzip_members_decompress_as_one_file(self):
+        chunks = [os.urandom(1000) + bytes(50000) for _ in range(10)]
+        compressor = StreamCompressor('gzip', threads=3)
+        compressed = b''.join(compressor.compress(chunk) for chunk in chunks) + compressor.flush()
+
+        self.assertEqual(gzip.decompress(compressed), b''.join(chunks))
+
+    def test_decompress_file(self):
+        work_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, work_dir)
+        path = os.path.join(work_dir, 'log.csv.gz')
+        compressor = StreamCompressor('gzip')
+        with open(path, 'wb') as f:
+            f.write(compressor.compress(b'a,b\n' * 1000) + compressor.flush())
+
+        destination_path = os.path.join(work_dir, 'log.csv')
+        self.assertEqual(decompress_file(path, 'gzip', destination_path), 4000)
+        with open(destination_path, 'rb') as f:
+            self.assertEqual(f.read(), b'a,b\n' * 1000)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,62 @@
+import gzip
+import hashlib
+import os
+import shutil
+import tempfile
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from copy_app.compress import StreamCompressor
+from copy_app.fan_out import write_copies
+
+
+class WriteCopiesTestCase(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.source_path = os.path.join(self.temp_dir, 'source.bin')
+        self.content = os.urandom(100 * 1024)
+        with open(self.source_path, 'wb') as f:
+            f.write(self.content)
+        self.executor = ThreadPoolExecutor(max_workers=3)
+
+    def tearDown(self):
+        self.executor.shutdown()
+        shutil.rmtree(self.temp_dir)
+
+    def test_write_copies(self):
+        write_paths = {'plain': os.path.join(self.temp_dir, 'plain.bin'),
+                       'compressed': os.path.join(self.temp_dir, 'compressed.bin.gz')}
+        hash_func = hashlib.sha256()
+
+        writers = write_copies(self.source_path, write_paths, self.executor, 1024, hash_func,
+                               {'compressed': StreamCompressor('gzip')})
+
+        self.assertTrue(all(writer.result() for writer in writers.values()))
+        self.assertEqual(hash_func.hexdigest(), hashlib.sha256(self.content).hexdigest())
+        with open(write_paths['plain'], 'rb') as f:
+            self.assertEqual(f.read(), self.content)
+        with gzip.open(write_paths['compressed']) as f:
+            self.assertEqual(f.read(), self.content)
+
+    def test_failed_copy_does_not_block_the_others(self):
+        write_paths = {0: os.path.join(self.temp_dir, 'missing', 'copy.bin'),
+                       1: os.path.join(self.temp_dir, 'copy.bin')}
+
+        # Chunks much smaller than the file, so the failed writer would fill its queue
+        writers = write_copies(self.source_path, write_paths, self.executor, 512)
+
+        self.assertIsInstance(writers[0].exception(), FileNotFoundError)
+        self.assertTrue(writers[1].result())
+        with open(write_paths[1], 'rb') as f:
+            self.assertEqual(f.read(), self.content)
+
+    def test_read_error_stops_the_writers(self):
+        def abort(read):
+            raise OSError("read failed")
+
+        with self.assertRaises(OSError):
+            write_copies(self.source_path, {0: os.path.join(self.temp_dir, 'copy.bin')}, self.executor, 512,
+                         on_progress=abort)
+
+
+if __name__ == '__main__':
+    unittest.main()
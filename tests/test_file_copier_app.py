@@ -1,7 +1,11 @@
+import os
+import shutil
+import tempfile
 import unittest
 from unittest.mock import patch, MagicMock
 import tkinter as tk
-from copy_app.file_copier_app import FileCopierApp
+from copy_app.file_copier_app import FileCopierApp, HEADER_IMAGE_PATH, resized_image_path
+from copy_app.file_operations import CopySummary, CopyFilesError, CopyCancelled, ProgressEvent
 
 class TestFileCopierApp(unittest.TestCase):
 
@@ -22,31 +26,100 @@ class TestFileCopierApp(unittest.TestCase):
         self.app.browse_destination_dir()
         self.assertEqual(self.app.destination_dir_entry.get(), '/mock/destination/dir')
 
-    @patch('file_copier_app.get_single_json_file_path', return_value='/mock/source/dir/file.json')
-    @patch('file_copier_app.copy_files')
+    def test_header_image_is_read_from_cache(self):
+        # The logo is shipped resized, and read by Tk without PIL
+        self.assertTrue(os.path.exists(resized_image_path(HEADER_IMAGE_PATH, 400, 200)))
+        self.assertIs(type(self.app.header_image), tk.PhotoImage)
+        self.assertEqual((self.app.header_image.width(), self.app.header_image.height()), (400, 200))
+
+    def test_header_image_cache_is_created(self):
+        work_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, work_dir)
+        image_path = os.path.join(work_dir, 'logo.png')
+        shutil.copyfile(HEADER_IMAGE_PATH, image_path)
+
+        image = self.app.load_and_resize_image(image_path, 100, 50)
+        self.assertEqual((image.width(), image.height()), (100, 50))
+        self.assertTrue(os.path.exists(os.path.join(work_dir, 'logo_100x50.png')))
+
+        image = self.app.load_and_resize_image(image_path, 100, 50)
+        self.assertIs(type(image), tk.PhotoImage)
+        self.assertEqual((image.width(), image.height()), (100, 50))
+
+    def run_copy(self):
+        # Start the copy, wait for the worker and let the Tk side pick up its outcome
+        self.app.copy_files()
+        self.app.copy_thread.join()
+        self.app.poll_progress()
+
+    @patch('file_operations.get_single_json_file_path', return_value='/mock/source/dir/file.json')
+    @patch('file_operations.copy_files')
     @patch('file_copier_app.messagebox.showinfo')
     def test_copy_files_success(self, mock_showinfo, mock_copy_files, mock_get_single_json_file_path):
         self.app.source_dir_entry.insert(0, '/mock/source/dir')
         self.app.destination_dir_entry.insert(0, '/mock/destination/dir')
         
-        self.app.copy_files()
+        self.run_copy()
         
         mock_get_single_json_file_path.assert_called_once_with('/mock/source/dir')
-        mock_copy_files.assert_called_once_with('/mock/source/dir', '/mock/destination/dir', '/mock/source/dir/file.json')
+        mock_copy_files.assert_called_once()
+        self.assertEqual(mock_copy_files.call_args[0], ('/mock/source/dir', '/mock/destination/dir', '/mock/source/dir/file.json'))
         mock_showinfo.assert_called_once_with("Success", "Files copied successfully!")
+        self.assertEqual(str(self.app.copy_button['state']), tk.NORMAL)
 
-    @patch('file_copier_app.get_single_json_file_path', side_effect=Exception('Test Exception'))
+    @patch('file_operations.get_single_json_file_path', side_effect=Exception('Test Exception'))
     @patch('file_copier_app.messagebox.showwarning')
     def test_copy_files_failure(self, mock_showwarning, mock_get_single_json_file_path):
         self.app.source_dir_entry.insert(0, '/mock/source/dir')
         self.app.destination_dir_entry.insert(0, '/mock/destination/dir')
         
-        with patch.object(self.app.root, 'quit', MagicMock()), patch.object(self.app.root, 'destroy', MagicMock()):
-            with self.assertRaises(SystemExit):
-                self.app.copy_files()
-        
+        # The error is reported without closing the application
+        with patch.object(self.app.root, 'quit', MagicMock()) as mock_quit, \
+                patch.object(self.app.root, 'destroy', MagicMock()) as mock_destroy:
+            self.run_copy()
+
+        mock_quit.assert_not_called()
+        mock_destroy.assert_not_called()
         mock_get_single_json_file_path.assert_called_once_with('/mock/source/dir')
         mock_showwarning.assert_called_once_with("Warning", "Test Exception")
+        self.assertEqual(str(self.app.copy_button['state']), tk.NORMAL)
+
+    @patch('file_operations.get_single_json_file_path', return_value='/mock/source/dir/file.json')
+    @patch('file_operations.copy_files')
+    @patch('file_copier_app.messagebox.showwarning')
+    def test_copy_files_per_file_errors(self, mock_showwarning, mock_copy_files, mock_get_single_json_file_path):
+        summary = CopySummary('/mock/destination/dir/test_1', files_copied=1,
+                              failures={'/mock/source/dir/video.mp3': 'Checksum mismatch'})
+        mock_copy_files.side_effect = CopyFilesError(summary)
+
+        self.run_copy()
+
+        mock_showwarning.assert_called_once_with("Warning", "1 files could not be copied:\nvideo.mp3: Checksum mismatch")
+
+    @patch('file_operations.get_single_json_file_path', return_value='/mock/source/dir/file.json')
+    @patch('file_copier_app.messagebox.showinfo')
+    def test_cancel_copy(self, mock_showinfo, mock_get_single_json_file_path):
+        def wait_for_cancel(*args, cancel_event=None, **kwargs):
+            cancel_event.wait(5)
+            raise CopyCancelled()
+
+        with patch('file_operations.copy_files', side_effect=wait_for_cancel):
+            self.app.copy_files()
+            self.app.cancel_copy()
+            self.app.copy_thread.join()
+            self.app.poll_progress()
+
+        mock_showinfo.assert_called_once_with("Cancelled", "The copy was cancelled. Files already copied were kept.")
+
+    def test_progress_events(self):
+        self.app.handle_progress_event(ProgressEvent('start', total_files=2, total_bytes=200))
+        self.app.handle_progress_event(ProgressEvent('file', '/mock/source/dir/video.mp3'))
+        self.app.handle_progress_event(ProgressEvent('bytes', '/mock/source/dir/video.mp3', bytes=50))
+        self.app.update_status()
+
+        self.assertEqual(self.app.progress_bar['value'], 50)
+        self.assertIn('video.mp3', self.app.status_label['text'])
+        self.assertIn('ETA', self.app.status_label['text'])
 
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -1,10 +1,19 @@
 import os
 import tempfile
 import json
+import hashlib
 from unittest import TestCase
-from unittest.mock import patch
+from unittest.mock import patch, DEFAULT
 import shutil
-from copy_app.file_operations import get_single_json_file_path, copy_files, set_destination_folder, compute_checksum, safe_copy
+import threading
+import time
+from copy_app.checksum_cache import ChecksumCache
+from copy_app.throttle import Throttle
+from copy_app.file_operations import get_single_json_file_path, copy_files, set_destination_folder, compute_checksum, safe_copy, copy_with_checksum, copy_file, list_source_files, CopyFilesError, \
+    iter_source_files, create_destination_tree, CopyCancelled, allocate_destination_folder, copy_file_to_targets
+from copy_app.manifest import Manifest
+from copy_app.object_store import ObjectStore
+from copy_app.verification import verify_folder
 
 
 class GetSingleJsonFilePathTestCase(TestCase):
@@ -80,6 +89,74 @@ class SetDestinationFolderTestCase(TestCase):
         self.assertEqual(destination_folder, expected_folder)
 
 
+class AllocateDestinationFolderTestCase(TestCase):
+    def setUp(self):
+        self.destination_root_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.destination_root_dir)
+
+    def test_allocate_destination_folder(self):
+        os.makedirs(os.path.join(self.destination_root_dir, "test_1_2"))
+
+        destination_folder = allocate_destination_folder(self.destination_root_dir, "test_1")
+
+        self.assertEqual(destination_folder, os.path.join(self.destination_root_dir, "test_1_3"))
+        self.assertTrue(os.path.isdir(destination_folder))
+
+    def test_allocate_destination_folder_rejects_paths(self):
+        for test_id in ('', '.', '..', '../test_1', 'test/1', os.path.join('test', '1')):
+            with self.subTest(test_id=test_id), self.assertRaises(ValueError):
+                allocate_destination_folder(self.destination_root_dir, test_id)
+        self.assertEqual(os.listdir(self.destination_root_dir), [])
+
+    def test_allocate_destination_folder_uses_index(self):
+        allocate_destination_folder(self.destination_root_dir, "test_1")
+
+        # Once indexed, the root is not listed again
+        with patch('file_operations._scan_sequence_number') as mock_scan:
+            destination_folder = allocate_destination_folder(self.destination_root_dir, "test_1")
+        mock_scan.assert_not_called()
+        self.assertEqual(destination_folder, os.path.join(self.destination_root_dir, "test_1_2"))
+
+    def test_allocate_destination_folder_stale_index(self):
+        allocate_destination_folder(self.destination_root_dir, "test_1")
+        allocate_destination_folder(self.destination_root_dir, "test_1")
+        # Folders created behind the index's back, or the indexed folder removed
+        os.makedirs(os.path.join(self.destination_root_dir, "test_1_3"))
+        self.assertEqual(set_destination_folder(self.destination_root_dir, "test_1"),
+                         os.path.join(self.destination_root_dir, "test_1_4"))
+        os.rmdir(os.path.join(self.destination_root_dir, "test_1_2"))
+        os.rmdir(os.path.join(self.destination_root_dir, "test_1_3"))
+        self.assertEqual(set_destination_folder(self.destination_root_dir, "test_1"),
+                         os.path.join(self.destination_root_dir, "test_1_2"))
+
+    def test_allocate_destination_folder_concurrently(self):
+        allocators = 16
+        allocations = 20
+        barrier = threading.Barrier(allocators)
+        folders = []
+        lock = threading.Lock()
+
+        def allocate():
+            barrier.wait()
+            for _ in range(allocations):
+                folder = allocate_destination_folder(self.destination_root_dir, "test_1")
+                with lock:
+                    folders.append(folder)
+
+        threads = [threading.Thread(target=allocate) for _ in range(allocators)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        # Every allocator got folders of its own, numbered without gaps
+        expected = {os.path.join(self.destination_root_dir, f"test_1_{n}") for n in range(1, allocators * allocations + 1)}
+        self.assertEqual(len(folders), allocators * allocations)
+        self.assertEqual(set(folders), expected)
+
+
 class ComputeChecksumTestCase(TestCase):
     def setUp(self):
         self.test_file = tempfile.NamedTemporaryFile(delete=False)
@@ -95,6 +172,14 @@ class ComputeChecksumTestCase(TestCase):
         actual_checksum = compute_checksum(self.test_file.name)
         self.assertEqual(actual_checksum, expected_checksum)
 
+    def test_compute_checksum_mmap(self):
+        self.assertEqual(compute_checksum(self.test_file.name, use_mmap=True), compute_checksum(self.test_file.name))
+
+    def test_compute_checksum_mmap_empty_file(self):
+        with open(self.test_file.name, 'wb'):
+            pass
+        self.assertEqual(compute_checksum(self.test_file.name, use_mmap=True), compute_checksum(self.test_file.name))
+
 
 class SafeCopyTestCase(TestCase):
     def setUp(self):
@@ -111,7 +196,7 @@ class SafeCopyTestCase(TestCase):
 
     @patch('file_operations.compute_checksum')
     def test_safe_copy(self, mock_compute_checksum):
-        mock_compute_checksum.return_value = 'f3c8c4b7e8b7b6e8e8b7b6e8e8b7b6e8e8b7b6e8e8b7b6e8e8b7b6e8e8b7b6'
+        mock_compute_checksum.return_value = '6c76f7bd4b84eb68c26d2e8f48ea76f90b9bdf8836e27235a0ca4325f8fe4ce5'
 
         # Call the safe_copy function
         safe_copy(self.source_file_path, self.destination_file_path)
@@ -120,7 +205,7 @@ class SafeCopyTestCase(TestCase):
         self.assertTrue(os.path.exists(self.destination_file_path))
 
         # Assert that compute_checksum was called with the correct arguments
-        mock_compute_checksum.assert_called_with(self.destination_file_path)
+        mock_compute_checksum.assert_called_with(self.destination_file_path, 'sha256')
 
     @patch('file_operations.compute_checksum')
     def test_safe_copy_checksum_mismatch(self, mock_compute_checksum):
@@ -131,6 +216,106 @@ class SafeCopyTestCase(TestCase):
         with self.assertRaises(ValueError):
             safe_copy(self.source_file_path, self.destination_file_path)
 
+    @patch('file_operations.compute_checksum')
+    def test_safe_copy_without_verify(self, mock_compute_checksum):
+        # The destination is not read back when verification is disabled
+        safe_copy(self.source_file_path, self.destination_file_path, verify=False)
+
+        self.assertTrue(os.path.exists(self.destination_file_path))
+        mock_compute_checksum.assert_not_called()
+
+    def test_safe_copy_atomic(self):
+        safe_copy(self.source_file_path, self.destination_dir, atomic=True)
+        self.assertEqual(os.listdir(self.destination_dir), ['test_file.txt'])
+
+    @patch('file_operations.compute_checksum')
+    def test_safe_copy_atomic_checksum_mismatch(self, mock_compute_checksum):
+        mock_compute_checksum.return_value = 'corrupt'
+        with self.assertRaises(ValueError):
+            safe_copy(self.source_file_path, self.destination_dir, atomic=True)
+
+        # Neither the final name nor the partial file is left behind
+        self.assertEqual(os.listdir(self.destination_dir), [])
+
+    def test_safe_copy_to_folder(self):
+        result = safe_copy(self.source_file_path, self.destination_dir)
+        self.assertEqual(result, self.destination_file_path)
+
+    def test_copy_file_kernel_backend(self):
+        result = copy_file(self.source_file_path, self.destination_dir, backend='auto')
+
+        self.assertEqual(result.destination_path, self.destination_file_path)
+        self.assertNotEqual(result.backend, 'stream')
+        self.assertEqual(result.size, len('Test file content'))
+        self.assertEqual(result.checksum, compute_checksum(self.source_file_path))
+        self.assertEqual(compute_checksum(self.destination_file_path), result.checksum)
+
+    def test_copy_file_uses_cache(self):
+        old = time.time() - 60
+        os.utime(self.source_file_path, (old, old))
+        with ChecksumCache(os.path.join(self.destination_dir, 'cache.sqlite')) as cache:
+            cache.put(os.stat(self.source_file_path), 'sha256', 'cached checksum')
+
+            # The source is not hashed again...
+            result = copy_file(self.source_file_path, self.destination_file_path, verify=False, cache=cache)
+            self.assertEqual(result.checksum, 'cached checksum')
+
+            # ...but the destination is still verified against the cached checksum
+            with self.assertRaises(ValueError):
+                copy_file(self.source_file_path, self.destination_file_path, cache=cache)
+
+    def test_copy_file_fills_cache(self):
+        old = time.time() - 60
+        os.utime(self.source_file_path, (old, old))
+        with ChecksumCache(os.path.join(self.destination_dir, 'cache.sqlite')) as cache:
+            result = copy_file(self.source_file_path, self.destination_file_path, cache=cache)
+            self.assertEqual(cache.get(os.stat(self.source_file_path), 'sha256'), result.checksum)
+
+    def test_copy_with_checksum_resume(self):
+        # The first 5 bytes were copied by a previous run
+        with open(self.destination_file_path, 'wb') as destination_file:
+            destination_file.write(b'Test file content'[:5] + b'garbage')
+        offset_checksum = hashlib.sha256(b'Test ').hexdigest()
+
+        checksum = copy_with_checksum(self.source_file_path, self.destination_file_path, offset=5,
+                                      offset_checksum=offset_checksum)
+
+        self.assertEqual(checksum, compute_checksum(self.source_file_path))
+        with open(self.destination_file_path) as destination_file:
+            self.assertEqual(destination_file.read(), 'Test file content')
+
+    def test_copy_with_checksum_resume_changed_source(self):
+        with open(self.destination_file_path, 'wb') as destination_file:
+            destination_file.write(b'Best ')
+        offset_checksum = hashlib.sha256(b'Best ').hexdigest()
+
+        checksum = copy_with_checksum(self.source_file_path, self.destination_file_path, offset=5,
+                                      offset_checksum=offset_checksum)
+
+        # The prefix does not match the source any more, so the copy starts over
+        self.assertEqual(checksum, compute_checksum(self.source_file_path))
+        with open(self.destination_file_path) as destination_file:
+            self.assertEqual(destination_file.read(), 'Test file content')
+
+    @patch('file_operations.CHECKPOINT_INTERVAL', 8)
+    def test_copy_with_checksum_checkpoints(self):
+        checkpoints = []
+        copy_with_checksum(self.source_file_path, self.destination_file_path, buffer_size=4,
+                           checkpoint=lambda offset, checksum: checkpoints.append((offset, checksum)))
+
+        self.assertEqual(checkpoints, [
+            (8, hashlib.sha256(b'Test fil').hexdigest()),
+            (16, hashlib.sha256(b'Test file conten').hexdigest()),
+        ])
+
+    def test_copy_with_checksum(self):
+        # A small buffer forces the copy to go through several chunks
+        checksum = copy_with_checksum(self.source_file_path, self.destination_file_path, buffer_size=4)
+
+        self.assertEqual(checksum, compute_checksum(self.source_file_path))
+        with open(self.destination_file_path) as destination_file:
+            self.assertEqual(destination_file.read(), 'Test file content')
+
          
 class CopyFilesTestCase(TestCase):
     def setUp(self):
@@ -153,12 +338,525 @@ class CopyFilesTestCase(TestCase):
         with open(self.json_file_path, 'w') as json_file:
             json.dump(data, json_file)
 
-        # Patch the safe_copy function to avoid actual file copying
-        with patch('file_operations.safe_copy') as mock_safe_copy:
+        # Patch the copy_file function to avoid actual file copying
+        with patch('file_operations.copy_file') as mock_copy_file:
+            copy_files(self.source_dir, self.destination_root_dir, self.json_file_path, small_file_threshold=0)
+
+            # Assert that copy_file was called with the correct arguments
+            mock_copy_file.assert_called_once()
+
+    def test_copy_files_parallel(self):
+        with open(self.json_file_path, 'w') as json_file:
+            json.dump({"test_sequence_id": "test_1"}, json_file)
+        for i in range(10):
+            with open(os.path.join(self.source_dir, f'file_{i}.bin'), 'wb') as f:
+                f.write(os.urandom(i * 1000))
+
+        summary = copy_files(self.source_dir, self.destination_root_dir, self.json_file_path, workers=4)
+
+        self.assertEqual(summary.files_copied, 11)
+        self.assertEqual(summary.failures, {})
+        destination_folder = os.path.join(self.destination_root_dir, 'test_1_1')
+        self.assertEqual(summary.destination_folder, destination_folder)
+        self.assertEqual(sorted(os.listdir(destination_folder)), sorted(os.listdir(self.source_dir) + ['checksums.sha256', 'manifest.jsonl']))
+
+    def test_copy_files_records_checksums(self):
+        with open(self.json_file_path, 'w') as json_file:
+            json.dump({"test_sequence_id": "test_1"}, json_file)
+
+        summary = copy_files(self.source_dir, self.destination_root_dir, self.json_file_path, algorithm='blake2b')
+
+        with open(os.path.join(summary.destination_folder, 'checksums.blake2b')) as checksum_file:
+            self.assertEqual(checksum_file.read(), f"{compute_checksum(self.json_file_path, 'blake2b')}  test.json\n")
+
+    def test_copy_files_of_a_copied_folder(self):
+        with open(self.json_file_path, 'w') as json_file:
+            json.dump({"test_sequence_id": "test_1"}, json_file)
+        with open(os.path.join(self.source_dir, 'video.mp3'), 'wb') as f:
+            f.write(os.urandom(1000))
+        first = copy_files(self.source_dir, self.destination_root_dir, self.json_file_path)
+        os.makedirs(os.path.join(first.destination_folder, 'logs'))
+        with open(os.path.join(first.destination_folder, 'logs', 'manifest.jsonl'), 'w') as f:
+            f.write('{}\n')
+
+        # The manifest and checksum file of the copied folder are not copied over those of the new copy
+        mirror_root_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, mirror_root_dir)
+        second = copy_files(first.destination_folder, mirror_root_dir, os.path.join(first.destination_folder, 'test.json'),
+                            recursive=True)
+
+        self.assertEqual(second.files_copied, 3)
+        self.assertTrue(verify_folder(second.destination_folder).ok)
+        with open(os.path.join(second.destination_folder, 'checksums.sha256')) as checksum_file:
+            self.assertEqual(sorted(line.split()[1] for line in checksum_file),
+                             ['logs/manifest.jsonl', 'test.json', 'video.mp3'])
+
+    def test_copy_files_copies_user_files_with_bookkeeping_names(self):
+        with open(self.json_file_path, 'w') as json_file:
+            json.dump({"test_sequence_id": "test_1"}, json_file)
+        with open(os.path.join(self.source_dir, 'checksums.txt'), 'w') as f:
+            f.write('frame,checksum\n1,abc\n')
+        with open(os.path.join(self.source_dir, 'checksums.md5'), 'w') as f:
+            f.write('d41d8cd98f00b204e9800998ecf8427e  not_in_the_source.bin\n')
+
+        summary = copy_files(self.source_dir, self.destination_root_dir, self.json_file_path)
+
+        self.assertEqual(summary.files_copied, 3)
+        self.assertEqual(sorted(os.listdir(summary.destination_folder)),
+                         ['checksums.md5', 'checksums.sha256', 'checksums.txt', 'manifest.jsonl', 'test.json'])
+        self.assertTrue(verify_folder(summary.destination_folder).ok)
+
+    def test_copy_files_reports_a_user_file_named_like_the_manifest(self):
+        with open(self.json_file_path, 'w') as json_file:
+            json.dump({"test_sequence_id": "test_1"}, json_file)
+        manifest_path = os.path.join(self.source_dir, 'manifest.jsonl')
+        with open(manifest_path, 'w') as f:
+            f.write('{"event": "capture started"}\n')
+
+        with self.assertRaises(CopyFilesError) as context:
             copy_files(self.source_dir, self.destination_root_dir, self.json_file_path)
 
-            # Assert that safe_copy was called with the correct arguments
-            mock_safe_copy.assert_called_once()
+        summary = context.exception.summary
+        self.assertEqual(list(summary.failures), [manifest_path])
+        self.assertEqual(summary.files_copied, 1)
+
+    def test_copy_files_resume(self):
+        with open(self.json_file_path, 'w') as json_file:
+            json.dump({"test_sequence_id": "test_1"}, json_file)
+        with open(os.path.join(self.source_dir, 'video.mp3'), 'wb') as f:
+            f.write(os.urandom(1000))
+        def corrupt_video(source_path, *args, **kwargs):
+            return not source_path.endswith('video.mp3')
+
+        with patch('file_operations.verify_copy', side_effect=corrupt_video), \
+                self.assertRaises(CopyFilesError) as context:
+            copy_files(self.source_dir, self.destination_root_dir, self.json_file_path, small_file_threshold=0)
+        first = context.exception.summary
+
+        # The failed file and a file added after the first run are the only ones copied
+        with open(os.path.join(self.source_dir, 'late.csv'), 'w') as f:
+            f.write('a,b\n')
+        second = copy_files(self.source_dir, self.destination_root_dir, self.json_file_path, resume=True)
+
+        self.assertEqual(second.destination_folder, first.destination_folder)
+        self.assertEqual((second.files_copied, second.files_skipped), (2, 1))
+        with open(os.path.join(second.destination_folder, 'checksums.sha256')) as checksum_file:
+            self.assertEqual(len(checksum_file.readlines()), 3)
+
+        # Once complete, the copy is not resumed any more
+        third = copy_files(self.source_dir, self.destination_root_dir, self.json_file_path, resume=True)
+        self.assertNotEqual(third.destination_folder, first.destination_folder)
+        self.assertEqual((third.files_copied, third.files_skipped), (3, 0))
+
+    def test_copy_files_resume_ignores_other_captures_of_the_test_id(self):
+        with open(self.json_file_path, 'w') as json_file:
+            json.dump({"test_sequence_id": "test_1"}, json_file)
+        with open(os.path.join(self.source_dir, 'video.bin'), 'wb') as f:
+            f.write(b'capture A')
+        other_source_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, other_source_dir)
+        other_json_file_path = os.path.join(other_source_dir, 'test.json')
+        with open(other_json_file_path, 'w') as json_file:
+            json.dump({"test_sequence_id": "test_1", "operator": "B"}, json_file)
+        with open(os.path.join(other_source_dir, 'video.bin'), 'wb') as f:
+            f.write(b'capture B')
+
+        with patch('file_operations.verify_copy', return_value=False), self.assertRaises(CopyFilesError) as context:
+            copy_files(self.source_dir, self.destination_root_dir, self.json_file_path, small_file_threshold=0)
+        first = context.exception.summary
+
+        # Another capture sharing the test ID never resumes the incomplete copy of the first one
+        second = copy_files(other_source_dir, self.destination_root_dir, other_json_file_path, resume=True)
+        self.assertNotEqual(second.destination_folder, first.destination_folder)
+        with open(os.path.join(first.destination_folder, 'video.bin'), 'rb') as f:
+            self.assertEqual(f.read(), b'capture A')
+
+        # The first capture still resumes its own copy, though it is not the latest folder any more
+        third = copy_files(self.source_dir, self.destination_root_dir, self.json_file_path, resume=True)
+        self.assertEqual(third.destination_folder, first.destination_folder)
+
+    def test_copy_files_resume_given_folders(self):
+        with open(self.json_file_path, 'w') as json_file:
+            json.dump({"test_sequence_id": "test_1"}, json_file)
+        with open(os.path.join(self.source_dir, 'video.bin'), 'wb') as f:
+            f.write(os.urandom(1000))
+        events = []
+        first = copy_files(self.source_dir, self.destination_root_dir, self.json_file_path, progress=events.append)
+        self.assertEqual([event.destination_folders for event in events if event.kind == 'start'],
+                         [[first.destination_folder]])
+
+        # A given folder is resumed even though its copy completed, as after a crash before it was recorded
+        second = copy_files(self.source_dir, self.destination_root_dir, self.json_file_path,
+                            resume=[first.destination_folder])
+        self.assertEqual((second.destination_folder, second.files_copied), (first.destination_folder, 0))
+
+        # but not for another source
+        with open(self.json_file_path, 'w') as json_file:
+            json.dump({"test_sequence_id": "test_1", "take": 2}, json_file)
+        third = copy_files(self.source_dir, self.destination_root_dir, self.json_file_path,
+                           resume=[first.destination_folder])
+        self.assertNotEqual(third.destination_folder, first.destination_folder)
+
+    def test_copy_files_without_resume_uses_new_folder(self):
+        with open(self.json_file_path, 'w') as json_file:
+            json.dump({"test_sequence_id": "test_1"}, json_file)
+        first = copy_files(self.source_dir, self.destination_root_dir, self.json_file_path)
+        second = copy_files(self.source_dir, self.destination_root_dir, self.json_file_path)
+
+        self.assertNotEqual(second.destination_folder, first.destination_folder)
+        self.assertEqual(second.files_copied, 1)
+
+    def test_copy_files_staging_file(self):
+        with open(self.json_file_path, 'w') as json_file:
+            json.dump({"test_sequence_id": "test_1"}, json_file)
+        with open(os.path.join(self.source_dir, 'video.mp3'), 'wb') as f:
+            f.write(os.urandom(1000))
+
+        summary = copy_files(self.source_dir, self.destination_root_dir, self.json_file_path, staging='file')
+
+        self.assertEqual(sorted(os.listdir(summary.destination_folder)),
+                         ['checksums.sha256', 'manifest.jsonl', 'test.json', 'video.mp3'])
+
+    def test_copy_files_staging_folder(self):
+        with open(self.json_file_path, 'w') as json_file:
+            json.dump({"test_sequence_id": "test_1"}, json_file)
+        os.makedirs(os.path.join(self.source_dir, 'camera'))
+        with open(os.path.join(self.source_dir, 'camera', 'video.mp3'), 'wb') as f:
+            f.write(os.urandom(1000))
+
+        summary = copy_files(self.source_dir, self.destination_root_dir, self.json_file_path, recursive=True,
+                             staging='folder')
+
+        self.assertTrue(os.path.exists(os.path.join(summary.destination_folder, 'camera', 'video.mp3')))
+        with open(os.path.join(summary.destination_folder, 'checksums.sha256')) as checksum_file:
+            self.assertEqual(len(checksum_file.readlines()), 2)
+        self.assertFalse(os.path.exists(os.path.join(self.destination_root_dir, '.staging')))
+
+    def test_copy_files_staging_folder_failure_is_not_published(self):
+        with open(self.json_file_path, 'w') as json_file:
+            json.dump({"test_sequence_id": "test_1"}, json_file)
+        with open(os.path.join(self.source_dir, 'video.mp3'), 'wb') as f:
+            f.write(os.urandom(1000))
+
+        with patch('file_operations.compute_checksum', return_value='corrupt'):
+            with self.assertRaises(CopyFilesError) as context:
+                copy_files(self.source_dir, self.destination_root_dir, self.json_file_path, staging='folder',
+                           small_file_threshold=0)
+        destination_folder = context.exception.summary.destination_folder
+        self.assertEqual(os.listdir(destination_folder), [])
+
+        # A resumed copy completes the staged folder and publishes it
+        summary = copy_files(self.source_dir, self.destination_root_dir, self.json_file_path, resume=True,
+                             staging='folder')
+        self.assertEqual(summary.destination_folder, destination_folder)
+        self.assertTrue(os.path.exists(os.path.join(destination_folder, 'video.mp3')))
+
+    def test_copy_files_dedup(self):
+        with open(self.json_file_path, 'w') as json_file:
+            json.dump({"test_sequence_id": "test_1"}, json_file)
+        with open(os.path.join(self.source_dir, 'video.mp3'), 'wb') as f:
+            f.write(os.urandom(1000))
+        first = copy_files(self.source_dir, self.destination_root_dir, self.json_file_path, dedup=True)
+        second = copy_files(self.source_dir, self.destination_root_dir, self.json_file_path, dedup=True)
+
+        self.assertEqual(second.backends, {'dedup': 2})
+        self.assertTrue(os.path.samefile(os.path.join(first.destination_folder, 'video.mp3'),
+                                         os.path.join(second.destination_folder, 'video.mp3')))
+
+    def test_copy_files_dedup_corrupted_object(self):
+        with open(self.json_file_path, 'w') as json_file:
+            json.dump({"test_sequence_id": "test_1"}, json_file)
+        content = os.urandom(1000)
+        with open(os.path.join(self.source_dir, 'video.mp3'), 'wb') as f:
+            f.write(content)
+        copy_files(self.source_dir, self.destination_root_dir, self.json_file_path, dedup=True)
+        object_path = ObjectStore(self.destination_root_dir).object_path(hashlib.sha256(content).hexdigest())
+        # Same size, different content
+        with open(object_path, 'r+b') as f:
+            f.write(bytes(b ^ 0xff for b in content[:10]))
+
+        second = copy_files(self.source_dir, self.destination_root_dir, self.json_file_path, dedup=True)
+
+        self.assertEqual(second.backends, {'dedup': 1, 'stream': 1})
+        self.assertTrue(verify_folder(second.destination_folder).ok)
+        self.assertEqual(compute_checksum(object_path), hashlib.sha256(content).hexdigest())
+
+    def test_copy_files_small_files(self):
+        with open(self.json_file_path, 'w') as json_file:
+            json.dump({"test_sequence_id": "test_1"}, json_file)
+        for i in range(100):
+            with open(os.path.join(self.source_dir, f'sidecar_{i}.csv'), 'w') as f:
+                f.write(f'{i},{i * i}\n')
+        with open(os.path.join(self.source_dir, 'video.mp3'), 'wb') as f:
+            f.write(os.urandom(200 * 1024))
+
+        summary = copy_files(self.source_dir, self.destination_root_dir, self.json_file_path)
+
+        self.assertEqual(summary.backends, {'small': 101, 'stream': 1})
+        with open(os.path.join(summary.destination_folder, 'sidecar_7.csv')) as f:
+            self.assertEqual(f.read(), '7,49\n')
+        with open(os.path.join(summary.destination_folder, 'checksums.sha256')) as checksum_file:
+            self.assertIn(f"{compute_checksum(self.json_file_path)}  test.json\n", checksum_file.read())
+
+        # Resuming skips the small files recorded in the manifest, as if the copy had been interrupted
+        with Manifest(summary.destination_folder) as manifest:
+            manifest.record_copy(complete=False)
+        resumed = copy_files(self.source_dir, self.destination_root_dir, self.json_file_path, resume=True)
+        self.assertEqual((resumed.files_copied, resumed.files_skipped), (0, 102))
+
+    def test_copy_files_throttled(self):
+        with open(self.json_file_path, 'w') as json_file:
+            json.dump({"test_sequence_id": "test_1"}, json_file)
+        for name in ['a.bin', 'b.bin']:
+            with open(os.path.join(self.source_dir, name), 'wb') as f:
+                f.write(os.urandom(256 * 1024))
+
+        summary = copy_files(self.source_dir, self.destination_root_dir, self.json_file_path,
+                             throttle=Throttle(2 * 1024 * 1024, burst_seconds=0), low_priority=True)
+
+        # 512 KiB at 2 MiB/s
+        self.assertGreaterEqual(summary.elapsed, 0.2)
+        self.assertGreater(summary.phases['throttle'], 0)
+        self.assertEqual(sorted(metrics.path for metrics in summary.files),
+                         sorted(os.path.join(self.source_dir, name) for name in ['a.bin', 'b.bin', 'test.json']))
+
+    def test_copy_files_recursive(self):
+        with open(self.json_file_path, 'w') as json_file:
+            json.dump({"test_sequence_id": "test_1"}, json_file)
+        for relative_dir in ['camera_1', os.path.join('camera_2', 'channel_1'), 'empty']:
+            os.makedirs(os.path.join(self.source_dir, relative_dir))
+        for relative_path in [os.path.join('camera_1', 'a.bin'), os.path.join('camera_2', 'channel_1', 'b.bin')]:
+            with open(os.path.join(self.source_dir, relative_path), 'wb') as f:
+                f.write(os.urandom(100))
+
+        summary = copy_files(self.source_dir, self.destination_root_dir, self.json_file_path, recursive=True)
+
+        self.assertEqual(summary.files_copied, 3)
+        for relative_path in [os.path.join('camera_1', 'a.bin'), os.path.join('camera_2', 'channel_1', 'b.bin')]:
+            self.assertEqual(compute_checksum(os.path.join(summary.destination_folder, relative_path)),
+                             compute_checksum(os.path.join(self.source_dir, relative_path)))
+        self.assertTrue(os.path.isdir(os.path.join(summary.destination_folder, 'empty')))
+        with open(os.path.join(summary.destination_folder, 'checksums.sha256')) as checksum_file:
+            self.assertIn('camera_2/channel_1/b.bin', checksum_file.read())
+
+    def test_copy_files_not_recursive_skips_subdirectories(self):
+        with open(self.json_file_path, 'w') as json_file:
+            json.dump({"test_sequence_id": "test_1"}, json_file)
+        os.makedirs(os.path.join(self.source_dir, 'camera_1'))
+        with open(os.path.join(self.source_dir, 'camera_1', 'a.bin'), 'wb') as f:
+            f.write(b'a')
+
+        summary = copy_files(self.source_dir, self.destination_root_dir, self.json_file_path)
+
+        self.assertEqual(summary.files_copied, 1)
+        self.assertFalse(os.path.exists(os.path.join(summary.destination_folder, 'camera_1')))
+
+    def test_copy_files_progress(self):
+        with open(self.json_file_path, 'w') as json_file:
+            json.dump({"test_sequence_id": "test_1"}, json_file)
+        with open(os.path.join(self.source_dir, 'video.mp3'), 'wb') as f:
+            f.write(os.urandom(1000))
+        events = []
+
+        copy_files(self.source_dir, self.destination_root_dir, self.json_file_path, progress=events.append)
+
+        total_bytes = 1000 + os.path.getsize(self.json_file_path)
+        self.assertEqual((events[0].kind, events[0].total_files, events[0].total_bytes), ('start', 2, total_bytes))
+        self.assertEqual(sum(event.bytes for event in events if event.kind == 'bytes'), total_bytes)
+        self.assertEqual(sorted(event.file_path for event in events if event.kind == 'done'),
+                         sorted([self.json_file_path, os.path.join(self.source_dir, 'video.mp3')]))
+
+    def test_copy_files_cancel(self):
+        with open(self.json_file_path, 'w') as json_file:
+            json.dump({"test_sequence_id": "test_1"}, json_file)
+        for i in range(5):
+            with open(os.path.join(self.source_dir, f'file_{i}.bin'), 'wb') as f:
+                f.write(os.urandom(1000))
+        cancel_event = threading.Event()
+
+        def cancel_on_start(event):
+            if event.kind == 'start':
+                cancel_event.set()
+
+        with self.assertRaises(CopyCancelled) as context:
+            copy_files(self.source_dir, self.destination_root_dir, self.json_file_path,
+                       progress=cancel_on_start, cancel_event=cancel_event)
+
+        self.assertEqual(context.exception.summary.files_copied, 0)
+        self.assertEqual(context.exception.summary.failures, {})
+
+    def test_copy_files_collects_failures(self):
+        with open(self.json_file_path, 'w') as json_file:
+            json.dump({"test_sequence_id": "test_1"}, json_file)
+        bad_file_path = os.path.join(self.source_dir, 'bad.bin')
+        with open(bad_file_path, 'wb') as f:
+            f.write(b'bad')
+
+        def fail_on_bad_file(file_path, *args, **kwargs):
+            if file_path == bad_file_path:
+                raise ValueError("Checksum mismatch")
+            return DEFAULT
+
+        with patch('file_operations.copy_file', side_effect=fail_on_bad_file) as mock_copy_file:
+            mock_copy_file.return_value.skipped = False
+            with self.assertRaises(CopyFilesError) as context:
+                copy_files(self.source_dir, self.destination_root_dir, self.json_file_path, small_file_threshold=0)
+
+        # The other file is still copied
+        self.assertEqual(mock_copy_file.call_count, 2)
+        self.assertEqual(context.exception.summary.files_copied, 1)
+        self.assertEqual(context.exception.summary.failures, {bad_file_path: "Checksum mismatch"})
+
+
+    def test_copy_files_to_several_roots(self):
+        with open(self.json_file_path, 'w') as json_file:
+            json.dump({"test_sequence_id": "test_1"}, json_file)
+        with open(os.path.join(self.source_dir, 'video.mp3'), 'wb') as f:
+            f.write(os.urandom(300 * 1024))
+        mirror_root_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, mirror_root_dir)
+
+        with patch('file_operations.compute_checksum', wraps=compute_checksum) as mock_compute_checksum:
+            summaries = copy_files(self.source_dir, [self.destination_root_dir, mirror_root_dir], self.json_file_path,
+                                   staging='folder')
+
+        self.assertEqual([summary.destination_folder for summary in summaries],
+                         [os.path.join(self.destination_root_dir, 'test_1_1'), os.path.join(mirror_root_dir, 'test_1_1')])
+        for summary in summaries:
+            self.assertEqual(summary.files_copied, 2)
+            self.assertEqual(compute_checksum(os.path.join(summary.destination_folder, 'video.mp3')),
+                             compute_checksum(os.path.join(self.source_dir, 'video.mp3')))
+        # The sources are only hashed while they are read; the checksums computed are the verifications
+        self.assertEqual(mock_compute_checksum.call_count, 4)
+        self.assertTrue(all(call.args[0].startswith((os.path.join(self.destination_root_dir, ''),
+                                                     os.path.join(mirror_root_dir, '')))
+                            for call in mock_compute_checksum.call_args_list))
+
+    def test_copy_files_to_several_roots_failure_is_per_root(self):
+        with open(self.json_file_path, 'w') as json_file:
+            json.dump({"test_sequence_id": "test_1"}, json_file)
+        video_path = os.path.join(self.source_dir, 'video.mp3')
+        with open(video_path, 'wb') as f:
+            f.write(os.urandom(1000))
+        mirror_root_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, mirror_root_dir)
+
+        def corrupt_mirror(path, algorithm='sha256', use_mmap=None):
+            if path.startswith(os.path.join(mirror_root_dir, '')) and path.endswith('video.mp3'):
+                return 'corrupt'
+            return compute_checksum(path, algorithm, use_mmap)
+
+        with patch('file_operations.compute_checksum', side_effect=corrupt_mirror):
+            with self.assertRaises(CopyFilesError) as context:
+                copy_files(self.source_dir, [self.destination_root_dir, mirror_root_dir], self.json_file_path,
+                           staging='folder')
+
+        archive, mirror = context.exception.summaries
+        self.assertIs(context.exception.summary, mirror)
+        self.assertEqual((archive.files_copied, archive.failures), (2, {}))
+        self.assertTrue(os.path.exists(os.path.join(archive.destination_folder, 'video.mp3')))
+        self.assertEqual(list(mirror.failures), [video_path])
+        # The failed folder stays staged
+        self.assertEqual(os.listdir(mirror.destination_folder), [])
+
+    def test_copy_files_to_several_roots_needs_stream_backend(self):
+        with open(self.json_file_path, 'w') as json_file:
+            json.dump({"test_sequence_id": "test_1"}, json_file)
+        with self.assertRaises(ValueError):
+            copy_files(self.source_dir, [self.destination_root_dir, self.source_dir], self.json_file_path,
+                       backend='auto')
+
+
+class CopyFileToTargetsTestCase(TestCase):
+    def setUp(self):
+        self.work_dir = tempfile.mkdtemp()
+        self.source_file_path = os.path.join(self.work_dir, 'source.bin')
+        self.content = os.urandom(10000)
+        with open(self.source_file_path, 'wb') as f:
+            f.write(self.content)
+
+    def tearDown(self):
+        shutil.rmtree(self.work_dir)
+
+    def test_copy_file_to_targets(self):
+        destination_paths = [os.path.join(self.work_dir, f'copy_{i}.bin') for i in range(3)]
+        read = []
+
+        # Small chunks, so the writers go through many of them
+        results = copy_file_to_targets(self.source_file_path, destination_paths, buffer_size=512,
+                                       on_progress=read.append)
+
+        self.assertEqual(sum(read), len(self.content))
+        self.assertEqual([result.destination_path for result in results], destination_paths)
+        for path, result in zip(destination_paths, results):
+            self.assertEqual(result.checksum, hashlib.sha256(self.content).hexdigest())
+            with open(path, 'rb') as f:
+                self.assertEqual(f.read(), self.content)
+
+    def test_failed_target_does_not_stop_the_others(self):
+        good_path = os.path.join(self.work_dir, 'copy.bin')
+        bad_path = os.path.join(self.work_dir, 'missing', 'copy.bin')
+
+        results = copy_file_to_targets(self.source_file_path, [bad_path, good_path], buffer_size=512)
+
+        self.assertIsInstance(results[0], FileNotFoundError)
+        self.assertEqual(results[1].size, len(self.content))
+        with open(good_path, 'rb') as f:
+            self.assertEqual(f.read(), self.content)
+
+    def test_source_read_error_fails_every_target(self):
+        def abort(copied):
+            raise CopyCancelled()
+
+        with self.assertRaises(CopyCancelled):
+            copy_file_to_targets(self.source_file_path, [os.path.join(self.work_dir, 'copy.bin')], buffer_size=512,
+                                 on_progress=abort)
+
+
+class IterSourceFilesTestCase(TestCase):
+    def setUp(self):
+        self.source_dir = tempfile.mkdtemp()
+        self.destination_dir = tempfile.mkdtemp()
+        # A deep tree, to check the walk reaches its bottom
+        self.deep_dir = os.path.join(*['d'] * 50)
+        os.makedirs(os.path.join(self.source_dir, self.deep_dir))
+        for relative_path in ['top.bin', os.path.join(self.deep_dir, 'deep.bin')]:
+            with open(os.path.join(self.source_dir, relative_path), 'wb') as f:
+                f.write(b'x')
+
+    def tearDown(self):
+        shutil.rmtree(self.source_dir)
+        shutil.rmtree(self.destination_dir)
+
+    def test_iter_source_files(self):
+        self.assertEqual([relative_path for _, relative_path, _ in iter_source_files(self.source_dir)], ['top.bin'])
+
+    def test_iter_source_files_recursive(self):
+        files = sorted(relative_path for _, relative_path, _ in iter_source_files(self.source_dir, recursive=True))
+        self.assertEqual(files, sorted(['top.bin', os.path.join(self.deep_dir, 'deep.bin')]))
+
+    def test_create_destination_tree(self):
+        self.assertEqual(create_destination_tree(self.source_dir, self.destination_dir), 50)
+        self.assertTrue(os.path.isdir(os.path.join(self.destination_dir, self.deep_dir)))
+
+
+class ListSourceFilesTestCase(TestCase):
+    def setUp(self):
+        self.source_dir = tempfile.mkdtemp()
+        for name, size in [('small', 1), ('large', 100), ('medium', 10)]:
+            with open(os.path.join(self.source_dir, name), 'wb') as f:
+                f.write(b'x' * size)
+        os.makedirs(os.path.join(self.source_dir, 'subdir'))
+
+    def tearDown(self):
+        shutil.rmtree(self.source_dir)
+
+    def test_list_source_files_largest_first(self):
+        files = list_source_files(self.source_dir)
+        self.assertEqual(
+            [(os.path.basename(path), size) for path, size in files],
+            [('large', 100), ('medium', 10), ('small', 1)]
+        )
 
 
 if __name__ == '__main__':
@@ -0,0 +1,43 @@
+import os
+import shutil
+import tempfile
+import unittest
+from copy_app.manifest import Manifest, load_manifest_entries, MANIFEST_FILE_NAME, STATE_PARTIAL, STATE_VERIFIED
+
+
+class ManifestTestCase(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def test_record_and_get(self):
+        with Manifest(self.folder) as manifest:
+            manifest.record('a.bin', size=10, state=STATE_PARTIAL, offset=4)
+            manifest.record('a.bin', state=STATE_VERIFIED, checksum='abc')
+            self.assertEqual(
+                manifest.get('a.bin'),
+                {'path': 'a.bin', 'size': 10, 'state': STATE_VERIFIED, 'offset': 4, 'checksum': 'abc'}
+            )
+            self.assertIsNone(manifest.get('b.bin'))
+
+    def test_reload(self):
+        with Manifest(self.folder) as manifest:
+            manifest.record('a.bin', state=STATE_PARTIAL, offset=4)
+            manifest.record('a.bin', state=STATE_VERIFIED)
+
+        with Manifest(self.folder) as manifest:
+            self.assertEqual(manifest.get('a.bin')['state'], STATE_VERIFIED)
+
+    def test_truncated_line_is_ignored(self):
+        with Manifest(self.folder) as manifest:
+            manifest.record('a.bin', state=STATE_VERIFIED)
+        with open(os.path.join(self.folder, MANIFEST_FILE_NAME), 'a') as manifest_file:
+            manifest_file.write('{"path": "b.bin", "sta')
+
+        self.assertEqual(list(load_manifest_entries(os.path.join(self.folder, MANIFEST_FILE_NAME))), ['a.bin'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,69 @@
+import json
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+from copy_app.metrics import PhaseTimer, FileMetrics, append_jsonl, format_prometheus, write_prometheus_textfile, \
+    PHASE_WRITE, PHASE_LISTING
+
+
+class PhaseTimerTestCase(unittest.TestCase):
+    def test_add_from_threads(self):
+        timer = PhaseTimer()
+        threads = [threading.Thread(target=lambda: [timer.add(PHASE_WRITE, 0.001) for _ in range(100)])
+                   for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertAlmostEqual(timer.snapshot()[PHASE_WRITE], 0.4)
+
+    def test_timed_iter(self):
+        timer = PhaseTimer()
+        self.assertEqual(list(timer.timed_iter(PHASE_LISTING, range(3))), [0, 1, 2])
+        self.assertGreater(timer.snapshot()[PHASE_LISTING], 0)
+
+    def test_file_metrics_throughput(self):
+        self.assertEqual(FileMetrics('a.bin', 1000, 0.5, 'stream').throughput, 2000)
+
+
+class ExportTestCase(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.reports = [
+            {'status': 'ok', 'files_copied': 3, 'files_skipped': 1, 'bytes_copied': 3000, 'elapsed': 2.0,
+             'failures': {}, 'phases': {'write': 1.5, 'verify': 0.5}},
+            {'status': 'failed', 'files_copied': 1, 'files_skipped': 0, 'bytes_copied': 1000, 'elapsed': 1.0,
+             'failures': {'bad.bin': 'Checksum mismatch'}, 'phases': {'write': 0.5}},
+            {'status': 'error', 'error': 'No JSON file'},
+        ]
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def test_format_prometheus(self):
+        text = format_prometheus(self.reports, elapsed=2.0, labels={'host': 'ingest-1'}, timestamp=100.0)
+
+        self.assertIn('# TYPE copy_app_last_run_bytes gauge\n', text)
+        self.assertIn('copy_app_last_run_bytes{host="ingest-1"} 4000\n', text)
+        self.assertIn('copy_app_last_run_files{host="ingest-1",status="failed"} 1\n', text)
+        self.assertIn('copy_app_last_run_sources{host="ingest-1",status="error"} 1\n', text)
+        self.assertIn('copy_app_last_run_throughput_bytes_per_second{host="ingest-1"} 2000.0\n', text)
+        self.assertIn('copy_app_last_run_phase_seconds{host="ingest-1",phase="write"} 2.0\n', text)
+
+    def test_write_prometheus_textfile(self):
+        path = os.path.join(self.folder, 'copy_app.prom')
+        write_prometheus_textfile(path, self.reports)
+        self.assertEqual(os.listdir(self.folder), ['copy_app.prom'])
+
+    def test_append_jsonl(self):
+        path = os.path.join(self.folder, 'logs', 'copy_app.jsonl')
+        append_jsonl(path, self.reports[:1])
+        append_jsonl(path, self.reports[1:])
+        with open(path) as log_file:
+            self.assertEqual([json.loads(line)['status'] for line in log_file], ['ok', 'failed', 'error'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,52 @@
+import hashlib
+import os
+import shutil
+import tempfile
+import unittest
+from copy_app.object_store import ObjectStore, collect_garbage
+
+
+class ObjectStoreTestCase(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.store = ObjectStore(self.root)
+        self.file_path = os.path.join(self.root, 'a.bin')
+        self.content = os.urandom(1000)
+        self.checksum = hashlib.sha256(self.content).hexdigest()
+        with open(self.file_path, 'wb') as f:
+            f.write(self.content)
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def test_add_and_link(self):
+        self.assertTrue(self.store.add(self.file_path, self.checksum))
+        self.assertFalse(self.store.add(self.file_path, self.checksum))
+
+        linked_path = os.path.join(self.root, 'b.bin')
+        self.assertTrue(self.store.link(self.checksum, len(self.content), linked_path))
+        self.assertTrue(os.path.samefile(linked_path, self.file_path))
+
+    def test_link_missing_object(self):
+        self.assertFalse(self.store.link(self.checksum, len(self.content), os.path.join(self.root, 'b.bin')))
+
+    def test_link_size_mismatch(self):
+        self.store.add(self.file_path, self.checksum)
+        self.assertFalse(self.store.link(self.checksum, 1, os.path.join(self.root, 'b.bin')))
+
+    def test_non_cryptographic_algorithm(self):
+        with self.assertRaises(ValueError):
+            ObjectStore(self.root, 'crc32')
+
+    def test_collect_garbage(self):
+        self.store.add(self.file_path, self.checksum)
+        self.assertEqual(collect_garbage(self.root), {'objects_kept': 1, 'objects_removed': 0, 'bytes_freed': 0})
+
+        os.remove(self.file_path)
+        self.assertEqual(collect_garbage(self.root, dry_run=True)['objects_removed'], 1)
+        self.assertEqual(collect_garbage(self.root), {'objects_kept': 0, 'objects_removed': 1, 'bytes_freed': 1000})
+        self.assertFalse(os.path.exists(self.store.object_path(self.checksum)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,110 @@
+import gzip
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from copy_app.file_operations import copy_files, compute_checksum
+from copy_app.manifest import MANIFEST_FILE_NAME, Manifest, load_manifest_entries
+from copy_app.restore import restore_folder
+from copy_app.verification import verify_folder
+
+
+class CompressedCopyTestCase(unittest.TestCase):
+    def setUp(self):
+        self.source_dir = tempfile.mkdtemp()
+        self.destination_root_dir = tempfile.mkdtemp()
+        self.restore_dir = tempfile.mkdtemp()
+        self.json_file_path = os.path.join(self.source_dir, 'test.json')
+        with open(self.json_file_path, 'w') as json_file:
+            json.dump({"test_sequence_id": "test_1"}, json_file)
+        os.makedirs(os.path.join(self.source_dir, 'logs'))
+        self.files = {
+            'video.mp3': os.urandom(300 * 1024),
+            'sensors.csv': b'12.5,sensor_1,OK\n' * 20000,
+            os.path.join('logs', 'run.log'): b'INFO capture started\n' * 500,
+        }
+        for relative_path, data in self.files.items():
+            with open(os.path.join(self.source_dir, relative_path), 'wb') as f:
+                f.write(data)
+
+    def tearDown(self):
+        shutil.rmtree(self.source_dir)
+        shutil.rmtree(self.destination_root_dir)
+        shutil.rmtree(self.restore_dir)
+
+    def test_compressible_files_are_stored_compressed(self):
+        summary = copy_files(self.source_dir, self.destination_root_dir, self.json_file_path, recursive=True,
+                             compression='gzip')
+
+        folder = summary.destination_folder
+        self.assertEqual(sorted(os.listdir(folder)),
+                         ['checksums.sha256', 'logs', 'manifest.jsonl', 'sensors.csv.gz', 'test.json', 'video.mp3'])
+        self.assertEqual(os.listdir(os.path.join(folder, 'logs')), ['run.log.gz'])
+        with gzip.open(os.path.join(folder, 'sensors.csv.gz')) as f:
+            self.assertEqual(f.read(), self.files['sensors.csv'])
+        entry = load_manifest_entries(os.path.join(folder, MANIFEST_FILE_NAME))['sensors.csv.gz']
+        self.assertEqual((entry['compression'], entry['size'], entry['state']), ('gzip', 340000, 'verified'))
+        self.assertEqual(entry['checksum'], compute_checksum(os.path.join(self.source_dir, 'sensors.csv')))
+        self.assertLess(summary.bytes_stored, summary.bytes_copied)
+        # The checksum file lists the files under their source names
+        with open(os.path.join(folder, 'checksums.sha256')) as checksum_file:
+            self.assertIn(f"{entry['checksum']}  sensors.csv\n", checksum_file.read())
+        self.assertTrue(verify_folder(folder).ok)
+
+        # As if the copy had been interrupted
+        with Manifest(folder) as manifest:
+            manifest.record_copy(complete=False)
+        resumed = copy_files(self.source_dir, self.destination_root_dir, self.json_file_path, recursive=True,
+                             compression='gzip', resume=True)
+        self.assertEqual((resumed.files_copied, resumed.files_skipped), (0, 4))
+
+    def test_compression_per_root(self):
+        mirror_root_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, mirror_root_dir)
+        archive, mirror = copy_files(self.source_dir, [self.destination_root_dir, mirror_root_dir],
+                                     self.json_file_path, compression=[None, 'gzip'])
+
+        self.assertIn('sensors.csv', os.listdir(archive.destination_folder))
+        self.assertIn('sensors.csv.gz', os.listdir(mirror.destination_folder))
+        self.assertTrue(verify_folder(mirror.destination_folder).ok)
+
+    def test_restore(self):
+        summary = copy_files(self.source_dir, self.destination_root_dir, self.json_file_path, recursive=True,
+                             compression='gzip')
+
+        restored = restore_folder(summary.destination_folder, self.restore_dir)
+        self.assertEqual((restored.files_copied, restored.failures), (4, {}))
+        for relative_path, data in self.files.items():
+            with open(os.path.join(self.restore_dir, relative_path), 'rb') as f:
+                self.assertEqual(f.read(), data)
+        self.assertTrue(os.path.exists(os.path.join(self.restore_dir, 'checksums.sha256')))
+
+    def test_restore_reports_corrupt_copies(self):
+        summary = copy_files(self.source_dir, self.destination_root_dir, self.json_file_path, compression='gzip')
+        with open(os.path.join(summary.destination_folder, 'sensors.csv.gz'), 'wb') as f:
+            f.write(gzip.compress(b'not the capture'))
+
+        restored = restore_folder(summary.destination_folder, self.restore_dir)
+        self.assertEqual(list(restored.failures), ['sensors.csv.gz'])
+        self.assertEqual(sorted(os.listdir(self.restore_dir)), ['checksums.sha256', 'test.json', 'video.mp3'])
+        self.assertEqual(list(verify_folder(summary.destination_folder).failures), ['sensors.csv.gz'])
+
+
+    def test_restore_rejects_paths_leaving_the_folder(self):
+        summary = copy_files(self.source_dir, self.destination_root_dir, self.json_file_path)
+        folder = summary.destination_folder
+        entry = load_manifest_entries(os.path.join(folder, MANIFEST_FILE_NAME))['video.mp3']
+        shutil.copyfile(os.path.join(folder, 'video.mp3'), os.path.join(self.destination_root_dir, 'escaped.mp3'))
+        escaping_paths = ['../escaped.mp3', 'logs/../../escaped.mp3', os.path.join(folder, 'video.mp3')]
+        with Manifest(folder) as manifest:
+            for relative_path in escaping_paths:
+                manifest.record(relative_path, **{key: value for key, value in entry.items() if key != 'path'})
+
+        restored = restore_folder(folder, os.path.join(self.restore_dir, 'restored'))
+        self.assertEqual(sorted(restored.failures), sorted(escaping_paths))
+        self.assertEqual(restored.files_copied, 3)
+        self.assertEqual(sorted(os.listdir(self.restore_dir)), ['restored'])
+
+if __name__ == '__main__':
+    unittest.main()
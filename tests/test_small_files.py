@@ -0,0 +1,54 @@
+import gzip
+import os
+import shutil
+import tempfile
+import unittest
+from unittest.mock import patch
+from copy_app.small_files import copy_tasks, read_back, write_file
+
+
+class CopyTasksTestCase(unittest.TestCase):
+    def test_large_files_are_tasks_of_their_own(self):
+        files = [('a', 'a', 10), ('big', 'big', 1000), ('b', 'b', 10)]
+
+        self.assertEqual(list(copy_tasks(files, 100)),
+                         [(False, [('big', 'big', 1000)]), (True, [('a', 'a', 10), ('b', 'b', 10)])])
+
+    @patch('small_files.SMALL_FILE_BATCH', 2)
+    def test_batches_are_bounded(self):
+        files = [(str(i), str(i), 1) for i in range(5)]
+
+        self.assertEqual([len(items) for _, items in copy_tasks(files, 100)], [2, 2, 1])
+
+    @patch('small_files.SMALL_FILE_BATCH_BYTES', 25)
+    def test_batches_are_bounded_in_bytes(self):
+        files = [(str(i), str(i), 10) for i in range(5)]
+
+        self.assertEqual([len(items) for _, items in copy_tasks(files, 100)], [3, 2])
+
+
+class WriteFileTestCase(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.temp_dir, 'small.csv')
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_write_and_read_back(self):
+        write_file(self.path, b'1,2\n', 0o640)
+
+        self.assertEqual(read_back(self.path), b'1,2\n')
+        if os.name == 'posix':
+            self.assertEqual(os.stat(self.path).st_mode & 0o777, 0o640)
+
+    def test_read_back_compressed(self):
+        write_file(self.path, gzip.compress(b'1,2\n'), 0o644)
+        self.assertEqual(read_back(self.path, 'gzip'), b'1,2\n')
+
+        write_file(self.path, b'not gzip', 0o644)
+        self.assertIsNone(read_back(self.path, 'gzip'))
+
+
+if __name__ == '__main__':
+    unittest.main()
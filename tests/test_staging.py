@@ -0,0 +1,80 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest.mock import patch
+from copy_app.staging import StagedWrites, partial_path, publish_folder, staging_folder_path, STAGING_DIR_NAME
+
+
+class StagedWritesTestCase(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def stage(self, staged, name, content=b'data'):
+        destination_path = os.path.join(self.folder, name)
+        with open(staged.staging_path(destination_path), 'wb') as f:
+            f.write(content)
+        staged.add(destination_path, len(content))
+        return destination_path
+
+    def test_partial_path(self):
+        self.assertEqual(partial_path(os.path.join('a', 'b.bin')), os.path.join('a', '.b.bin.partial'))
+
+    def test_files_appear_on_flush(self):
+        with StagedWrites() as staged:
+            destination_path = self.stage(staged, 'a.bin')
+            self.assertFalse(os.path.exists(destination_path))
+        self.assertEqual(os.listdir(self.folder), ['a.bin'])
+
+    def test_full_batch_is_flushed(self):
+        staged = StagedWrites(batch_files=2)
+        self.stage(staged, 'a.bin')
+        self.stage(staged, 'b.bin')
+        self.assertEqual(sorted(os.listdir(self.folder)), ['a.bin', 'b.bin'])
+
+    def test_batch_syncs_the_file_system_once(self):
+        staged = StagedWrites()
+        for name in ['a.bin', 'b.bin', 'c.bin']:
+            self.stage(staged, name)
+        with patch('staging.sync_filesystem', return_value=True) as mock_sync, \
+                patch('staging.fsync_path') as mock_fsync:
+            staged.flush()
+        mock_sync.assert_called_once()
+        # Only the directory is synced, not every file
+        mock_fsync.assert_called_once_with(os.path.abspath(self.folder))
+
+    def test_discard(self):
+        staged = StagedWrites()
+        destination_path = os.path.join(self.folder, 'a.bin')
+        with open(staged.staging_path(destination_path), 'wb') as f:
+            f.write(b'corrupt')
+        staged.discard(destination_path)
+        self.assertEqual(os.listdir(self.folder), [])
+
+
+class PublishFolderTestCase(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def test_publish_folder_replaces_reservation(self):
+        destination_folder = os.path.join(self.root, 'test_1_1')
+        os.makedirs(destination_folder)
+        staging_folder = staging_folder_path(destination_folder)
+        os.makedirs(os.path.join(staging_folder, 'camera'))
+        with open(os.path.join(staging_folder, 'camera', 'a.bin'), 'wb') as f:
+            f.write(b'data')
+
+        publish_folder(staging_folder, destination_folder)
+
+        self.assertTrue(os.path.exists(os.path.join(destination_folder, 'camera', 'a.bin')))
+        self.assertFalse(os.path.exists(os.path.join(self.root, STAGING_DIR_NAME)))
+
+
+if __name__ == '__main__':
+    unittest.main()
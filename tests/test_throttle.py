@@ -0,0 +1,61 @@
+import datetime
+import threading
+import time
+import unittest
+from copy_app.throttle import Throttle, parse_rate, parse_schedule, rate_at, lower_priority, MB
+
+
+class ParseTestCase(unittest.TestCase):
+    def test_parse_rate(self):
+        self.assertEqual(parse_rate('50M'), 50 * MB)
+        self.assertEqual(parse_rate('1.5k'), 1536)
+        self.assertEqual(parse_rate('100MB/s'), 100 * MB)
+        self.assertIsNone(parse_rate('unlimited'))
+        self.assertIsNone(parse_rate('0'))
+        with self.assertRaises(ValueError):
+            parse_rate('fast')
+
+    def test_schedule(self):
+        schedule = parse_schedule('07:00-19:00=20M, 22:00-06:00=unlimited')
+
+        self.assertEqual(rate_at(schedule, datetime.time(12, 0), default=MB), 20 * MB)
+        self.assertEqual(rate_at(schedule, datetime.time(19, 0), default=MB), MB)
+        # A window wrapping around midnight
+        self.assertIsNone(rate_at(schedule, datetime.time(23, 30), default=MB))
+        self.assertIsNone(rate_at(schedule, datetime.time(5, 59), default=MB))
+
+    def test_invalid_schedule(self):
+        with self.assertRaises(ValueError):
+            parse_schedule('day=50M')
+
+
+class ThrottleTestCase(unittest.TestCase):
+    def test_unlimited(self):
+        self.assertEqual(Throttle().consume(10 * MB), 0)
+
+    def test_rate_is_shared_between_threads(self):
+        throttle = Throttle(10 * MB, burst_seconds=0)
+
+        def transfer():
+            for _ in range(5):
+                throttle.consume(100 * 1024)
+
+        start = time.monotonic()
+        threads = [threading.Thread(target=transfer) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        # 2000 KiB at 10 MiB/s, whatever the number of threads
+        self.assertGreaterEqual(time.monotonic() - start, 0.18)
+
+    def test_lower_priority(self):
+        # Does what the platform allows, without failing
+        thread = threading.Thread(target=lower_priority)
+        thread.start()
+        thread.join()
+
+
+if __name__ == '__main__':
+    unittest.main()
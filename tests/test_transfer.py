@@ -0,0 +1,91 @@
+import errno
+import os
+import shutil
+import tempfile
+import unittest
+from unittest.mock import patch
+from copy_app.metrics import PhaseTimer
+from copy_app.transfer import BACKENDS, transfer_file, candidate_backends
+
+
+class TransferFileTestCase(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.source_path = os.path.join(self.temp_dir, 'source.bin')
+        self.destination_path = os.path.join(self.temp_dir, 'destination.bin')
+        self.content = os.urandom(3 * 1024 * 1024 + 17)
+        with open(self.source_path, 'wb') as f:
+            f.write(self.content)
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def read_destination(self):
+        with open(self.destination_path, 'rb') as f:
+            return f.read()
+
+    def test_transfer_file_auto(self):
+        backend = transfer_file(self.source_path, self.destination_path)
+        self.assertIn(backend, BACKENDS)
+        self.assertEqual(self.read_destination(), self.content)
+
+    def test_transfer_file_buffered(self):
+        self.assertEqual(transfer_file(self.source_path, self.destination_path, 'buffered'), 'buffered')
+        self.assertEqual(self.read_destination(), self.content)
+
+    def test_transfer_file_falls_back(self):
+        def unsupported(source_fd, destination_fd, size, throttle=None):
+            raise OSError(errno.EXDEV, "Invalid cross-device link")
+
+        backends = dict(BACKENDS, reflink=unsupported, copy_file_range=unsupported, sendfile=unsupported)
+        with patch.dict('transfer.BACKENDS', backends):
+            backend = transfer_file(self.source_path, self.destination_path)
+
+        self.assertEqual(backend, 'buffered')
+        self.assertEqual(self.read_destination(), self.content)
+
+    def test_transfer_file_does_not_fall_back_on_real_errors(self):
+        def denied(source_fd, destination_fd, size, throttle=None):
+            raise OSError(errno.EPERM, "Operation not permitted")
+
+        backends = dict(BACKENDS, reflink=denied, copy_file_range=denied, sendfile=denied)
+        with patch.dict('transfer.BACKENDS', backends), self.assertRaises(OSError) as raised:
+            transfer_file(self.source_path, self.destination_path)
+
+        self.assertEqual(raised.exception.errno, errno.EPERM)
+
+    def test_transfer_file_throttled_chunk_by_chunk(self):
+        class RecordingThrottle:
+            def __init__(self):
+                self.amounts = []
+
+            def consume(self, amount):
+                self.amounts.append(amount)
+                return 0.01
+
+        for backend in ('copy_file_range', 'sendfile', 'buffered'):
+            with self.subTest(backend=backend):
+                throttle = RecordingThrottle()
+                metrics = PhaseTimer()
+                with patch('transfer.THROTTLED_KERNEL_CHUNK', 1024 * 1024):
+                    try:
+                        transfer_file(self.source_path, self.destination_path, backend, throttle, metrics)
+                    except OSError as e:
+                        if e.errno != errno.ENOSYS:
+                            raise
+                        continue
+                self.assertEqual(throttle.amounts, [1024 * 1024] * 3 + [17])
+                self.assertEqual(self.read_destination(), self.content)
+                self.assertAlmostEqual(metrics.snapshot()['throttle'], 0.04)
+
+    def test_transfer_file_unknown_backend(self):
+        with self.assertRaises(ValueError):
+            transfer_file(self.source_path, self.destination_path, 'carrier_pigeon')
+
+    def test_candidate_backends_prefers_last_working_backend(self):
+        backend = transfer_file(self.source_path, self.destination_path)
+        self.assertEqual(candidate_backends(self.source_path, self.destination_path)[0], backend)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,5 +1,8 @@
+import json
+import os
+import tempfile
 import unittest
-from copy_app.utils import get_value_from_dict
+from copy_app.utils import get_value_from_dict, find_value_in_json_file
 
 class TestGetValueFromDict(unittest.TestCase):
 
@@ -40,5 +43,64 @@ class TestGetValueFromDict(unittest.TestCase):
         self.assertEqual(get_value_from_dict(data, 'c'), 3)
         self.assertEqual(get_value_from_dict(data, 'e'), 5)
 
+    def test_deep_nesting(self):
+        # Deeper than the recursion limit
+        data = {'c': 3}
+        for _ in range(5000):
+            data = {'a': [data]}
+        self.assertEqual(get_value_from_dict(data, 'c'), 3)
+
+    def test_keys_checked_before_values(self):
+        data = {'a': {'c': 1}, 'c': 2}
+        self.assertEqual(get_value_from_dict(data, 'c'), 2)
+
+    def test_none_value_stops_search_of_dict(self):
+        data = {'a': {'c': None, 'b': {'c': 1}}, 'd': {'c': 2}}
+        self.assertEqual(get_value_from_dict(data, 'c'), 2)
+
+
+class TestFindValueInJsonFile(unittest.TestCase):
+
+    def setUp(self):
+        self.json_file = tempfile.NamedTemporaryFile('w', suffix='.json', delete=False)
+        self.json_file.close()
+
+    def tearDown(self):
+        os.remove(self.json_file.name)
+
+    def write(self, text):
+        with open(self.json_file.name, 'w') as json_file:
+            json_file.write(text)
+
+    def test_fixture(self):
+        fixture = os.path.join(os.path.dirname(__file__), 'test_data', 'test_file.json')
+        self.assertEqual(find_value_in_json_file(fixture, 'test_sequence_id'), '123')
+
+    def test_key_after_large_array(self):
+        self.write(json.dumps({'samples': list(range(100000)), 'meta': {'test_sequence_id': 'T1'}}))
+        self.assertEqual(find_value_in_json_file(self.json_file.name, 'test_sequence_id', chunk_size=1000), 'T1')
+
+    def test_key_text_in_string_value_is_ignored(self):
+        self.write(json.dumps({'note': '"test_sequence_id": "wrong"', 'test_sequence_id': 'right'}))
+        self.assertEqual(find_value_in_json_file(self.json_file.name, 'test_sequence_id'), 'right')
+
+    def test_string_value_named_like_key_is_ignored(self):
+        self.write('{"a": ["test_sequence_id", 1], "test_sequence_id": "right"}')
+        self.assertEqual(find_value_in_json_file(self.json_file.name, 'test_sequence_id'), 'right')
+
+    def test_values_split_across_chunks(self):
+        data = {'a\\"b': 'x\\"' * 10, 'test_sequence_id': 1234567890, 'after': 1}
+        self.write(json.dumps(data))
+        for chunk_size in range(1, 20):
+            self.assertEqual(find_value_in_json_file(self.json_file.name, 'test_sequence_id', chunk_size), 1234567890)
+
+    def test_null_value_is_skipped(self):
+        self.write('{"test_sequence_id": null, "b": {"test_sequence_id": {"id": 1}}}')
+        self.assertEqual(find_value_in_json_file(self.json_file.name, 'test_sequence_id'), {'id': 1})
+
+    def test_key_not_present(self):
+        self.write('{"a": 1, "b": [1, 2, "c"]}')
+        self.assertIsNone(find_value_in_json_file(self.json_file.name, 'c'))
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,168 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from unittest.mock import patch
+from copy_app.file_operations import copy_files, sample_offsets, verify_copy, compute_checksum
+from copy_app.manifest import MANIFEST_FILE_NAME, load_manifest_entries
+from copy_app.verification import Verifier, verify_folder
+
+
+class SampledVerificationTestCase(unittest.TestCase):
+    def setUp(self):
+        self.work_dir = tempfile.mkdtemp()
+        self.source_path = os.path.join(self.work_dir, 'source.bin')
+        self.copy_path = os.path.join(self.work_dir, 'copy.bin')
+        self.content = os.urandom(64 * 1024)
+        for path in (self.source_path, self.copy_path):
+            with open(path, 'wb') as f:
+                f.write(self.content)
+        self.checksum = compute_checksum(self.source_path)
+
+    def tearDown(self):
+        shutil.rmtree(self.work_dir)
+
+    def test_sample_offsets(self):
+        offsets = sample_offsets(100 * 1024, blocks=4, block_size=1024)
+        self.assertEqual(len(offsets), 4)
+        self.assertEqual((offsets[0], offsets[-1]), (0, 99 * 1024))
+        self.assertEqual(sample_offsets(2500, blocks=4, block_size=1024), [0, 1024, 2048])
+
+    @patch('file_operations.SAMPLE_BLOCK_SIZE', 1024)
+    @patch('file_operations.SAMPLE_THRESHOLD', 0)
+    def test_sampled_copy_matches(self):
+        with patch('file_operations.compute_checksum') as mock_compute_checksum:
+            self.assertTrue(verify_copy(self.source_path, self.copy_path, self.checksum, mode='sampled'))
+        # Large files are compared block by block, without hashing the copy
+        mock_compute_checksum.assert_not_called()
+
+    @patch('file_operations.SAMPLE_BLOCK_SIZE', 1024)
+    @patch('file_operations.SAMPLE_THRESHOLD', 0)
+    def test_sampled_copy_detects_truncated_tail(self):
+        with open(self.copy_path, 'r+b') as f:
+            f.seek(-100, os.SEEK_END)
+            f.write(bytes(100))
+        self.assertFalse(verify_copy(self.source_path, self.copy_path, self.checksum, mode='sampled'))
+
+        with open(self.copy_path, 'r+b') as f:
+            f.truncate(1000)
+        self.assertFalse(verify_copy(self.source_path, self.copy_path, self.checksum, mode='sampled'))
+
+    def test_small_file_is_verified_in_full(self):
+        with open(self.copy_path, 'r+b') as f:
+            f.seek(30000)
+            f.write(b'corrupt')
+        self.assertFalse(verify_copy(self.source_path, self.copy_path, self.checksum, mode='sampled'))
+        self.assertTrue(verify_copy(self.source_path, self.copy_path, self.checksum, mode='none'))
+
+
+class VerifierTestCase(unittest.TestCase):
+    def setUp(self):
+        self.source_dir = tempfile.mkdtemp()
+        self.destination_root_dir = tempfile.mkdtemp()
+        self.json_file_path = os.path.join(self.source_dir, 'test.json')
+        with open(self.json_file_path, 'w') as json_file:
+            json.dump({"test_sequence_id": "test_1"}, json_file)
+        for name in ('video.mp3', 'audio.wav'):
+            with open(os.path.join(self.source_dir, name), 'wb') as f:
+                f.write(os.urandom(200 * 1024))
+
+    def tearDown(self):
+        shutil.rmtree(self.source_dir)
+        shutil.rmtree(self.destination_root_dir)
+
+    def states(self, folder):
+        entries = load_manifest_entries(os.path.join(folder, MANIFEST_FILE_NAME))
+        return {path: entry['state'] for path, entry in entries.items()}
+
+    def test_sampled_mode_is_recorded(self):
+        summary = copy_files(self.source_dir, self.destination_root_dir, self.json_file_path, verify='sampled')
+        self.assertEqual(summary.verification, 'sampled')
+        self.assertEqual(self.states(summary.destination_folder),
+                         {'video.mp3': 'sampled', 'audio.wav': 'sampled', 'test.json': 'verified'})
+
+    def test_deferred_mode_needs_a_verifier(self):
+        with self.assertRaises(ValueError):
+            copy_files(self.source_dir, self.destination_root_dir, self.json_file_path, verify='deferred')
+
+    def test_deferred_verification_is_recorded_after_the_copy(self):
+        with Verifier(workers=2) as verifier:
+            summary = copy_files(self.source_dir, self.destination_root_dir, self.json_file_path, verify='deferred',
+                                 staging='folder', verifier=verifier)
+            reports = verifier.wait()
+
+        self.assertEqual([report.folder for report in reports], [summary.destination_folder])
+        self.assertTrue(reports[0].ok)
+        self.assertEqual(reports[0].files_verified, 3)
+        self.assertEqual(set(self.states(summary.destination_folder).values()), {'verified'})
+
+    def test_corrupt_file_is_recorded_as_failed_and_copied_again(self):
+        summary = copy_files(self.source_dir, self.destination_root_dir, self.json_file_path, verify=False)
+        with open(os.path.join(summary.destination_folder, 'video.mp3'), 'r+b') as f:
+            f.write(b'corrupt')
+
+        with Verifier() as verifier:
+            report = verifier.submit_folder(summary.destination_folder).result()
+        self.assertEqual(report.failures, {'video.mp3': 'checksum mismatch'})
+        self.assertEqual(self.states(summary.destination_folder)['video.mp3'], 'failed')
+
+        resumed = copy_files(self.source_dir, self.destination_root_dir, self.json_file_path, resume=True)
+        self.assertEqual((resumed.files_copied, resumed.files_skipped), (1, 2))
+        self.assertTrue(verify_folder(summary.destination_folder).ok)
+
+    def test_verification_mode_per_root(self):
+        mirror_root_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, mirror_root_dir)
+        with Verifier() as verifier:
+            archive, mirror = copy_files(self.source_dir, [self.destination_root_dir, mirror_root_dir],
+                                         self.json_file_path, verify=['full', 'deferred'], verifier=verifier)
+            reports = verifier.wait()
+
+        self.assertEqual(set(self.states(archive.destination_folder).values()), {'verified'})
+        self.assertEqual([report.folder for report in reports], [mirror.destination_folder])
+        self.assertEqual(set(self.states(mirror.destination_folder).values()), {'verified'})
+
+
+class VerifyFolderTestCase(unittest.TestCase):
+    def setUp(self):
+        self.source_dir = tempfile.mkdtemp()
+        self.destination_root_dir = tempfile.mkdtemp()
+        self.json_file_path = os.path.join(self.source_dir, 'test.json')
+        with open(self.json_file_path, 'w') as json_file:
+            json.dump({"test_sequence_id": "test_1"}, json_file)
+        with open(os.path.join(self.source_dir, 'video.mp3'), 'wb') as f:
+            f.write(os.urandom(1000))
+        self.folder = copy_files(self.source_dir, self.destination_root_dir, self.json_file_path).destination_folder
+
+    def tearDown(self):
+        shutil.rmtree(self.source_dir)
+        shutil.rmtree(self.destination_root_dir)
+
+    def test_verify_folder(self):
+        report = verify_folder(self.folder)
+        self.assertTrue(report.ok)
+        self.assertEqual(report.files_verified, 2)
+
+    def test_missing_and_truncated_files(self):
+        os.remove(os.path.join(self.folder, 'test.json'))
+        with open(os.path.join(self.folder, 'video.mp3'), 'r+b') as f:
+            f.truncate(10)
+        manifest_before = os.path.getsize(os.path.join(self.folder, MANIFEST_FILE_NAME))
+
+        report = verify_folder(self.folder)
+        self.assertEqual(report.failures, {'test.json': 'missing', 'video.mp3': 'size is 10 bytes, expected 1000'})
+        # Offline verification leaves the folder untouched unless asked to record
+        self.assertEqual(os.path.getsize(os.path.join(self.folder, MANIFEST_FILE_NAME)), manifest_before)
+
+    def test_folder_without_manifest_uses_checksum_file(self):
+        os.remove(os.path.join(self.folder, MANIFEST_FILE_NAME))
+        self.assertEqual(verify_folder(self.folder).files_verified, 2)
+
+        os.remove(os.path.join(self.folder, 'checksums.sha256'))
+        with self.assertRaises(FileNotFoundError):
+            verify_folder(self.folder)
+
+
+if __name__ == '__main__':
+    unittest.main()
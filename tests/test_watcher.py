@@ -0,0 +1,206 @@
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import unittest
+from copy_app.watcher import DropFolderWatcher, InotifyEvents, folder_snapshot
+
+
+class DropFolderWatcherTestCase(unittest.TestCase):
+    def setUp(self):
+        self.work_dir = tempfile.mkdtemp()
+        self.drop_dir = os.path.join(self.work_dir, 'drop')
+        os.makedirs(self.drop_dir)
+        self.state_path = os.path.join(self.work_dir, 'state.json')
+        self.ingested = []
+        self.outcomes = []
+        self.status = 'ok'
+
+    def tearDown(self):
+        shutil.rmtree(self.work_dir)
+
+    def ingest(self, folder, resume_folders, on_destination_folders):
+        self.ingested.append((os.path.basename(folder), resume_folders))
+        on_destination_folders(resume_folders or ['/archive/T_1'])
+        return {'source': folder, 'status': self.status, 'error': 'disk full', 'destination_folder': '/archive/T_1'}
+
+    def make_watcher(self, **kwargs):
+        kwargs.setdefault('settle_seconds', 0)
+        return DropFolderWatcher(self.drop_dir, self.ingest, state_path=self.state_path, use_inotify=False,
+                                 on_outcome=lambda name, outcome: self.outcomes.append((name, outcome['status'])),
+                                 **kwargs)
+
+    def drop_capture(self, name, with_json=True):
+        folder = os.path.join(self.drop_dir, name)
+        os.makedirs(folder)
+        with open(os.path.join(folder, 'video.mp3'), 'wb') as f:
+            f.write(os.urandom(100))
+        if with_json:
+            with open(os.path.join(folder, 'test.json'), 'w') as json_file:
+                json.dump({'test_sequence_id': name}, json_file)
+        return folder
+
+    def test_ingests_complete_folders_once(self):
+        self.drop_capture('capture_1')
+        with self.make_watcher() as watcher:
+            # The first look records the files, the second finds them unchanged
+            watcher.step()
+            self.assertEqual(self.ingested, [])
+            watcher.step()
+        self.assertEqual(self.ingested, [('capture_1', None)])
+        self.assertEqual(self.outcomes, [('capture_1', 'ok')])
+
+        with self.make_watcher() as watcher:
+            watcher.step()
+            watcher.step()
+        self.assertEqual(self.ingested, [('capture_1', None)])
+        with open(self.state_path) as state_file:
+            self.assertEqual(list(json.load(state_file)['ingested']), ['capture_1'])
+
+    def test_folder_dropped_again_with_other_files_is_ingested_again(self):
+        folder = self.drop_capture('capture_1')
+        with self.make_watcher() as watcher:
+            watcher.step()
+            watcher.step()
+            watcher.join()
+
+            with open(os.path.join(folder, 'video.mp3'), 'ab') as f:
+                f.write(b'retake')
+            watcher.step()
+            self.assertEqual(self.ingested, [('capture_1', None)])
+            watcher.step()
+        self.assertEqual(self.ingested, [('capture_1', None), ('capture_1', None)])
+
+    def test_waits_for_json_and_stable_files(self):
+        folder = self.drop_capture('capture_1', with_json=False)
+        with self.make_watcher() as watcher:
+            watcher.step()
+            watcher.step()
+            self.assertEqual(self.ingested, [])
+
+            with open(os.path.join(folder, 'test.json'), 'w') as json_file:
+                json.dump({'test_sequence_id': 'capture_1'}, json_file)
+            watcher.step()
+            self.assertEqual(self.ingested, [])
+            watcher.step()
+        self.assertEqual(self.ingested, [('capture_1', None)])
+
+    def test_settle_period(self):
+        self.drop_capture('capture_1')
+        with self.make_watcher(settle_seconds=3600) as watcher:
+            watcher.step()
+            watcher.step()
+        self.assertEqual(self.ingested, [])
+
+    def test_failed_folder_is_retried_with_resume(self):
+        self.status = 'error'
+        self.drop_capture('capture_1')
+        with self.make_watcher(retry_delay=0, max_attempts=2) as watcher:
+            watcher.step()
+            watcher.step()
+            watcher.join()
+            watcher.step()
+        # The retry continues the copy in the folder of the failed one
+        self.assertEqual(self.ingested, [('capture_1', None), ('capture_1', ['/archive/T_1'])])
+        with open(self.state_path) as state_file:
+            failed = json.load(state_file)['failed']
+        self.assertEqual(failed['capture_1']['attempts'], 2)
+        self.assertEqual(failed['capture_1']['destination_folders'], ['/archive/T_1'])
+        self.assertIsNone(failed['capture_1']['retry_at'])
+
+    def test_interrupted_copy_resumes_after_restart(self):
+        self.drop_capture('capture_1')
+        reported = threading.Event()
+        release = threading.Event()
+
+        def blocking_ingest(folder, resume_folders, on_destination_folders):
+            on_destination_folders(['/archive/T_2'])
+            reported.set()
+            release.wait(10)
+            raise RuntimeError("killed")
+
+        watcher = DropFolderWatcher(self.drop_dir, blocking_ingest, state_path=self.state_path, settle_seconds=0,
+                                    use_inotify=False)
+        watcher.step()
+        watcher.step()
+        self.assertTrue(reported.wait(10))
+        watcher.step()
+        # The state saved while the copy runs is what a crashed watcher leaves behind
+        with open(self.state_path) as state_file:
+            saved = state_file.read()
+        release.set()
+        watcher.close()
+        with open(self.state_path, 'w') as state_file:
+            state_file.write(saved)
+
+        with self.make_watcher() as watcher:
+            watcher.step()
+        # Another capture of the test ID may have been copied since, so the copy continues in its own folder
+        self.assertEqual(self.ingested, [('capture_1', ['/archive/T_2'])])
+
+    def test_backpressure(self):
+        for name in ('capture_1', 'capture_2', 'capture_3'):
+            self.drop_capture(name)
+        release = threading.Event()
+        started = []
+
+        def blocking_ingest(folder, resume_folders, on_destination_folders):
+            started.append(os.path.basename(folder))
+            release.wait(10)
+            return {'status': 'ok'}
+
+        with DropFolderWatcher(self.drop_dir, blocking_ingest, state_path=self.state_path, settle_seconds=0,
+                               use_inotify=False, jobs=1, max_queued=2) as watcher:
+            watcher.step()
+            watcher.step()
+            self.assertEqual([entry['name'] for entry in watcher.state['queue']], ['capture_1', 'capture_2'])
+            release.set()
+            watcher.join()
+            watcher.step()
+            watcher.join()
+            self.assertEqual([entry['name'] for entry in watcher.state['queue']], ['capture_3'])
+        self.assertEqual(started, ['capture_1', 'capture_2'])
+
+
+@unittest.skipUnless(sys.platform.startswith('linux'), "inotify is only available on Linux")
+class InotifyEventsTestCase(unittest.TestCase):
+    def setUp(self):
+        self.drop_dir = tempfile.mkdtemp()
+        self.events = InotifyEvents(self.drop_dir)
+        self.stop_event = threading.Event()
+
+    def tearDown(self):
+        self.events.close()
+        shutil.rmtree(self.drop_dir)
+
+    def test_reports_changed_folders(self):
+        self.assertEqual(self.events.wait(0, self.stop_event), set())
+
+        nested = os.path.join(self.drop_dir, 'capture_1', 'frames')
+        os.makedirs(nested)
+        self.assertEqual(self.events.wait(1, self.stop_event), {'capture_1'})
+
+        # The directories created after the watch started are watched too
+        with open(os.path.join(nested, 'frame_0.bin'), 'wb') as f:
+            f.write(b'frame')
+        self.assertEqual(self.events.wait(1, self.stop_event), {'capture_1'})
+
+
+class FolderSnapshotTestCase(unittest.TestCase):
+    def test_snapshot_changes_with_files(self):
+        folder = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, folder)
+        with open(os.path.join(folder, 'a.bin'), 'wb') as f:
+            f.write(b'a')
+        before = folder_snapshot(folder)
+        self.assertEqual(folder_snapshot(folder), before)
+
+        with open(os.path.join(folder, 'a.bin'), 'ab') as f:
+            f.write(b'b')
+        self.assertNotEqual(folder_snapshot(folder), before)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,210 @@
+import ctypes
+import datetime
+import os
+import platform
+import re
+import sys
+import threading
+import time
+
+KB = 1024
+MB = 1024 * KB
+GB = 1024 * MB
+
+# Number of seconds of transfer at full rate a throttle lets through at once after being idle.
+DEFAULT_BURST_SECONDS = 0.5
+
+# Linux I/O scheduling classes (see ioprio_set(2)).
+IOPRIO_CLASS_BE = 2
+IOPRIO_CLASS_IDLE = 3
+IOPRIO_CLASS_SHIFT = 13
+IOPRIO_WHO_PROCESS = 1
+IO_CLASSES = {'best-effort': IOPRIO_CLASS_BE, 'idle': IOPRIO_CLASS_IDLE}
+
+# Number of the ioprio_set system call, which the C library does not wrap.
+_IOPRIO_SET_SYSCALLS = {'x86_64': 251, 'i386': 289, 'i686': 289, 'aarch64': 30, 'armv7l': 314, 'ppc64le': 273}
+
+_RATE_PATTERN = re.compile(r'^\s*(\d+(?:\.\d+)?)\s*([kmg]?)(?:i?b)?(?:/s)?\s*$', re.IGNORECASE)
+_WINDOW_PATTERN = re.compile(r'^\s*(\d{1,2}):(\d{2})\s*-\s*(\d{1,2}):(\d{2})\s*=\s*(.+)$')
+
+
+def parse_rate(text):
+    """
+    Parses a transfer rate, e.g. '50M' or '1.5G', in bytes per second.
+
+    Args:
+        text (str): A number of bytes per second, with an optional K, M or G suffix;
+            '0' or 'unlimited' for no limit.
+
+    Returns:
+        int: The rate in bytes per second, or None for no limit.
+
+    Raises:
+        ValueError: If the text is not a rate.
+    """
+    if text.strip().lower() in ('unlimited', 'none', 'off'):
+        return None
+    match = _RATE_PATTERN.match(text)
+    if match is None:
+        raise ValueError(f"Invalid rate {text!r}, expected e.g. 50M or unlimited")
+    rate = float(match.group(1)) * {'': 1, 'k': KB, 'm': MB, 'g': GB}[match.group(2).lower()]
+    return int(rate) or None
+
+
+def parse_schedule(text):
+    """
+    Parses a time-of-day schedule of transfer rates, e.g. '06:00-22:00=50M'.
+
+    Windows are separated by commas and may wrap around midnight, e.g.
+    '07:00-19:00=20M,19:00-23:00=100M'. Outside of every window, the default rate of
+    the throttle applies.
+
+    Args:
+        text (str): The schedule.
+
+    Returns:
+        list: (start, end, rate) tuples, with datetime.time bounds and the rate in bytes per second.
+
+    Raises:
+        ValueError: If the text is not a schedule.
+    """
+    schedule = []
+    for window in filter(None, (part.strip() for part in text.split(','))):
+        match = _WINDOW_PATTERN.match(window)
+        if match is None:
+            raise ValueError(f"Invalid schedule window {window!r}, expected e.g. 06:00-22:00=50M")
+        start_hour, start_minute, end_hour, end_minute, rate = match.groups()
+        schedule.append((datetime.time(int(start_hour), int(start_minute)), datetime.time(int(end_hour), int(end_minute)),
+                         parse_rate(rate)))
+    return schedule
+
+
+def rate_at(schedule, moment, default=None):
+    """
+    Returns the rate of a schedule at a time of day.
+
+    Args:
+        schedule (list): (start, end, rate) tuples, see parse_schedule.
+        moment (datetime.time): The time of day.
+        default (int, optional): The rate outside of every window.
+
+    Returns:
+        int: The rate in bytes per second, or None for no limit.
+    """
+    for start, end, rate in schedule:
+        if start <= end:
+            inside = start <= moment < end
+        else:
+            inside = moment >= start or moment < end
+        if inside:
+            return rate
+    return default
+
+
+class Throttle:
+    """
+    A token bucket limiting the bytes transferred per second, shared by every thread using it.
+
+    Each transfer takes its size from the bucket, which refills at the current rate, and
+    waits for the bucket to be paid back when it goes into debt. The wait of each thread
+    accounts for the debt of all the others, so the rate is capped globally however many
+    workers share the throttle. Up to burst_seconds of transfer at full rate go through
+    without waiting after an idle period.
+
+    The rate can follow a time-of-day schedule, e.g. capped during shifts and unlimited
+    at night; it is looked up again on every transfer.
+
+    Attributes:
+        rate (int): The rate outside of the schedule windows, in bytes per second; None for no limit.
+        schedule (list): (start, end, rate) tuples, see parse_schedule.
+        burst_seconds (float): The size of the bucket, in seconds at the current rate.
+    """
+
+    def __init__(self, rate=None, schedule=None, burst_seconds=DEFAULT_BURST_SECONDS):
+        self.rate = rate
+        self.schedule = schedule or []
+        self.burst_seconds = burst_seconds
+        self._lock = threading.Lock()
+        self._tokens = 0.0
+        self._last = time.monotonic()
+
+    def current_rate(self):
+        """
+        Returns the rate that applies now.
+
+        Returns:
+            int: The rate in bytes per second, or None for no limit.
+        """
+        if not self.schedule:
+            return self.rate
+        return rate_at(self.schedule, datetime.datetime.now().time(), self.rate)
+
+    def consume(self, amount):
+        """
+        Takes a number of bytes from the bucket, waiting as long as the rate requires.
+
+        Args:
+            amount (int): The number of bytes about to be transferred.
+
+        Returns:
+            float: The number of seconds waited.
+        """
+        rate = self.current_rate()
+        with self._lock:
+            now = time.monotonic()
+            if not rate:
+                self._tokens, self._last = 0.0, now
+                return 0.0
+            self._tokens = min(rate * self.burst_seconds, self._tokens + (now - self._last) * rate) - amount
+            self._last = now
+            wait = -self._tokens / rate if self._tokens < 0 else 0.0
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+
+def _ioprio_set(io_class, level):
+    """
+    Sets the I/O priority of the calling thread with the ioprio_set system call.
+
+    Returns:
+        bool: True if the priority was set, False where it is not supported.
+    """
+    number = _IOPRIO_SET_SYSCALLS.get(platform.machine())
+    if number is None:
+        return False
+    try:
+        libc = ctypes.CDLL(None, use_errno=True)
+    except OSError:
+        return False
+    # Thread 0 is the calling thread; I/O priorities are per thread on Linux
+    return libc.syscall(number, IOPRIO_WHO_PROCESS, 0, (io_class << IOPRIO_CLASS_SHIFT) | level) == 0
+
+
+def lower_priority(niceness=10, io_class='idle'):
+    """
+    Lowers the CPU and I/O priority of the calling thread, so the copy yields to other processes.
+
+    On Linux, both priorities belong to the thread, so this is meant to be called by
+    every worker thread (e.g. as the initializer of a ThreadPoolExecutor), leaving the
+    main thread and a GUI responsive. The I/O class takes effect with the I/O
+    schedulers that support priorities (BFQ, and CFQ on older kernels). Elsewhere, this
+    does as much as the platform allows and never fails.
+
+    Args:
+        niceness (int, optional): The nice value to set, if it is lower. Defaults to 10.
+        io_class (str, optional): A key of IO_CLASSES; 'idle' only uses the disk when
+            nothing else does. Defaults to 'idle'.
+
+    Returns:
+        bool: True if the I/O priority was lowered, False if only the CPU priority could be.
+    """
+    if hasattr(os, 'setpriority'):
+        try:
+            if os.getpriority(os.PRIO_PROCESS, 0) < niceness:
+                os.setpriority(os.PRIO_PROCESS, 0, niceness)
+        except OSError:
+            pass
+    if not sys.platform.startswith('linux'):
+        return False
+    return _ioprio_set(IO_CLASSES[io_class], 7 if io_class == 'best-effort' else 0)
@@ -0,0 +1,205 @@
+import errno
+import os
+import shutil
+import sys
+import threading
+import time
+from metrics import PHASE_THROTTLE, PHASE_WRITE
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+# ioctl request that clones the extents of one file into another (btrfs, XFS, ...).
+FICLONE = 0x40049409
+
+# Largest number of bytes handed to the kernel in one copy_file_range/sendfile call.
+MAX_KERNEL_CHUNK = 1024 * 1024 * 1024
+
+# Largest number of bytes handed to the kernel in one call of a throttled copy, so the
+# throttle paces the copy instead of letting a whole chunk through at once.
+THROTTLED_KERNEL_CHUNK = 4 * 1024 * 1024
+
+# Buffer size of the plain read/write fallback.
+BUFFERED_CHUNK = 1024 * 1024
+
+# Errors meaning a backend is not supported for this pair of files, so the next one should be tried.
+# Any other error, e.g. EPERM or EBADF, is a real failure of the copy and propagates.
+FALLBACK_ERRNOS = {
+    errno.EXDEV, errno.EINVAL, errno.ENOSYS, errno.ENOTTY, errno.EOPNOTSUPP, errno.ENOTSUP,
+}
+
+_backend_cache = {}
+_backend_cache_lock = threading.Lock()
+
+
+def _reflink(source_fd, destination_fd, size, throttle=None):
+    """
+    Clones the source extents into the destination; no data is copied, so nothing is throttled.
+    """
+    if fcntl is None or not sys.platform.startswith('linux'):
+        raise OSError(errno.EOPNOTSUPP, "reflink is not supported on this platform")
+    fcntl.ioctl(destination_fd, FICLONE, source_fd)
+    return 0.0
+
+
+def _copy_file_range(source_fd, destination_fd, size, throttle=None):
+    """
+    Copies the file inside the kernel with copy_file_range, one throttled chunk at a time if there is a throttle.
+    """
+    if not hasattr(os, 'copy_file_range'):
+        raise OSError(errno.ENOSYS, "copy_file_range is not available")
+    chunk_size = MAX_KERNEL_CHUNK if throttle is None else THROTTLED_KERNEL_CHUNK
+    offset = 0
+    waited = 0.0
+    while offset < size:
+        count = min(size - offset, chunk_size)
+        if throttle is not None:
+            waited += throttle.consume(count)
+        copied = os.copy_file_range(source_fd, destination_fd, count, offset, offset)
+        if copied == 0:
+            break
+        offset += copied
+    if offset < size:
+        raise OSError(errno.EIO, "copy_file_range stopped before the end of the file")
+    return waited
+
+
+def _sendfile(source_fd, destination_fd, size, throttle=None):
+    """
+    Copies the file inside the kernel with sendfile, one throttled chunk at a time if there is a throttle.
+    """
+    if not hasattr(os, 'sendfile') or not sys.platform.startswith('linux'):
+        raise OSError(errno.ENOSYS, "sendfile to a regular file is not available")
+    chunk_size = MAX_KERNEL_CHUNK if throttle is None else THROTTLED_KERNEL_CHUNK
+    offset = 0
+    waited = 0.0
+    while offset < size:
+        count = min(size - offset, chunk_size)
+        if throttle is not None:
+            waited += throttle.consume(count)
+        sent = os.sendfile(destination_fd, source_fd, offset, count)
+        if sent == 0:
+            break
+        offset += sent
+    if offset < size:
+        raise OSError(errno.EIO, "sendfile stopped before the end of the file")
+    return waited
+
+
+def _buffered(source_fd, destination_fd, size, throttle=None):
+    """
+    Copies the file through a plain read/write loop; works everywhere.
+    """
+    waited = 0.0
+    while True:
+        chunk = os.read(source_fd, BUFFERED_CHUNK)
+        if not chunk:
+            break
+        if throttle is not None:
+            waited += throttle.consume(len(chunk))
+        view = memoryview(chunk)
+        while view:
+            written = os.write(destination_fd, view)
+            view = view[written:]
+    return waited
+
+
+BACKENDS = {
+    'reflink': _reflink,
+    'copy_file_range': _copy_file_range,
+    'sendfile': _sendfile,
+    'buffered': _buffered,
+}
+
+
+def candidate_backends(source_path, destination_path):
+    """
+    Returns the backends worth trying for a pair of files, best first.
+
+    Once a backend has worked for a pair of filesystems, it is tried first for every
+    later file copied between the same two filesystems.
+
+    Args:
+        source_path (str): The path of the source file.
+        destination_path (str): The path of the destination file.
+
+    Returns:
+        list: The backend names, in the order they should be tried.
+    """
+    source_device = os.stat(source_path).st_dev
+    destination_device = os.stat(os.path.dirname(os.path.abspath(destination_path))).st_dev
+    candidates = list(BACKENDS)
+    if source_device != destination_device:
+        # Extents can only be shared within one filesystem
+        candidates.remove('reflink')
+    with _backend_cache_lock:
+        preferred = _backend_cache.get((source_device, destination_device))
+    if preferred in candidates:
+        candidates.remove(preferred)
+        candidates.insert(0, preferred)
+    return candidates
+
+
+def transfer_file(source_path, destination_path, backend='auto', throttle=None, metrics=None):
+    """
+    Copies a file using the fastest transfer the kernel and filesystems support.
+
+    With backend 'auto', reflink, copy_file_range, sendfile and a buffered loop are
+    tried in that order, falling back whenever a backend reports that it cannot
+    handle the pair of files.
+
+    With a throttle, the backends copy the file in chunks of at most
+    THROTTLED_KERNEL_CHUNK bytes and wait for the throttle before each one, so a large
+    file is paced like the chunks of a streamed copy. A reflink copies no data and is
+    not throttled.
+
+    Args:
+        source_path (str): The path of the source file.
+        destination_path (str): The path of the destination file.
+        backend (str, optional): 'auto' or the name of a backend in BACKENDS. Defaults to 'auto'.
+        throttle (Throttle, optional): Limits the rate of the copy.
+        metrics (PhaseTimer, optional): Receives the time spent copying and waiting for the throttle.
+
+    Returns:
+        str: The name of the backend that copied the file.
+
+    Raises:
+        ValueError: If the backend is unknown.
+        OSError: If the copy fails.
+    """
+    if backend == 'auto':
+        candidates = candidate_backends(source_path, destination_path)
+    elif backend in BACKENDS:
+        candidates = [backend]
+    else:
+        raise ValueError(f"Unknown transfer backend: {backend}")
+
+    started = time.perf_counter()
+    waited = 0.0
+    with open(source_path, 'rb', buffering=0) as source, open(destination_path, 'wb', buffering=0) as destination:
+        size = os.fstat(source.fileno()).st_size
+        for index, name in enumerate(candidates):
+            try:
+                waited += BACKENDS[name](source.fileno(), destination.fileno(), size, throttle)
+            except OSError as e:
+                if e.errno not in FALLBACK_ERRNOS or index == len(candidates) - 1:
+                    raise
+                # Start over with the next backend
+                source.seek(0)
+                destination.seek(0)
+                destination.truncate()
+                continue
+            break
+    if metrics is not None:
+        metrics.add(PHASE_WRITE, time.perf_counter() - started - waited)
+        metrics.add(PHASE_THROTTLE, waited)
+
+    shutil.copymode(source_path, destination_path)
+    if backend == 'auto':
+        source_device = os.stat(source_path).st_dev
+        destination_device = os.stat(destination_path).st_dev
+        with _backend_cache_lock:
+            _backend_cache[(source_device, destination_device)] = name
+    return name
@@ -1,6 +1,19 @@
+import json
+import re
+
+# A complete JSON string token, escapes included.
+_JSON_STRING = re.compile(r'"[^"\\]*(?:\\.[^"\\]*)*"')
+_WHITESPACE = re.compile(r'[ \t\n\r]*')
+_decoder = json.JSONDecoder()
+
+
 def get_value_from_dict(data, key):
     """
-    Recursively searches for a value in a nested dictionary or list.
+    Searches for a value in a nested dictionary or list.
+
+    Each dictionary is checked for the key before its values are searched. The search
+    walks the structure with an explicit stack, so deeply nested data cannot hit the
+    recursion limit.
 
     Args:
         data (dict or list): The dictionary or list to search in.
@@ -9,16 +22,107 @@ def get_value_from_dict(data, key):
     Returns:
         The value associated with the key, if found. None otherwise.
     """
-    if isinstance(data, dict):
-        if key in data:
-            return data[key]
-        for k, v in data.items():
-            result = get_value_from_dict(v, key)
-            if result is not None:
-                return result
-    elif isinstance(data, list):
-        for item in data:
-            result = get_value_from_dict(item, key)
-            if result is not None:
-                return result
-    return None
\ No newline at end of file
+    stack = [iter((data,))]
+    while stack:
+        for item in stack[-1]:
+            if isinstance(item, dict):
+                if key in item:
+                    if item[key] is not None:
+                        return item[key]
+                    # A dictionary holding the key with a None value is not searched further
+                    continue
+                stack.append(iter(item.values()))
+                break
+            elif isinstance(item, list):
+                stack.append(iter(item))
+                break
+        else:
+            stack.pop()
+    return None
+
+
+def find_value_in_json_file(json_file_path, key, chunk_size=64 * 1024):
+    """
+    Searches for a value in a JSON file without loading the whole document.
+
+    The file is read in chunks and scanned for object keys; the scan stops at the first
+    occurrence of the key, so only the part of the file before it is read and only the
+    value itself is decoded. Large arrays of numbers are skipped without being parsed.
+
+    Unlike get_value_from_dict on the loaded document, which checks the keys of a
+    dictionary before searching its values, this returns the first occurrence of the
+    key in document order. Both agree whenever the key appears once.
+
+    Args:
+        json_file_path (str): The path of the JSON file.
+        key (str): The key to search for.
+        chunk_size (int, optional): The number of characters read at a time.
+
+    Returns:
+        The first value associated with the key that is not null, if found. None otherwise.
+    """
+    with open(json_file_path, encoding='utf-8') as json_file:
+        buffer = ''
+        position = 0
+        eof = False
+
+        def read_more():
+            nonlocal buffer, position, eof
+            # Grow the reads with the pending data, so a long value is completed in a few reads
+            chunk = json_file.read(max(chunk_size, len(buffer) - position))
+            if not chunk:
+                eof = True
+                return False
+            buffer = buffer[position:] + chunk
+            position = 0
+            return True
+
+        while True:
+            # Every quote outside a string starts a string, so strings can be found by their quotes
+            quote = buffer.find('"', position)
+            if quote < 0:
+                position = len(buffer)
+                if not read_more():
+                    return None
+                continue
+
+            match = _JSON_STRING.match(buffer, quote)
+            if match is None:
+                # The string continues in the next chunk
+                position = quote
+                if not read_more():
+                    return None
+                continue
+            token = match.group()
+
+            # The string is a key if the next character is a colon
+            end = _WHITESPACE.match(buffer, match.end()).end()
+            if end == len(buffer) and not eof:
+                position = quote
+                read_more()
+                continue
+            if end == len(buffer) or buffer[end] != ':':
+                position = match.end()
+                continue
+
+            name = json.loads(token) if '\\' in token else token[1:-1]
+            if name != key:
+                position = end + 1
+                continue
+
+            # Decode the value, reading more of the file until it is complete
+            start = _WHITESPACE.match(buffer, end + 1).end()
+            try:
+                value, value_end = _decoder.raw_decode(buffer, start)
+            except ValueError:
+                value_end = None
+            if value_end is None or (value_end == len(buffer) and not eof):
+                # A truncated value, or a number that may continue in the next chunk
+                if eof:
+                    return None
+                position = quote
+                read_more()
+                continue
+            if value is not None:
+                return value
+            position = value_end
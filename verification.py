@@ -0,0 +1,301 @@
+"""
+Verify copied folders against the checksums recorded when they were copied.
+
+A Verifier reads folders back in the background: copy_files hands it the folders it
+copied in deferred verification mode, so the copy returns without waiting for the
+destination to be read back. verify_folder re-verifies an existing destination folder
+offline, long after the copy and without its source.
+
+The expected size and checksum of every file come from the manifest of the folder, or
+from its checksum files for folders that have none. Compressed copies are checked
+against the checksum of their uncompressed content.
+"""
+import glob
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field, asdict
+from checksums import new_hasher
+from compress import DECOMPRESSION_ERRORS, decompress_file
+from file_operations import CHECKSUM_FILE_NAME, DEFAULT_WORKERS, compute_checksum, is_checksum_file_name
+from manifest import (
+    Manifest, MANIFEST_FILE_NAME, STATE_COPIED, STATE_FAILED, STATE_PARTIAL, STATE_SAMPLED, STATE_VERIFIED,
+    load_manifest_entries,
+)
+
+
+@dataclass
+class VerificationReport:
+    """
+    The outcome of the verification of a folder.
+
+    Attributes:
+        folder (str): The folder verified.
+        files_verified (int): The number of files that match their checksum.
+        bytes_verified (int): The number of bytes read to verify them.
+        elapsed (float): The wall time of the verification in seconds.
+        failures (dict): The error message of every file that does not match, keyed by path relative to the folder.
+    """
+    folder: str
+    files_verified: int = 0
+    bytes_verified: int = 0
+    elapsed: float = 0.0
+    failures: dict = field(default_factory=dict)
+
+    @property
+    def ok(self):
+        """
+        bool: True if every file matches its checksum.
+        """
+        return not self.failures
+
+    @property
+    def throughput(self):
+        """
+        float: The verification throughput in bytes per second.
+        """
+        return self.bytes_verified / self.elapsed if self.elapsed > 0 else 0.0
+
+    def to_dict(self):
+        """
+        Returns the report as a JSON-serializable dictionary.
+
+        Returns:
+            dict: The fields of the report, its status and its throughput.
+        """
+        return dict(asdict(self), status='ok' if self.ok else 'failed', throughput=self.throughput)
+
+    def __str__(self):
+        lines = [
+            f"{self.folder}: {'OK' if self.ok else 'FAILED'} {self.files_verified} files verified "
+            f"({self.bytes_verified / 1024 ** 2:.1f} MiB) in {self.elapsed:.2f} s "
+            f"({self.throughput / 1024 ** 2:.1f} MiB/s)"
+        ]
+        lines.extend(f"  {path}: {error}" for path, error in sorted(self.failures.items()))
+        return "\n".join(lines)
+
+
+def load_expected_files(folder):
+    """
+    Reads what a destination folder should hold.
+
+    Args:
+        folder (str): The destination folder.
+
+    Returns:
+        dict: The manifest entry of every file, keyed by path relative to the folder. For a
+        folder without a manifest, entries built from its checksum files, with a checksum
+        and an algorithm but no size.
+    """
+    entries = load_manifest_entries(os.path.join(folder, MANIFEST_FILE_NAME))
+    if entries:
+        return entries
+    prefix = CHECKSUM_FILE_NAME.format(algorithm='')
+    for checksum_file_path in sorted(glob.glob(os.path.join(glob.escape(folder), prefix + '*'))):
+        if not is_checksum_file_name(os.path.basename(checksum_file_path)):
+            # A copied file, e.g. checksums.txt
+            continue
+        algorithm = os.path.basename(checksum_file_path)[len(prefix):]
+        with open(checksum_file_path, encoding='utf-8') as checksum_file:
+            for line in checksum_file:
+                checksum, separator, relative_path = line.rstrip('\n').partition('  ')
+                if separator:
+                    entries[relative_path] = {
+                        'path': relative_path, 'checksum': checksum, 'algorithm': algorithm, 'state': STATE_COPIED,
+                    }
+    return entries
+
+
+def verify_entry(folder, relative_path, entry):
+    """
+    Checks a file of a destination folder against its manifest entry.
+
+    A compressed copy is decompressed, and its content hashed.
+
+    Args:
+        folder (str): The destination folder.
+        relative_path (str): The path of the file relative to the folder.
+        entry (dict): The manifest entry of the file.
+
+    Returns:
+        tuple: (size, error), with the number of bytes read and the reason the file does
+        not match, or None if it does.
+    """
+    if entry.get('state') in (STATE_PARTIAL, STATE_FAILED) or not entry.get('checksum'):
+        return 0, f"the copy did not complete ({entry.get('state')})"
+    path = os.path.join(folder, relative_path)
+    try:
+        size = os.path.getsize(path)
+    except FileNotFoundError:
+        return 0, "missing"
+    expected_size = entry.get('stored_size', entry.get('size'))
+    if expected_size is not None and size != expected_size:
+        return 0, f"size is {size} bytes, expected {expected_size}"
+    if entry.get('compression') is not None:
+        hash_func = new_hasher(entry['algorithm'])
+        try:
+            decompress_file(path, entry['compression'], hash_func=hash_func)
+        except DECOMPRESSION_ERRORS as e:
+            return size, f"cannot be decompressed: {e}"
+        checksum = hash_func.hexdigest()
+    else:
+        checksum = compute_checksum(path, entry['algorithm'])
+    if checksum != entry['checksum']:
+        return size, "checksum mismatch"
+    return size, None
+
+
+class Verifier:
+    """
+    A pool of threads verifying destination folders in the background.
+
+    The files of a folder are verified concurrently with those of the other folders.
+    Once every file of a folder has been checked, the outcome is recorded in the
+    manifest of the folder: verified files are marked as such, and files that do not
+    match are marked as failed and the copy of the folder as incomplete, so a resumed
+    copy copies them again.
+
+    Attributes:
+        on_report (callable): Called with the VerificationReport of every folder once it is
+            verified, from a thread of the pool, or None.
+    """
+
+    def __init__(self, workers=DEFAULT_WORKERS, on_report=None):
+        """
+        Starts the pool.
+
+        Args:
+            workers (int, optional): The number of files verified concurrently.
+            on_report (callable, optional): See on_report.
+        """
+        self.on_report = on_report
+        self._executor = ThreadPoolExecutor(max_workers=max(1, workers))
+        self._lock = threading.Lock()
+        self._futures = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def submit_folder(self, folder, pending_only=True, record=True):
+        """
+        Queues the verification of a destination folder.
+
+        Args:
+            folder (str): The destination folder.
+            pending_only (bool, optional): Only verify the files recorded as copied or sampled,
+                not those already verified or that did not copy. Defaults to True.
+            record (bool, optional): Record the outcome in the manifest of the folder, if it has one.
+                Defaults to True.
+
+        Returns:
+            concurrent.futures.Future: Resolves to the VerificationReport of the folder.
+        """
+        started = time.perf_counter()
+        entries = load_expected_files(folder)
+        if pending_only:
+            entries = {path: entry for path, entry in entries.items()
+                       if entry.get('state') in (STATE_COPIED, STATE_SAMPLED)}
+        record = record and os.path.exists(os.path.join(folder, MANIFEST_FILE_NAME))
+        report = VerificationReport(folder)
+        future = Future()
+        with self._lock:
+            self._futures.append(future)
+        if not entries:
+            self._finish(future, report, started, {}, record)
+            return future
+
+        lock = threading.Lock()
+        outcomes = {}
+
+        def done(relative_path, task):
+            try:
+                size, error = task.result()
+            except Exception as e:
+                size, error = 0, str(e)
+            with lock:
+                outcomes[relative_path] = error
+                if error is None:
+                    report.files_verified += 1
+                else:
+                    report.failures[relative_path] = error
+                report.bytes_verified += size
+                last = len(outcomes) == len(entries)
+            if last:
+                self._finish(future, report, started, outcomes, record)
+
+        for relative_path, entry in sorted(entries.items()):
+            task = self._executor.submit(verify_entry, folder, relative_path, entry)
+            task.add_done_callback(lambda task, relative_path=relative_path: done(relative_path, task))
+        return future
+
+    def _finish(self, future, report, started, outcomes, record):
+        """
+        Records the outcome of the verification of a folder and resolves its future.
+        """
+        try:
+            if record and outcomes:
+                with Manifest(report.folder) as manifest:
+                    for relative_path, error in sorted(outcomes.items()):
+                        # Files that did not copy keep the state a resumed copy continues from
+                        entry = manifest.get(relative_path)
+                        if entry is None or entry.get('state') in (STATE_PARTIAL, STATE_FAILED):
+                            continue
+                        manifest.record(relative_path, flush=False,
+                                        state=STATE_VERIFIED if error is None else STATE_FAILED)
+                    if report.failures and manifest.copy_record:
+                        # The failed files are copied again by a resumed copy
+                        manifest.record_copy(complete=False)
+            report.elapsed = time.perf_counter() - started
+        except Exception as e:
+            future.set_exception(e)
+            return
+        future.set_result(report)
+        if self.on_report is not None:
+            self.on_report(report)
+
+    def wait(self):
+        """
+        Waits for the folders submitted so far to be verified.
+
+        Returns:
+            list: The VerificationReport of every folder submitted since the last call, in submission order.
+        """
+        with self._lock:
+            futures, self._futures = self._futures, []
+        return [future.result() for future in futures]
+
+    def close(self):
+        """
+        Waits for the running verifications and stops the pool.
+        """
+        self._executor.shutdown(wait=True)
+
+
+def verify_folder(folder, workers=DEFAULT_WORKERS, record=False):
+    """
+    Re-verifies every file of an existing destination folder against its manifest.
+
+    Args:
+        folder (str): The destination folder, e.g. /archive/test_1_2.
+        workers (int, optional): The number of files verified concurrently.
+        record (bool, optional): Record the outcome in the manifest. Defaults to False, which
+            leaves the folder untouched.
+
+    Returns:
+        VerificationReport: The outcome of the verification.
+
+    Raises:
+        FileNotFoundError: If the folder does not exist or records no checksum.
+    """
+    if not os.path.isdir(folder):
+        raise FileNotFoundError(f"No destination folder {folder}")
+    with Verifier(workers) as verifier:
+        future = verifier.submit_folder(folder, pending_only=False, record=record)
+        report = future.result()
+    if not report.files_verified and not report.failures:
+        raise FileNotFoundError(f"{folder} has no manifest or checksum file to verify it against")
+    return report
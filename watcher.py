@@ -0,0 +1,591 @@
+"""
+Watch a drop directory and ingest every capture folder once it is complete.
+
+Capture folders are the subdirectories of the drop directory. A folder is complete
+when it holds a JSON file and its files have not changed for a settle period. Complete
+folders are queued and copied by a pool of workers; the queue and the folders already
+ingested are saved in a state file, so a restarted watcher resumes the interrupted
+copies in their own destination folders and never ingests a folder twice, unless it
+is dropped again with different files.
+
+Changes are detected with inotify on Linux, and by listing the folders periodically
+elsewhere or when inotify is not available.
+"""
+import ctypes
+import errno
+import functools
+import glob
+import hashlib
+import json
+import os
+import select
+import struct
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from checksum_cache import default_cache_path
+
+# Seconds the files of a folder must stay unchanged before the folder is ingested.
+DEFAULT_SETTLE_SECONDS = 10.0
+
+# Seconds between two listings of the drop directory when polling, and the longest wait
+# between two checks of the pending folders with inotify.
+DEFAULT_POLL_INTERVAL = 2.0
+
+# Number of complete folders queued before the watcher stops queueing new ones.
+DEFAULT_MAX_QUEUED = 100
+
+# Number of times a failed folder is copied before it is left aside.
+DEFAULT_MAX_ATTEMPTS = 3
+
+# Seconds before a failed folder is copied again.
+DEFAULT_RETRY_DELAY = 60.0
+
+# Version of the layout of the state file.
+STATE_VERSION = 1
+
+# inotify(7) event flags.
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_Q_OVERFLOW = 0x00004000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = 0o2000000
+WATCH_MASK = IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+
+_EVENT_HEADER = struct.Struct('iIII')
+
+
+def default_state_path(drop_dir):
+    """
+    Returns the default location of the state file of the watcher of a drop directory.
+
+    Args:
+        drop_dir (str): The drop directory.
+
+    Returns:
+        str: The path of the state file, next to the checksum cache.
+    """
+    digest = hashlib.sha1(os.path.abspath(drop_dir).encode('utf-8')).hexdigest()[:16]
+    return os.path.join(os.path.dirname(default_cache_path()), f'watch-{digest}.json')
+
+
+def folder_snapshot(folder):
+    """
+    Lists the files of a folder with their size and modification time.
+
+    Args:
+        folder (str): The folder.
+
+    Returns:
+        tuple: Sorted (relative path, size, mtime_ns) tuples; two equal snapshots mean no file changed in between.
+    """
+    files = []
+    for directory, _, names in os.walk(folder):
+        for name in names:
+            path = os.path.join(directory, name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                # Removed or renamed while listing: the next snapshot will differ anyway
+                continue
+            files.append((os.path.relpath(path, folder), stat.st_size, stat.st_mtime_ns))
+    return tuple(sorted(files))
+
+
+def snapshot_fingerprint(snapshot):
+    """
+    Returns a short digest identifying the content of a folder snapshot.
+
+    Args:
+        snapshot (tuple): The result of folder_snapshot.
+
+    Returns:
+        str: The digest.
+    """
+    digest = hashlib.sha1()
+    for relative_path, size, mtime_ns in snapshot:
+        digest.update(f'{relative_path}\0{size}\0{mtime_ns}\n'.encode('utf-8', 'surrogateescape'))
+    return digest.hexdigest()
+
+
+class PollingEvents:
+    """
+    Reports changes by asking the watcher to look at every folder at a fixed interval.
+    """
+
+    def wait(self, timeout, stop_event):
+        """
+        Waits for the next check.
+
+        Args:
+            timeout (float): The number of seconds to wait.
+            stop_event (threading.Event): Ends the wait early when set.
+
+        Returns:
+            None: Every folder may have changed.
+        """
+        stop_event.wait(timeout)
+        return None
+
+    def close(self):
+        pass
+
+
+class InotifyEvents:
+    """
+    Reports the capture folders of a drop directory changed since the last wait, with inotify.
+
+    Every directory of the drop directory is watched, including the directories
+    created later. When the kernel drops events, or a directory cannot be watched
+    (e.g. the limit of watches of the user is reached), every folder is reported as
+    possibly changed, from then on for the latter.
+
+    Attributes:
+        root (str): The drop directory.
+    """
+
+    def __init__(self, root):
+        """
+        Starts watching a drop directory.
+
+        Args:
+            root (str): The drop directory.
+
+        Raises:
+            OSError: If inotify is not available.
+        """
+        if not sys.platform.startswith('linux'):
+            raise OSError(errno.ENOSYS, "inotify is only available on Linux")
+        self.root = os.path.abspath(root)
+        self._libc = ctypes.CDLL(None, use_errno=True)
+        self._fd = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self._fd < 0:
+            error = ctypes.get_errno()
+            raise OSError(error, os.strerror(error))
+        self._watches = {}
+        self._degraded = False
+        try:
+            self._add_tree(self.root)
+        except OSError:
+            self.close()
+            raise
+
+    def _add_watch(self, path):
+        watch = self._libc.inotify_add_watch(self._fd, os.fsencode(path), WATCH_MASK)
+        if watch < 0:
+            error = ctypes.get_errno()
+            raise OSError(error, os.strerror(error), path)
+        self._watches[watch] = path
+
+    def _add_tree(self, path):
+        self._add_watch(path)
+        for directory, subdirectories, _ in os.walk(path):
+            for name in subdirectories:
+                self._add_watch(os.path.join(directory, name))
+
+    def _folder_name(self, path):
+        relative_path = os.path.relpath(path, self.root)
+        return relative_path.split(os.sep, 1)[0]
+
+    def wait(self, timeout, stop_event):
+        """
+        Waits for changes.
+
+        Args:
+            timeout (float): The longest wait in seconds.
+            stop_event (threading.Event): Checked between waits; the wait is not interrupted.
+
+        Returns:
+            set: The names of the capture folders that changed, or None if every folder may have changed.
+        """
+        if self._degraded:
+            stop_event.wait(timeout)
+            return None
+        readable, _, _ = select.select([self._fd], [], [], timeout)
+        if not readable:
+            return set()
+        changed = set()
+        overflowed = False
+        while True:
+            try:
+                data = os.read(self._fd, 64 * 1024)
+            except BlockingIOError:
+                break
+            offset = 0
+            while offset < len(data):
+                watch, mask, _, length = _EVENT_HEADER.unpack_from(data, offset)
+                offset += _EVENT_HEADER.size
+                name = os.fsdecode(data[offset:offset + length].rstrip(b'\0'))
+                offset += length
+                if mask & IN_Q_OVERFLOW:
+                    overflowed = True
+                    continue
+                directory = self._watches.get(watch)
+                if directory is None:
+                    continue
+                path = os.path.join(directory, name) if name else directory
+                if path != self.root:
+                    changed.add(self._folder_name(path))
+                if mask & IN_ISDIR and mask & (IN_CREATE | IN_MOVED_TO):
+                    try:
+                        self._add_tree(path)
+                    except FileNotFoundError:
+                        pass
+                    except OSError:
+                        self._degraded = True
+        return None if overflowed or self._degraded else changed
+
+    def close(self):
+        """
+        Stops watching.
+        """
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
+
+
+class _PendingFolder:
+    """
+    A capture folder seen in the drop directory and not queued yet.
+    """
+
+    def __init__(self, now):
+        self.snapshot = None
+        self.changed_at = now
+
+
+class DropFolderWatcher:
+    """
+    Ingests the capture folders dropped in a directory, once they are complete.
+
+    Every call of step looks at the folders that may have changed, queues the ones
+    whose files have been stable for settle_seconds and that hold a JSON file, and
+    hands queued folders to a pool of jobs workers. Folders are queued in the order
+    they completed. Once max_queued folders wait, complete folders are left pending
+    until the workers catch up.
+
+    The ingest function copies one folder, e.g. with get_single_json_file_path and
+    copy_files. It is called as ingest(folder_path, resume_folders, on_destination_folders)
+    and returns an outcome dictionary whose 'status' is 'ok' when the folder was copied,
+    or a list of them (e.g. one per destination root), all 'ok' when the folder was
+    copied. It calls on_destination_folders with the list of the destination folders
+    once it has chosen them; resume_folders is None for a new copy, or that list when
+    the copy must continue in those folders. A failed folder is copied again, resuming
+    its copy, after retry_delay seconds, up to max_attempts times.
+
+    The state file records the queue, the folders ingested and the folders that
+    failed, with the destination folders of their copy. It is rewritten atomically on
+    every change, so a watcher restarted after a crash resumes the copies that were
+    running in their destination folders, and skips the folders already ingested, even
+    if they are still in the drop directory. A folder dropped again with different
+    files (see snapshot_fingerprint) is ingested again.
+
+    Use the watcher as a context manager, or call close, to wait for the running copies.
+
+    Attributes:
+        drop_dir (str): The directory watched.
+        state_path (str): The path of the state file.
+        settle_seconds (float): The time the files of a folder must stay unchanged.
+        poll_interval (float): The longest wait between two steps.
+        jobs (int): The number of folders ingested concurrently.
+        max_queued (int): The number of queued folders beyond which new folders wait.
+        max_attempts (int): The number of times a folder is copied before it is left aside.
+        retry_delay (float): The seconds before a failed folder is copied again.
+        state (dict): The 'queue', 'ingested' and 'failed' folders.
+    """
+
+    def __init__(self, drop_dir, ingest, state_path=None, jobs=1, settle_seconds=DEFAULT_SETTLE_SECONDS,
+                 poll_interval=DEFAULT_POLL_INTERVAL, max_queued=DEFAULT_MAX_QUEUED,
+                 max_attempts=DEFAULT_MAX_ATTEMPTS, retry_delay=DEFAULT_RETRY_DELAY, use_inotify=None,
+                 retry_failed=False, on_outcome=None):
+        """
+        Starts watching a drop directory.
+
+        Args:
+            drop_dir (str): The directory watched.
+            ingest (callable): Copies a folder, called as ingest(folder_path, resume_folders,
+                on_destination_folders); returns an outcome dict or a list of them.
+            state_path (str, optional): The path of the state file. Defaults to default_state_path(drop_dir).
+            jobs (int, optional): The number of folders ingested concurrently. Defaults to 1.
+            settle_seconds (float, optional): The time the files of a folder must stay unchanged.
+            poll_interval (float, optional): The longest wait between two steps.
+            max_queued (int, optional): The number of queued folders beyond which new folders wait.
+            max_attempts (int, optional): The number of times a folder is copied before it is left aside.
+            retry_delay (float, optional): The seconds before a failed folder is copied again.
+            use_inotify (bool, optional): Watch with inotify, or poll. Defaults to None, which uses
+                inotify where it is available.
+            retry_failed (bool, optional): Copy again the folders left aside by an earlier run.
+            on_outcome (callable, optional): Called with the folder name and the outcome of every copy.
+
+        Raises:
+            FileNotFoundError: If the drop directory does not exist.
+        """
+        if not os.path.isdir(drop_dir):
+            raise FileNotFoundError(f"The drop directory {drop_dir} does not exist.")
+        self.drop_dir = drop_dir
+        self.ingest = ingest
+        self.state_path = state_path or default_state_path(drop_dir)
+        self.jobs = max(1, jobs)
+        self.settle_seconds = settle_seconds
+        self.poll_interval = poll_interval
+        self.max_queued = max_queued
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.on_outcome = on_outcome
+        self.state = self._load_state()
+        if retry_failed:
+            for name, entry in self.state['failed'].items():
+                self.state['queue'].append({'name': name, 'fingerprint': entry['fingerprint'], 'attempts': 0,
+                                            'destination_folders': entry.get('destination_folders')})
+            self.state['failed'].clear()
+        self._save_state()
+
+        self.events = None
+        if use_inotify is not False:
+            try:
+                self.events = InotifyEvents(drop_dir)
+            except OSError:
+                if use_inotify:
+                    raise
+        if self.events is None:
+            self.events = PollingEvents()
+        self._pending = {}
+        self._running = {}
+        # Destination folders reported by the running copies, recorded in the queue by the next step
+        self._destination_folders = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=self.jobs)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _load_state(self):
+        state = {'version': STATE_VERSION, 'queue': [], 'ingested': {}, 'failed': {}}
+        try:
+            with open(self.state_path, encoding='utf-8') as state_file:
+                saved = json.load(state_file)
+        except FileNotFoundError:
+            return state
+        if saved.get('version') != STATE_VERSION:
+            raise ValueError(f"Unsupported watcher state version {saved.get('version')} in {self.state_path}")
+        state.update(saved)
+        return state
+
+    def _save_state(self):
+        os.makedirs(os.path.dirname(os.path.abspath(self.state_path)), exist_ok=True)
+        temporary_path = f"{self.state_path}.{os.getpid()}.tmp"
+        with open(temporary_path, 'w', encoding='utf-8') as state_file:
+            json.dump(self.state, state_file, indent=1, sort_keys=True)
+            state_file.flush()
+            os.fsync(state_file.fileno())
+        os.replace(temporary_path, self.state_path)
+
+    def _known(self):
+        known = set(self.state['ingested']) | set(self.state['failed'])
+        known.update(entry['name'] for entry in self.state['queue'])
+        return known
+
+    def _list_folders(self):
+        try:
+            entries = list(os.scandir(self.drop_dir))
+        except FileNotFoundError:
+            return set()
+        return {entry.name for entry in entries if not entry.name.startswith('.') and entry.is_dir()}
+
+    def _report_destination_folders(self, name, destination_folders):
+        with self._lock:
+            self._destination_folders[name] = list(destination_folders)
+
+    def _record_destination_folders(self):
+        """
+        Records in the queue the destination folders reported by the running copies.
+        """
+        with self._lock:
+            reported, self._destination_folders = self._destination_folders, {}
+        for entry in self.state['queue']:
+            if entry['name'] in reported:
+                entry['destination_folders'] = reported[entry['name']]
+        return bool(reported)
+
+    def _collect(self):
+        """
+        Records the outcome of the finished copies.
+        """
+        finished = [(name, future) for name, future in self._running.items() if future.done()]
+        # After listing the finished copies, so the folders they reported are recorded before they leave the queue
+        changed = self._record_destination_folders()
+        for name, future in finished:
+            del self._running[name]
+            entry = next(entry for entry in self.state['queue'] if entry['name'] == name)
+            self.state['queue'].remove(entry)
+            try:
+                outcomes = future.result()
+            except Exception as e:
+                outcomes = {'source': os.path.join(self.drop_dir, name), 'status': 'error', 'error': str(e)}
+            if isinstance(outcomes, dict):
+                outcomes = [outcomes]
+            attempts = entry.get('attempts', 0) + 1
+            if all(outcome.get('status') == 'ok' for outcome in outcomes):
+                self.state['ingested'][name] = {
+                    'fingerprint': entry['fingerprint'],
+                    'destination_folders': [outcome.get('destination_folder') for outcome in outcomes],
+                    'finished_at': time.time(),
+                }
+            else:
+                error = '; '.join(outcome.get('error') or f"{len(outcome.get('failures', {}))} files failed"
+                                  for outcome in outcomes if outcome.get('status') != 'ok')
+                self.state['failed'][name] = {
+                    'fingerprint': entry['fingerprint'],
+                    'destination_folders': entry.get('destination_folders'),
+                    'attempts': attempts,
+                    'error': error,
+                    'retry_at': time.time() + self.retry_delay if attempts < self.max_attempts else None,
+                }
+            changed = True
+            if self.on_outcome is not None:
+                for outcome in outcomes:
+                    self.on_outcome(name, outcome)
+        return changed
+
+    def _retry_failed(self):
+        """
+        Queues again the failed folders whose retry delay has passed.
+        """
+        changed = False
+        now = time.time()
+        for name, entry in list(self.state['failed'].items()):
+            if entry['retry_at'] is not None and entry['retry_at'] <= now:
+                del self.state['failed'][name]
+                self.state['queue'].append({'name': name, 'fingerprint': entry['fingerprint'],
+                                            'attempts': entry['attempts'],
+                                            'destination_folders': entry.get('destination_folders')})
+                changed = True
+        return changed
+
+    def _forget_changed_folders(self, folders, changed_names):
+        """
+        Forgets the folders ingested or failed whose files changed since, so they are ingested again.
+        """
+        changed = False
+        for records in (self.state['ingested'], self.state['failed']):
+            for name in sorted(folders.intersection(records)):
+                if changed_names is not None and name not in changed_names:
+                    continue
+                fingerprint = snapshot_fingerprint(folder_snapshot(os.path.join(self.drop_dir, name)))
+                if fingerprint != records[name]['fingerprint']:
+                    del records[name]
+                    changed = True
+        return changed
+
+    def _queue_complete_folders(self, changed_names):
+        """
+        Updates the pending folders and queues the complete ones.
+        """
+        now = time.monotonic()
+        folders = self._list_folders()
+        changed = self._forget_changed_folders(folders, changed_names)
+        known = self._known()
+        for name in list(self._pending):
+            if name not in folders or name in known:
+                del self._pending[name]
+        for name in sorted(folders - known):
+            pending = self._pending.get(name)
+            if pending is None:
+                pending = self._pending[name] = _PendingFolder(now)
+            elif changed_names is not None and name in changed_names:
+                pending.snapshot = None
+                pending.changed_at = now
+            folder = os.path.join(self.drop_dir, name)
+            if changed_names is None:
+                # Polling: the folder is stable when it did not change since the last look
+                snapshot = folder_snapshot(folder)
+                if snapshot != pending.snapshot:
+                    pending.snapshot = snapshot
+                    pending.changed_at = now
+                    continue
+            if now - pending.changed_at < self.settle_seconds or len(self.state['queue']) >= self.max_queued:
+                continue
+            if pending.snapshot is None:
+                pending.snapshot = folder_snapshot(folder)
+            if not pending.snapshot or not glob.glob(os.path.join(glob.escape(folder), '*.json')):
+                continue
+            del self._pending[name]
+            self.state['queue'].append({'name': name, 'fingerprint': snapshot_fingerprint(pending.snapshot),
+                                        'attempts': 0})
+            changed = True
+        return changed
+
+    def _start_copies(self):
+        """
+        Hands queued folders to the workers, as long as some are idle.
+        """
+        for entry in self.state['queue']:
+            if len(self._running) >= self.jobs:
+                break
+            if entry['name'] in self._running:
+                continue
+            folder = os.path.join(self.drop_dir, entry['name'])
+            # A copy interrupted by a failure or by the end of the last run continues in its destination folders
+            self._running[entry['name']] = self._executor.submit(
+                self.ingest, folder, entry.get('destination_folders'),
+                functools.partial(self._report_destination_folders, entry['name']))
+
+    def step(self, changed_names=None):
+        """
+        Records the finished copies, queues the complete folders and starts the next copies.
+
+        Args:
+            changed_names (set, optional): The names of the folders that changed since the
+                last step. Defaults to None, which looks at every folder.
+        """
+        changed = self._collect()
+        changed = self._retry_failed() or changed
+        changed = self._queue_complete_folders(changed_names) or changed
+        if changed:
+            self._save_state()
+        self._start_copies()
+
+    def run(self, stop_event=None):
+        """
+        Watches the drop directory until the stop event is set.
+
+        Args:
+            stop_event (threading.Event, optional): Stops the watcher when set, e.g. from a signal handler.
+        """
+        stop_event = stop_event or threading.Event()
+        self.step()
+        while not stop_event.is_set():
+            # Wake up in time to collect the copies and to check the pending folders
+            timeout = self.poll_interval
+            if self._running:
+                timeout = min(timeout, 0.5)
+            changed_names = self.events.wait(timeout, stop_event)
+            if stop_event.is_set():
+                break
+            self.step(changed_names)
+
+    def join(self):
+        """
+        Waits for the running copies and records their outcome.
+        """
+        wait(list(self._running.values()))
+        if self._collect():
+            self._save_state()
+
+    def close(self):
+        """
+        Waits for the running copies, records their outcome and stops watching.
+        """
+        self.join()
+        self._executor.shutdown(wait=True)
+        self.events.close()